@@ -0,0 +1,213 @@
+"""検索処理のベンチマーク
+
+search_historyに記録された実際の検索クエリ（と、その表記ゆれ・誤字などの変形）を
+SearchEngine.search / search_related_items / get_search_suggestions に流し、
+スループット、所要時間のパーセンタイル、1回あたりのSQL実行数、ピークメモリをJSONで出力する。
+search_related_items はキャッシュを破棄した場合（cold）と載っている場合（warm）を分けて出力する。
+
+使い方:
+    python src/benchmark.py --db data/items.db --output benchmark.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import jaconv
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from database import DatabaseManager
+from db_connection import close_read_pool, connect, enable_read_pool
+from search_engine import SearchEngine
+from search_session import search_session
+from search_trace import percentile
+
+logger = logging.getLogger(__name__)
+
+
+async def copy_database(db_path: str, copy_path: str):
+    """計測用にDBを複製（オンラインバックアップのため、Botが使用中でも一貫した内容になる）"""
+    async with connect(db_path) as source, connect(copy_path) as target:
+        await source.backup(target)
+
+
+async def load_history_queries(db_path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """search_historyのクエリを記録順に取得"""
+    sql = "SELECT query, result_count FROM search_history ORDER BY id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    async with connect(db_path) as db:
+        async with db.execute(sql) as cursor:
+            return [{'query': query, 'result_count': result_count} for query, result_count in await cursor.fetchall()]
+
+
+def make_variants(query: str) -> List[str]:
+    """クエリの変形（ひらがな・半角カナ・隣接文字の入れ替え・レベル表記付き）"""
+    variants = [
+        jaconv.kata2hira(query),
+        jaconv.z2h(query, kana=True, ascii=False, digit=False),
+        f"{query}Lv2",
+    ]
+    if len(query) >= 3:
+        # 中央付近の隣接2文字を入れ替えた誤字
+        middle = len(query) // 2
+        variants.append(query[:middle - 1] + query[middle] + query[middle - 1] + query[middle + 1:])
+    return [variant for variant in dict.fromkeys(variants) if variant != query]
+
+
+def summarize(latencies_ms: List[float], statements: List[int], elapsed: float, peak_bytes: int) -> Dict[str, Any]:
+    """1種類の操作の計測結果を集計"""
+    count = len(latencies_ms)
+    latencies = sorted(latencies_ms)
+    return {
+        'operations': count,
+        'elapsed_sec': elapsed,
+        'throughput_per_sec': count / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else 0.0,
+        'statements_per_op': sum(statements) / count if count else 0.0,
+        'peak_memory_bytes': peak_bytes,
+    }
+
+
+async def _measure(engine: SearchEngine, inputs: List[Any],
+                   operation: Callable[[Any], Awaitable[Any]], cold: bool,
+                   primed: bool = False) -> Dict[str, Any]:
+    """inputsの各要素でoperationを1回ずつ実行して計測
+
+    coldなら毎回すべての検索キャッシュを破棄し、primedなら直前に同じ入力で1回実行して
+    キャッシュに載せてから計測する（事前の実行は所要時間に含めない）。
+    """
+    latencies_ms: List[float] = []
+    statements: List[int] = []
+    priming = 0.0
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    for value in inputs:
+        if cold:
+            engine.query_cache.clear()
+            engine.negative_cache.clear()
+            engine.related_cache.clear()
+        elif primed:
+            priming_started = time.perf_counter()
+            await operation(value)
+            priming += time.perf_counter() - priming_started
+        # 1回ごとに検索セッションを張り、その中で実行したSQLを数える
+        async with search_session(engine.db_manager.db_path, trace_statements=True) as session:
+            operation_started = time.perf_counter()
+            await operation(value)
+            latencies_ms.append((time.perf_counter() - operation_started) * 1000)
+            statements.append(session.statements)
+    elapsed = time.perf_counter() - started - priming
+    return summarize(latencies_ms, statements, elapsed, tracemalloc.get_traced_memory()[1])
+
+
+async def run_benchmark(db_path: str, limit: Optional[int] = None, variants: bool = True,
+                        cold: bool = False, repeat: int = 1) -> Dict[str, Any]:
+    """ベンチマークを実行して結果を返す
+
+    計測は一時ディレクトリに複製したDBで行い、db_pathのDBには書き込まない。
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, os.path.basename(db_path))
+        await copy_database(db_path, copy_path)
+        result = await _run_benchmark(copy_path, limit, variants, cold, repeat)
+    result['db_path'] = db_path
+    return result
+
+
+async def _run_benchmark(db_path: str, limit: Optional[int], variants: bool,
+                         cold: bool, repeat: int) -> Dict[str, Any]:
+    """複製したDBでベンチマークを実行"""
+    history = await load_history_queries(db_path, limit)
+    queries = [entry['query'] for entry in history] * repeat
+    if variants:
+        queries += [variant for query in dict.fromkeys(queries) for variant in make_variants(query)]
+
+    # Botの起動時と同じくスキーマを最新にする（複製に対して行うため元のDBは変わらない）
+    db_manager = DatabaseManager(db_path)
+    await db_manager.initialize_database()
+
+    engine = SearchEngine(db_manager, {'features': {'search_tracing': True}})
+    engine.tracer.clear()
+    # Botと同じく読み取り接続を使い回す
+    enable_read_pool(db_path, engine.read_connections)
+
+    tracemalloc.start()
+    try:
+        catalog_started = time.perf_counter()
+        await engine.load_catalog()
+        catalog_load_sec = time.perf_counter() - catalog_started
+
+        # 関連アイテム検索の入力は、検索でヒットした先頭のアイテム
+        hits: Dict[str, Dict[str, Any]] = {}
+
+        async def search(query: str):
+            results = await engine.search(query)
+            if results and query not in hits:
+                hits[query] = dict(results[0])
+
+        search_stats = await _measure(engine, queries, search, cold)
+        # 関連アイテムはキャッシュの効果が大きいため、破棄した場合と載っている場合を両方計測する
+        related_items = list(hits.values())
+        related_stats = {
+            'cold': await _measure(engine, related_items, engine.search_related_items, cold=True),
+            'warm': await _measure(engine, related_items, engine.search_related_items, cold=False, primed=True),
+        }
+        # 補完候補は入力途中を想定してクエリの前半で引く
+        prefixes = [query[:max(1, len(query) // 2)] for query in dict.fromkeys(queries)]
+        suggestion_stats = await _measure(engine, prefixes, engine.get_search_suggestions, cold)
+    finally:
+        tracemalloc.stop()
+        await close_read_pool(db_path)
+
+    return {
+        'db_path': db_path,
+        'history_queries': len(history),
+        'total_queries': len(queries),
+        'cold_cache': cold,
+        'catalog_load_sec': catalog_load_sec,
+        'search': search_stats,
+        'search_related_items': related_stats,
+        'get_search_suggestions': suggestion_stats,
+        'stages': engine.get_trace_stats(),
+        'query_cache': engine.get_cache_stats(),
+        # 記録時と結果件数が変わったクエリ数（検索ロジック変更の影響確認用）
+        'result_count_changed': sum(
+            1 for entry in history
+            if entry['result_count'] is not None and (entry['query'] in hits) != (entry['result_count'] > 0)
+        ),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='search_historyを使った検索ベンチマーク')
+    parser.add_argument('--db', default='./data/items.db', help='データベースファイル')
+    parser.add_argument('--output', help='結果JSONの出力先（省略時は標準出力）')
+    parser.add_argument('--limit', type=int, help='使用する履歴クエリの最大件数')
+    parser.add_argument('--repeat', type=int, default=1, help='履歴クエリを繰り返す回数')
+    parser.add_argument('--no-variants', action='store_true', help='変形クエリを使わない')
+    parser.add_argument('--cold', action='store_true', help='毎回検索キャッシュを破棄して計測する')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run_benchmark(
+        args.db, limit=args.limit, variants=not args.no_variants, cold=args.cold, repeat=args.repeat
+    ))
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class CandidateSet:
+    """(item_type, id) で重複を除いた検索候補
+
+    各候補を最初に見つけた検索段階と、見つけたすべての段階を記録する。
+    追加は1件あたり辞書の参照1回で済むため、段階をいくつ重ねても線形に収まる。
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        self._stages: Dict[Tuple[str, Any], List[str]] = {}
+        self._stage_order: List[str] = []
+
+    @staticmethod
+    def _key(result: Dict[str, Any]) -> Tuple[str, Any]:
+        return (result.get('item_type'), result.get('id'))
+
+    def add(self, results: Iterable[Dict[str, Any]], stage: str) -> int:
+        """検索段階stageの結果を追加し、新しく加わった件数を返す"""
+        if stage not in self._stage_order:
+            self._stage_order.append(stage)
+
+        added = 0
+        for result in results:
+            key = self._key(result)
+            stages = self._stages.setdefault(key, [])
+            if stage not in stages:
+                stages.append(stage)
+            if key not in self._results:
+                self._results[key] = result
+                added += 1
+        return added
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._results.values())
+
+    def __contains__(self, result: Dict[str, Any]) -> bool:
+        return self._key(result) in self._results
+
+    def stage_rank(self, result: Dict[str, Any]) -> int:
+        """候補を最初に見つけた検索段階の順番（0始まり）"""
+        stages = self._stages.get(self._key(result))
+        if not stages:
+            return len(self._stage_order)
+        return min(self._stage_order.index(stage) for stage in stages)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]], stage: str) -> 'CandidateSet':
+        """1つの検索段階の結果から作成"""
+        candidates = cls()
+        candidates.add(results, stage)
+        return candidates
@@ -7,9 +7,23 @@ import aiohttp
 from typing import Dict, Any, List, Optional
 import jaconv
 from datetime import datetime
+from item_catalog import load_catalog
+from db_connection import connect
+from item_relations import rebuild_relations
+from database import SEARCH_KEY_COLUMNS
+from text_normalizer import to_search_key
 
 logger = logging.getLogger(__name__)
 
+# CSVタイプとテーブル名の対応
+CSV_TABLES = {
+    'equipment': 'equipments',
+    'material': 'materials',
+    'mob': 'mobs',
+    'gathering': 'gatherings',
+    'npc': 'npcs'
+}
+
 class CSVManager:
     def __init__(self, db_manager, config):
         self.db_manager = db_manager
@@ -204,6 +218,11 @@ class CSVManager:
                 if col in df_renamed.columns:
                     df_renamed[col] = df_renamed[col].astype(str).apply(self._normalize_japanese_text)
             
+            # 検索キー（幅・大小・かな・長音を正規化した名称）を付与
+            for col in SEARCH_KEY_COLUMNS[CSV_TABLES[csv_type]]:
+                if col in df_renamed.columns:
+                    df_renamed[f'{col}_key'] = df_renamed[col].apply(to_search_key)
+            
             # NULL値の処理
             df_renamed = df_renamed.where(pd.notnull(df_renamed), None)
             
@@ -326,16 +345,9 @@ class CSVManager:
         """正規化されたデータをデータベースに挿入"""
         try:
             # テーブル名を決定
-            table_mapping = {
-                'equipment': 'equipments',
-                'material': 'materials',
-                'mob': 'mobs',
-                'gathering': 'gatherings',
-                'npc': 'npcs'
-            }
-            table_name = table_mapping[csv_type]
+            table_name = CSV_TABLES[csv_type]
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
+            async with connect(self.db_manager.db_path) as db:
                 # 既存データを削除（完全更新）
                 await db.execute(f"DELETE FROM {table_name}")
                 
@@ -371,9 +383,15 @@ class CSVManager:
                     data_rows.append(tuple(converted_row))
                 
                 await db.executemany(sql, data_rows)
-                await db.commit()
                 
-                return len(data_rows)
+                # 必要素材・ドロップなどの関連を辺テーブルに展開
+                await rebuild_relations(db, [table_name])
+                await db.commit()
+            
+            # コミット後にアイテムカタログを再構築して差し替え
+            await load_catalog(self.db_manager.db_path)
+            
+            return len(data_rows)
                 
         except Exception as e:
             logger.error(f"データ挿入エラー: {e}")
@@ -385,16 +403,9 @@ class CSVManager:
     async def export_csv(self, csv_type: str, output_path: str) -> bool:
         """データベースからCSVにエクスポート"""
         try:
-            table_mapping = {
-                'equipment': 'equipments',
-                'material': 'materials',
-                'mob': 'mobs',
-                'gathering': 'gatherings',
-                'npc': 'npcs'
-            }
-            table_name = table_mapping[csv_type]
+            table_name = CSV_TABLES[csv_type]
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
+            async with connect(self.db_manager.db_path) as db:
                 db.row_factory = aiosqlite.Row
                 cursor = await db.execute(f"SELECT * FROM {table_name}")
                 rows = await cursor.fetchall()
@@ -426,16 +437,9 @@ class CSVManager:
     async def validate_existing_data(self, csv_type: str) -> Dict[str, Any]:
         """既存データの整合性チェック"""
         try:
-            table_mapping = {
-                'equipment': 'equipments',
-                'material': 'materials',
-                'mob': 'mobs',
-                'gathering': 'gatherings',
-                'npc': 'npcs'
-            }
-            table_name = table_mapping[csv_type]
+            table_name = CSV_TABLES[csv_type]
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
+            async with connect(self.db_manager.db_path) as db:
                 db.row_factory = aiosqlite.Row
                 
                 # 重複チェック
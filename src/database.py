@@ -6,9 +6,21 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 import os
+from text_normalizer import to_search_key
+from db_connection import connect
+from item_relations import RELATIONS_VERSION, rebuild_relations
 
 logger = logging.getLogger(__name__)
 
+# 検索キー（<カラム名>_key）を持つ名称カラム
+SEARCH_KEY_COLUMNS = {
+    'equipments': ['formal_name', 'common_name'],
+    'materials': ['formal_name', 'common_name'],
+    'mobs': ['formal_name', 'common_name'],
+    'npcs': ['name'],
+    'gatherings': ['location'],
+}
+
 class DatabaseManager:
     def __init__(self, db_path: str = "./data/items.db"):
         self.db_path = db_path
@@ -20,9 +32,11 @@ class DatabaseManager:
     
     async def initialize_database(self):
         """データベースを初期化し、全テーブルを作成"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await self._create_tables(db)
             await self._create_indexes(db)
+            await self._drop_fts_tables(db)
+            await self._backfill_item_relations(db)
             await db.commit()
         logger.info("データベースの初期化が完了しました")
     
@@ -35,6 +49,8 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 formal_name TEXT NOT NULL UNIQUE,
                 common_name TEXT,
+                formal_name_key TEXT,
+                common_name_key TEXT,
                 acquisition_location TEXT,
                 acquisition_category TEXT,
                 type TEXT,
@@ -53,6 +69,8 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 formal_name TEXT NOT NULL UNIQUE,
                 common_name TEXT,
+                formal_name_key TEXT,
+                common_name_key TEXT,
                 acquisition_category TEXT,
                 acquisition_method TEXT,
                 usage_category TEXT,
@@ -70,6 +88,8 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 formal_name TEXT NOT NULL,
                 common_name TEXT,
+                formal_name_key TEXT,
+                common_name_key TEXT,
                 area TEXT,
                 area_detail TEXT,
                 required_level TEXT,
@@ -90,6 +110,7 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS gatherings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 location TEXT NOT NULL,
+                location_key TEXT,
                 collection_method TEXT,
                 obtained_materials TEXT,
                 required_tools TEXT,
@@ -108,6 +129,7 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 location TEXT NOT NULL,
                 name TEXT NOT NULL,
+                name_key TEXT,
                 business_type TEXT,
                 obtainable_items TEXT,
                 required_materials TEXT,
@@ -152,6 +174,32 @@ class DatabaseManager:
                 last_searched TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        
+        # item_relations テーブル（必要素材・ドロップ・NPC取引・採集の関連をCSV取り込み時に展開）
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS item_relations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_type TEXT NOT NULL,
+                source_id INTEGER NOT NULL,
+                relation_type TEXT NOT NULL,
+                target_name TEXT NOT NULL,
+                target_key TEXT NOT NULL,
+                quantity TEXT,
+                drop_info TEXT,
+                exchange_index INTEGER
+            )
+        ''')
+        
+        # schema_versions テーブル（起動時に作り直す派生データの版）
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS schema_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        
+        # 既存テーブルに検索キーカラムを追加
+        await self._migrate_search_key_columns(db)
     
     async def _create_indexes(self, db: aiosqlite.Connection):
         """パフォーマンス向上のためのインデックスを作成"""
@@ -164,20 +212,39 @@ class DatabaseManager:
             "CREATE INDEX IF NOT EXISTS idx_mobs_formal_name ON mobs(formal_name)",
             "CREATE INDEX IF NOT EXISTS idx_mobs_common_name ON mobs(common_name)",
             
+            # 正規化済み検索キーのインデックス（完全一致・前方一致用）
+            *[
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{column}_key ON {table}({column}_key)"
+                for table, columns in SEARCH_KEY_COLUMNS.items()
+                for column in columns
+            ],
+            
             # 履歴とお気に入りのインデックス
             "CREATE INDEX IF NOT EXISTS idx_search_history_user_id ON search_history(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_search_history_searched_at ON search_history(searched_at)",
             "CREATE INDEX IF NOT EXISTS idx_user_favorites_user_id ON user_favorites(user_id)",
+            
+            # 関連の両端のインデックス（関連先の名前から引く・関連元から引く）
+            "CREATE INDEX IF NOT EXISTS idx_item_relations_target ON item_relations(target_key, relation_type)",
+            "CREATE INDEX IF NOT EXISTS idx_item_relations_source ON item_relations(source_type, source_id)",
         ]
         
         for index_sql in indexes:
             await db.execute(index_sql)
     
+    async def _drop_fts_tables(self, db: aiosqlite.Connection):
+        """以前のバージョンが作成した部分一致検索用のFTS5テーブルを削除（検索はカタログで行う）"""
+        for table in SEARCH_KEY_COLUMNS:
+            try:
+                await db.execute(f"DROP TABLE IF EXISTS {table}_fts")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"{table}_ftsの削除に失敗しました: {e}")
+    
     async def search_items(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
         """アイテムを検索（全テーブル対象）"""
         results = []
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             
             # 各テーブルから検索
@@ -205,7 +272,7 @@ class DatabaseManager:
     
     async def add_search_history(self, user_id: str, query: str, result_count: int):
         """検索履歴を追加"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute(
                 "INSERT INTO search_history (user_id, query, result_count) VALUES (?, ?, ?)",
                 (user_id, query, result_count)
@@ -214,7 +281,7 @@ class DatabaseManager:
     
     async def update_search_stats(self, item_name: str):
         """検索統計を更新"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute('''
                 INSERT INTO search_stats (item_name, search_count, last_searched)
                 VALUES (?, 1, CURRENT_TIMESTAMP)
@@ -224,10 +291,25 @@ class DatabaseManager:
             ''', (item_name,))
             await db.commit()
     
+    async def update_search_stats_many(self, item_names: List[str]):
+        """複数アイテムの検索統計を1回のトランザクションで更新"""
+        if not item_names:
+            return
+        
+        async with connect(self.db_path) as db:
+            await db.executemany('''
+                INSERT INTO search_stats (item_name, search_count, last_searched)
+                VALUES (?, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(item_name) DO UPDATE SET
+                    search_count = search_count + 1,
+                    last_searched = CURRENT_TIMESTAMP
+            ''', [(item_name,) for item_name in item_names])
+            await db.commit()
+    
     async def add_favorite(self, user_id: str, item_name: str, item_type: str) -> bool:
         """お気に入りアイテムを追加"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with connect(self.db_path) as db:
                 await db.execute(
                     "INSERT INTO user_favorites (user_id, item_name, item_type) VALUES (?, ?, ?)",
                     (user_id, item_name, item_type)
@@ -240,7 +322,7 @@ class DatabaseManager:
     
     async def remove_favorite(self, user_id: str, item_name: str, item_type: str) -> bool:
         """お気に入りアイテムを削除"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             cursor = await db.execute(
                 "DELETE FROM user_favorites WHERE user_id = ? AND item_name = ? AND item_type = ?",
                 (user_id, item_name, item_type)
@@ -250,7 +332,7 @@ class DatabaseManager:
     
     async def get_user_favorites(self, user_id: str) -> List[Dict[str, Any]]:
         """ユーザーのお気に入りアイテム一覧を取得"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM user_favorites WHERE user_id = ? ORDER BY created_at DESC",
@@ -263,7 +345,7 @@ class DatabaseManager:
         """ユーザーの検索履歴を取得"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM search_history WHERE user_id = ? AND searched_at > ? ORDER BY searched_at DESC LIMIT 50",
@@ -274,7 +356,7 @@ class DatabaseManager:
     
     async def get_search_ranking(self, limit: int = 10) -> List[Dict[str, Any]]:
         """検索ランキングを取得"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM search_stats ORDER BY search_count DESC LIMIT ?",
@@ -287,7 +369,7 @@ class DatabaseManager:
         """古い検索履歴をクリア"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute(
                 "DELETE FROM search_history WHERE searched_at < ?",
                 (cutoff_date,)
@@ -303,8 +385,8 @@ class DatabaseManager:
         os.makedirs(backup_path, exist_ok=True)
         
         # ファイルをコピー
-        async with aiosqlite.connect(self.db_path) as source:
-            async with aiosqlite.connect(backup_file) as dest:
+        async with connect(self.db_path) as source:
+            async with connect(backup_file) as dest:
                 await source.backup(dest)
         
         logger.info(f"データベースをバックアップしました: {backup_file}")
@@ -360,4 +442,63 @@ class DatabaseManager:
                 logger.info("gatheringsテーブルのマイグレーションが完了しました")
                 
         except Exception as e:
-            logger.warning(f"gatheringsテーブルのマイグレーション中にエラー: {e}")
\ No newline at end of file
+            logger.warning(f"gatheringsテーブルのマイグレーション中にエラー: {e}")
+    
+    async def _get_version(self, db: aiosqlite.Connection, name: str) -> Optional[int]:
+        """派生データの版を取得（未記録ならNone）"""
+        cursor = await db.execute("SELECT version FROM schema_versions WHERE name = ?", (name,))
+        row = await cursor.fetchone()
+        return row[0] if row else None
+    
+    async def _set_version(self, db: aiosqlite.Connection, name: str, version: int):
+        """派生データの版を記録"""
+        await db.execute(
+            "INSERT OR REPLACE INTO schema_versions (name, version) VALUES (?, ?)",
+            (name, version)
+        )
+    
+    async def _backfill_item_relations(self, db: aiosqlite.Connection):
+        """関連テーブルが空、または抽出規則が変わっていれば既存データから作り直す"""
+        cursor = await db.execute("SELECT 1 FROM item_relations LIMIT 1")
+        has_relations = await cursor.fetchone() is not None
+        if has_relations and await self._get_version(db, 'item_relations') == RELATIONS_VERSION:
+            return
+        
+        count = await rebuild_relations(db)
+        await self._set_version(db, 'item_relations', RELATIONS_VERSION)
+        if count:
+            logger.info(f"item_relationsを既存データから作成しました: {count}件")
+    
+    async def _migrate_search_key_columns(self, db: aiosqlite.Connection):
+        """検索キーカラムが無いテーブルにカラムを追加し、未設定のキーと古い規則のままのキーを計算し直す"""
+        stale_keys = 0
+        for table, columns in SEARCH_KEY_COLUMNS.items():
+            cursor = await db.execute(f"PRAGMA table_info({table})")
+            existing = {col[1] for col in await cursor.fetchall()}
+            
+            for column in columns:
+                if f"{column}_key" not in existing:
+                    logger.info(f"{table}テーブルに{column}_keyカラムを追加します")
+                    await db.execute(f"ALTER TABLE {table} ADD COLUMN {column}_key TEXT")
+                
+                # 正規化の規則が変わっても追従するよう、保存済みのキーも現在の規則と比べる
+                cursor = await db.execute(
+                    f"SELECT id, {column}, {column}_key FROM {table} WHERE {column} IS NOT NULL"
+                )
+                updates = []
+                for row_id, value, key in await cursor.fetchall():
+                    current_key = to_search_key(value)
+                    if key != current_key:
+                        updates.append((current_key, row_id))
+                        if key is not None:
+                            stale_keys += 1
+                if updates:
+                    await db.executemany(
+                        f"UPDATE {table} SET {column}_key = ? WHERE id = ?",
+                        updates
+                    )
+        
+        if stale_keys:
+            logger.info(f"検索キーの規則が変わったため{stale_keys}件を計算し直しました")
+            # 関連テーブルの検索キーも同じ規則で作り直す
+            await db.execute("DELETE FROM schema_versions WHERE name = 'item_relations'")
@@ -0,0 +1,328 @@
+"""DB接続の生成とSQLプロファイラ
+
+すべてのモジュールはここのconnect / open_connectionで接続する。
+プロファイラが有効な間は、SQL文（リテラルを?に置き換えた形）ごとに
+実行回数・所要時間・取得件数を集計し、閾値を超えた文の実行計画をログに出す。
+常駐するプロセス（Bot・ベンチマーク）は、検索用の読み取り接続をプールして使い回せる。
+"""
+import logging
+import os
+import re
+import time
+import aiosqlite
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+from aiosqlite.context import Result
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """集計用にSQLを正規化（リテラルを?に置き換え、IN (?, ?, ...)を1つにまとめ、空白を詰める）"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _PLACEHOLDER_LIST.sub('(?)', sql)
+
+
+class StatementStats:
+    """正規化したSQL文1つ分の集計"""
+
+    __slots__ = ('sql', 'count', 'total_ms', 'max_ms', 'rows')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sql': self.sql,
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'rows': self.rows,
+        }
+
+
+class QueryProfiler:
+    """SQL文ごとの実行回数・所要時間・取得件数の集計
+
+    slow_query_msを超えた文は、explain_slowが有効なら正規化したSQLごとに1回だけ
+    EXPLAIN QUERY PLANの結果をログに出す。
+    """
+
+    def __init__(self, enabled: bool = False, slow_query_ms: float = 100, explain_slow: bool = True):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow = explain_slow
+        self._stats: Dict[str, StatementStats] = {}
+        self._explained: set = set()
+
+    def _get_stats(self, sql: str) -> StatementStats:
+        key = normalize_sql(sql)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = StatementStats(key)
+            self._stats[key] = stats
+        return stats
+
+    def record_execute(self, sql: str, elapsed_ms: float, rows: int = 0) -> StatementStats:
+        """文の実行1回分を記録"""
+        stats = self._get_stats(sql)
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.rows += rows
+        return stats
+
+    def record_fetch(self, stats: StatementStats, elapsed_ms: float, rows: int, statement_ms: float):
+        """結果の取得分を記録（statement_msはその実行の取得分を含めた所要時間）"""
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, statement_ms)
+        stats.rows += rows
+
+    def should_explain(self, stats: StatementStats, statement_ms: float) -> bool:
+        """実行計画をログに出すべきか（閾値超えの文ごとに1回）"""
+        if not self.explain_slow or statement_ms < self.slow_query_ms or stats.sql in self._explained:
+            return False
+        self._explained.add(stats.sql)
+        return True
+
+    def top(self, limit: int = 10, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """order_by（total_ms / count / max_ms / rows）の大きい順に上位limit件"""
+        ranked = sorted(self._stats.values(), key=lambda stats: getattr(stats, order_by), reverse=True)
+        return [stats.to_dict() for stats in ranked[:limit]]
+
+    def reset(self):
+        """集計を破棄"""
+        self._stats.clear()
+        self._explained.clear()
+
+    def get_stats(self, limit: int = 10) -> Dict[str, Any]:
+        """遅い順・回数順の上位と全体の合計"""
+        return {
+            'enabled': self.enabled,
+            'statements': len(self._stats),
+            'executions': sum(stats.count for stats in self._stats.values()),
+            'total_ms': sum(stats.total_ms for stats in self._stats.values()),
+            'slowest': self.top(limit, 'total_ms'),
+            'most_frequent': self.top(limit, 'count'),
+        }
+
+
+class ProfiledCursor:
+    """aiosqlite.Cursorを包み、取得件数と取得時間を記録するカーソル"""
+
+    def __init__(self, connection: 'ProfiledConnection', cursor: aiosqlite.Cursor,
+                 sql: str, parameters: Any, stats: StatementStats, elapsed_ms: float):
+        self._connection = connection
+        self._cursor = cursor
+        self._sql = sql
+        self._parameters = parameters
+        self._stats = stats
+        self._elapsed_ms = elapsed_ms
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    async def _record_fetch(self, started: float, rows: int):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._elapsed_ms += elapsed_ms
+        profiler = self._connection.profiler
+        profiler.record_fetch(self._stats, elapsed_ms, rows, self._elapsed_ms)
+        if profiler.should_explain(self._stats, self._elapsed_ms):
+            await self._connection.explain(self._sql, self._parameters, self._elapsed_ms)
+
+    async def fetchone(self) -> Optional[Any]:
+        started = time.perf_counter()
+        row = await self._cursor.fetchone()
+        await self._record_fetch(started, 1 if row is not None else 0)
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        started = time.perf_counter()
+        rows = await (self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+        await self._record_fetch(started, len(rows))
+        return rows
+
+    async def fetchall(self) -> List[Any]:
+        started = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        await self._record_fetch(started, len(rows))
+        return rows
+
+    async def close(self):
+        await self._cursor.close()
+
+
+class _CursorResult(Result):
+    """await でも async with でも使えるexecuteの戻り値（with終了時にカーソルを閉じる）"""
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._obj.close()
+
+
+class ProfiledConnection:
+    """aiosqlite.Connectionを包み、execute / executemanyをプロファイラに記録する接続"""
+
+    def __init__(self, connection: aiosqlite.Connection, profiler: QueryProfiler):
+        self._connection = connection
+        self.profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    @property
+    def row_factory(self) -> Optional[type]:
+        return self._connection.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory: Optional[type]):
+        self._connection.row_factory = factory
+
+    async def _execute(self, method, sql: str, parameters: Any) -> ProfiledCursor:
+        started = time.perf_counter()
+        cursor = await method(sql, parameters)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # 結果を返さない文（INSERT/UPDATEなど）は変更件数を件数として記録する
+        rows = max(cursor.rowcount, 0) if cursor.description is None else 0
+        stats = self.profiler.record_execute(sql, elapsed_ms, rows)
+        profiled = ProfiledCursor(self, cursor, sql, parameters, stats, elapsed_ms)
+        if self.profiler.should_explain(stats, elapsed_ms):
+            await self.explain(sql, parameters, elapsed_ms)
+        return profiled
+
+    def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> _CursorResult:
+        return _CursorResult(self._execute(self._connection.execute, sql, parameters if parameters is not None else []))
+
+    def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> _CursorResult:
+        return _CursorResult(self._execute(self._connection.executemany, sql, list(parameters)))
+
+    async def backup(self, target: Union['ProfiledConnection', aiosqlite.Connection], **kwargs):
+        if isinstance(target, ProfiledConnection):
+            target = target._connection
+        await self._connection.backup(target, **kwargs)
+
+    async def explain(self, sql: str, parameters: Any, elapsed_ms: float):
+        """SQLの実行計画をログに出す（SELECT / WITH のみ）"""
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+        try:
+            async with self._connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters) as cursor:
+                plan = [row[-1] for row in await cursor.fetchall()]
+            logger.warning(f"遅いSQL（{elapsed_ms:.1f}ms）: {normalize_sql(sql)}\n実行計画: " + " / ".join(plan))
+        except Exception as e:
+            logger.warning(f"実行計画の取得エラー: {e}")
+
+
+# プロセス全体で共有するプロファイラ（無効な間は接続を包まない）
+_profiler = QueryProfiler()
+
+
+def get_query_profiler() -> QueryProfiler:
+    """共有のSQLプロファイラを取得"""
+    return _profiler
+
+
+def configure_query_profiler(features: Dict[str, Any]) -> QueryProfiler:
+    """設定（features）からプロファイラを設定"""
+    _profiler.enabled = features.get('sql_profiling', False)
+    _profiler.slow_query_ms = features.get('sql_slow_query_ms', 100)
+    _profiler.explain_slow = features.get('sql_explain_slow', True)
+    return _profiler
+
+
+async def open_connection(db_path: str) -> Union[ProfiledConnection, aiosqlite.Connection]:
+    """DB接続を開く（閉じるのは呼び出し側）"""
+    connection = await aiosqlite.connect(db_path)
+    if _profiler.enabled:
+        return ProfiledConnection(connection, _profiler)
+    return connection
+
+
+class ReadConnectionPool:
+    """検索セッションが使い回す読み取り接続のプール
+
+    借りた接続は返却時にトランザクションを閉じた状態にしておくこと。
+    接続ごとのスレッドはプロセスの終了を妨げるため、使い終わったらclose()で閉じる。
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle: List[Union[ProfiledConnection, aiosqlite.Connection]] = []
+        self._closed = False
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self) -> Union[ProfiledConnection, aiosqlite.Connection]:
+        """空いている接続を借りる（なければ開く）"""
+        if self._idle:
+            self.reused += 1
+            return self._idle.pop()
+        connection = await open_connection(self.db_path)
+        connection.row_factory = aiosqlite.Row
+        self.opened += 1
+        return connection
+
+    async def release(self, connection: Union[ProfiledConnection, aiosqlite.Connection]):
+        """接続を返す（プールが閉じているか空きが上限に達していれば閉じる）"""
+        if self._closed or len(self._idle) >= self.max_idle:
+            await connection.close()
+        else:
+            self._idle.append(connection)
+
+    async def close(self):
+        """空いている接続をすべて閉じ、以後の返却分も閉じる"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.warning(f"読み取り接続の終了エラー: {e}")
+
+
+# DBパス → 読み取り接続のプール（有効にしたプロセスのみ）
+_read_pools: Dict[str, ReadConnectionPool] = {}
+
+
+def get_read_pool(db_path: str) -> Optional[ReadConnectionPool]:
+    """DBパスに対応する読み取り接続のプールを取得（有効にしていなければNone）"""
+    return _read_pools.get(os.path.abspath(db_path))
+
+
+def enable_read_pool(db_path: str, max_idle: int = 4) -> ReadConnectionPool:
+    """DBパスの読み取り接続のプールを有効にする（有効なら既存のものを返す）"""
+    key = os.path.abspath(db_path)
+    pool = _read_pools.get(key)
+    if pool is None:
+        pool = ReadConnectionPool(key, max_idle)
+        _read_pools[key] = pool
+    return pool
+
+
+async def close_read_pool(db_path: str):
+    """DBパスの読み取り接続のプールを閉じて無効にする"""
+    pool = _read_pools.pop(os.path.abspath(db_path), None)
+    if pool is not None:
+        await pool.close()
+
+
+@asynccontextmanager
+async def connect(db_path: str) -> AsyncIterator[Union[ProfiledConnection, aiosqlite.Connection]]:
+    """DB接続を開き、with終了時に閉じる"""
+    connection = await open_connection(db_path)
+    try:
+        yield connection
+    finally:
+        await connection.close()
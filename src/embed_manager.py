@@ -6,7 +6,9 @@ import asyncio
 import aiosqlite
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from constants import WILDCARD_CHARS, DISCORD_SELECT_MAX_OPTIONS, VIEW_TIMEOUT
+from constants import WILDCARD_CHARS, DISCORD_SELECT_MAX_OPTIONS, DISCORD_EMBED_MAX_FIELDS, VIEW_TIMEOUT
+from db_connection import connect
+from ranked_results import iter_unordered
 
 logger = logging.getLogger(__name__)
 
@@ -1053,7 +1055,7 @@ class EmbedManager:
                 return None
             
             # データベースから同じ名前（ワイルドカード部分除く）のアイテムを検索
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
+            async with connect(self.db_manager.db_path) as db:
                 db.row_factory = aiosqlite.Row
                 
                 table_map = {
@@ -1190,9 +1192,9 @@ class EmbedManager:
             end_idx = start_idx + page_size
             page_results = results[start_idx:end_idx]
             
-            # 同名NPCの検出
+            # 同名NPCの検出（全件の名前を数えるだけなので、スコア順には並べない）
             npc_names = {}
-            for item in results:
+            for item in iter_unordered(results):
                 if item.get('item_type') == 'npcs':
                     name = item.get('formal_name', '')
                     if name not in npc_names:
@@ -1392,6 +1394,273 @@ class EmbedManager:
                 description="統計表示中にエラーが発生しました",
                 color=discord.Color.red()
             )
+    
+    async def create_cache_stats_embed(self, cache_stats: Dict[str, Any], negative_stats: Optional[Dict[str, Any]] = None,
+                                       related_stats: Optional[Dict[str, Any]] = None) -> discord.Embed:
+        """検索キャッシュ統計のEmbedを作成"""
+        try:
+            embed = discord.Embed(
+                title="🗃️ 検索キャッシュ",
+                description="検索結果キャッシュの利用状況",
+                color=discord.Color.blue()
+            )
+            
+            embed.add_field(name="ヒット", value=f"**{cache_stats.get('hits', 0)}**回", inline=True)
+            embed.add_field(name="ミス", value=f"**{cache_stats.get('misses', 0)}**回", inline=True)
+            embed.add_field(name="ヒット率", value=f"**{cache_stats.get('hit_rate', 0.0):.1%}**", inline=True)
+            embed.add_field(
+                name="件数",
+                value=f"{cache_stats.get('size', 0)} / {cache_stats.get('max_size', 0)}",
+                inline=True
+            )
+            embed.add_field(name="追い出し", value=f"{cache_stats.get('evictions', 0)}回", inline=True)
+            embed.add_field(name="データ更新による破棄", value=f"{cache_stats.get('invalidations', 0)}回", inline=True)
+            
+            if negative_stats:
+                embed.add_field(
+                    name="0件クエリ",
+                    value=f"ヒット: **{negative_stats.get('hits', 0)}**回\n"
+                          f"件数: {negative_stats.get('size', 0)} / {negative_stats.get('max_size', 0)}",
+                    inline=False
+                )
+            if related_stats:
+                embed.add_field(
+                    name="関連アイテム",
+                    value=f"ヒット率: **{related_stats.get('hit_rate', 0.0):.1%}**"
+                          f"（{related_stats.get('hits', 0)} / {related_stats.get('hits', 0) + related_stats.get('misses', 0)}回）\n"
+                          f"件数: {related_stats.get('size', 0)} / {related_stats.get('max_size', 0)}",
+                    inline=False
+                )
+            embed.set_footer(text=f"有効期限: {cache_stats.get('ttl', 0)}秒 / カタログ世代: {cache_stats.get('generation')}")
+            
+            return embed
+            
+        except Exception as e:
+            logger.error(f"キャッシュ統計Embed作成エラー: {e}")
+            return discord.Embed(
+                title="エラー",
+                description="統計表示中にエラーが発生しました",
+                color=discord.Color.red()
+            )
+
+    async def create_trace_stats_embed(self, trace_stats: Dict[str, Dict[str, Any]]) -> discord.Embed:
+        """検索段階ごとの所要時間統計のEmbedを作成"""
+        try:
+            embed = discord.Embed(
+                title="⏱️ 検索段階の所要時間",
+                description="検索段階ごとの所要時間・取得件数・SQL実行数",
+                color=discord.Color.blue()
+            )
+            
+            if not trace_stats:
+                embed.description = "計測データがありません（設定の features.search_tracing を有効にしてください）"
+                return embed
+            
+            stage_names = {
+                'exact_formal': '正式名称の完全一致',
+                'exact_common': '一般名称の完全一致',
+                'partial': '部分一致',
+                'level_strip': 'レベル/ランク除去',
+                'wildcard': 'ワイルドカード',
+                'fuzzy': '表記ゆれ',
+                'partial_fallback': '部分一致（最後の手段）',
+                'wildcard_suffix': 'ワイルドカード末尾',
+                'typo': '誤字許容',
+                'related_items': '関連アイテム',
+            }
+            
+            for stage, stats in trace_stats.items():
+                embed.add_field(
+                    name=f"{stage_names.get(stage, stage)}（{stats.get('count', 0)}回）",
+                    value=f"p50: **{stats.get('p50_ms', 0.0):.1f}**ms / "
+                          f"p95: **{stats.get('p95_ms', 0.0):.1f}**ms / "
+                          f"p99: **{stats.get('p99_ms', 0.0):.1f}**ms\n"
+                          f"平均件数: {stats.get('avg_rows', 0.0):.1f} / "
+                          f"平均SQL数: {stats.get('avg_statements', 0.0):.1f}",
+                    inline=False
+                )
+            
+            return embed
+            
+        except Exception as e:
+            logger.error(f"検索段階統計Embed作成エラー: {e}")
+            return discord.Embed(
+                title="エラー",
+                description="統計表示中にエラーが発生しました",
+                color=discord.Color.red()
+            )
+
+    async def create_sql_profile_embed(self, profile_stats: Dict[str, Any]) -> discord.Embed:
+        """SQLプロファイルのEmbedを作成"""
+        try:
+            embed = discord.Embed(
+                title="🧮 SQLプロファイル",
+                description=f"SQL文 {profile_stats.get('statements', 0)}種類 / "
+                            f"実行 {profile_stats.get('executions', 0)}回 / "
+                            f"合計 {profile_stats.get('total_ms', 0.0):.1f}ms",
+                color=discord.Color.blue()
+            )
+            
+            if not profile_stats.get('enabled'):
+                embed.description = "SQLプロファイルは無効です（設定の features.sql_profiling を有効にしてください）"
+                return embed
+            
+            def format_statements(statements: List[Dict[str, Any]]) -> str:
+                lines = []
+                for stats in statements:
+                    sql = stats.get('sql', '')
+                    if len(sql) > 80:
+                        sql = sql[:77] + '...'
+                    lines.append(
+                        f"`{sql}`\n{stats.get('count', 0)}回 / 合計 {stats.get('total_ms', 0.0):.1f}ms / "
+                        f"最大 {stats.get('max_ms', 0.0):.1f}ms / {stats.get('rows', 0)}行"
+                    )
+                return '\n'.join(lines)[:1024] or "なし"
+            
+            embed.add_field(name="所要時間の合計が大きいSQL", value=format_statements(profile_stats.get('slowest', [])), inline=False)
+            embed.add_field(name="実行回数が多いSQL", value=format_statements(profile_stats.get('most_frequent', [])), inline=False)
+            
+            return embed
+            
+        except Exception as e:
+            logger.error(f"SQLプロファイルEmbed作成エラー: {e}")
+            return discord.Embed(
+                title="エラー",
+                description="統計表示中にエラーが発生しました",
+                color=discord.Color.red()
+            )
+    
+    async def create_crafting_tree_embed(self, crafting: Dict[str, Any]) -> discord.Embed:
+        """製作ツリーと基本素材の合計のEmbedを作成"""
+        try:
+            item = crafting.get('item') or {}
+            quantity = crafting.get('quantity', 1)
+            embed = discord.Embed(
+                title=f"🛠️ {item.get('formal_name', '')} ×{quantity} の製作ツリー",
+                description="必要素材を基本素材まで展開した結果",
+                color=discord.Color.orange()
+            )
+            
+            # ツリーを罫線付きの行に変換
+            lines = []
+            
+            def add_lines(node: Dict[str, Any], prefix: str, is_last: bool, is_root: bool):
+                label = f"{node['name']} ×{node['quantity']}"
+                if node.get('cycle'):
+                    label += " （循環のため展開しない）"
+                if is_root:
+                    lines.append(label)
+                    child_prefix = ''
+                else:
+                    lines.append(f"{prefix}{'└' if is_last else '├'} {label}")
+                    child_prefix = prefix + ('　' if is_last else '│')
+                children = node.get('children', [])
+                for i, child in enumerate(children):
+                    add_lines(child, child_prefix, i == len(children) - 1, False)
+                if node.get('truncated'):
+                    lines.append(f"{child_prefix}└ …")
+            
+            if crafting.get('tree'):
+                add_lines(crafting['tree'], '', True, True)
+            tree_text = '\n'.join(lines)
+            if len(tree_text) > 1000:
+                tree_text = tree_text[:1000].rsplit('\n', 1)[0] + '\n…'
+            embed.add_field(name="製作ツリー", value=f"```\n{tree_text}\n```", inline=False)
+            
+            base_materials = crafting.get('base_materials', [])
+            base_text = '\n'.join(f"• {name} ×{count}" for name, count in base_materials)
+            embed.add_field(name=f"基本素材の合計（{len(base_materials)}種類）", value=base_text[:1024] or "なし", inline=False)
+            
+            crafted_items = crafting.get('crafted_items', [])
+            if crafted_items:
+                crafted_text = '\n'.join(f"• {name} ×{count}" for name, count in crafted_items)
+                embed.add_field(name="途中で作る装備", value=crafted_text[:1024], inline=False)
+            
+            embed.set_footer(text=f"展開の深さ: {crafting.get('depth', 0)}段")
+            return embed
+            
+        except Exception as e:
+            logger.error(f"製作ツリーEmbed作成エラー: {e}")
+            return discord.Embed(
+                title="エラー",
+                description="製作ツリーの表示中にエラーが発生しました",
+                color=discord.Color.red()
+            )
+    
+    async def create_shopping_list_embed(self, shopping: Dict[str, Any]) -> discord.Embed:
+        """複数の対象の基本素材の合計と入手先のEmbedを作成"""
+        try:
+            targets = shopping.get('targets', [])
+            embed = discord.Embed(
+                title=f"🛒 買い物リスト（{len(targets)}件）",
+                description='\n'.join(f"• {target['name']} ×{target['quantity']}" for target in targets)[:2000] or "対象が見つかりませんでした",
+                color=discord.Color.green()
+            )
+            
+            unresolved = shopping.get('unresolved', [])
+            if unresolved:
+                lines = []
+                for target in unresolved:
+                    line = f"• {target['name']}"
+                    if target.get('suggestions'):
+                        line += f"（もしかして: {', '.join(target['suggestions'])}）"
+                    lines.append(line)
+                embed.add_field(name="見つからなかった名前", value='\n'.join(lines)[:1024], inline=False)
+            
+            # 素材ごとに1フィールド（上限を超える分は件数だけ表示）
+            materials = shopping.get('materials', [])
+            max_materials = DISCORD_EMBED_MAX_FIELDS - 4
+            for material in materials[:max_materials]:
+                lines = []
+                if material.get('mobs'):
+                    mobs = [mob['name'] + (f"({mob['area']})" if mob.get('area') else '') for mob in material['mobs']]
+                    lines.append(f"モブ: {', '.join(mobs)}")
+                if material.get('gatherings'):
+                    spots = [f"{spot['location']}({spot['method']})" if spot.get('method') else spot['location']
+                             for spot in material['gatherings']]
+                    lines.append(f"採集: {', '.join(spots)}")
+                # NPCは安い順に3件まで
+                offers = material.get('npcs', [])
+                for offer in offers[:3]:
+                    if offer.get('gold') is not None:
+                        lines.append(f"NPC: {offer['name']} {offer['required']}×{offer['times']}回 = {offer['gold']:,}G")
+                    else:
+                        lines.append(f"NPC: {offer['name']} {offer['required']}×{offer['times']}回".rstrip())
+                if len(offers) > 3:
+                    lines.append(f"NPC: ほか{len(offers) - 3}件")
+                if not lines and material.get('acquisition'):
+                    lines.append(f"入手方法: {material['acquisition']}")
+                embed.add_field(
+                    name=f"{material['name']} ×{material['quantity']}",
+                    value='\n'.join(lines)[:1024] or "入手先の情報なし",
+                    inline=False
+                )
+            if len(materials) > max_materials:
+                rest = ', '.join(f"{material['name']} ×{material['quantity']}" for material in materials[max_materials:])
+                embed.add_field(name=f"ほか{len(materials) - max_materials}種類", value=rest[:1024], inline=False)
+            
+            crafted_items = shopping.get('crafted_items', [])
+            if crafted_items:
+                crafted_text = '\n'.join(f"• {name} ×{count}" for name, count in crafted_items)
+                embed.add_field(name="途中で作る装備", value=crafted_text[:1024], inline=False)
+            
+            if shopping.get('priced_materials'):
+                embed.add_field(
+                    name="NPCから購入する場合のGold",
+                    value=f"`{shopping.get('total_gold', 0):,} G`（{shopping['priced_materials']}/{len(materials)}種類）",
+                    inline=False
+                )
+            
+            embed.set_footer(text=f"基本素材: {len(materials)}種類")
+            return embed
+            
+        except Exception as e:
+            logger.error(f"買い物リストEmbed作成エラー: {e}")
+            return discord.Embed(
+                title="エラー",
+                description="買い物リストの表示中にエラーが発生しました",
+                color=discord.Color.red()
+            )
 
 # Viewクラス定義
 class ItemDetailView(discord.ui.View):
@@ -2571,7 +2840,7 @@ class NewRelatedItemSelect(discord.ui.Select):
                         db = DatabaseManager()
                         
                         try:
-                            async with aiosqlite.connect(db.db_path) as conn:
+                            async with connect(db.db_path) as conn:
                                 conn.row_factory = aiosqlite.Row
                                 
                                 # 特定の素材が含まれる採集情報を取得
@@ -3038,7 +3307,7 @@ class LocationAcquisitionSelect(discord.ui.Select):
             from database import DatabaseManager
             db = DatabaseManager()
             
-            async with aiosqlite.connect(db.db_path) as conn:
+            async with connect(db.db_path) as conn:
                 conn.row_factory = aiosqlite.Row
                 results = []
                 
@@ -0,0 +1,354 @@
+import logging
+import os
+import re
+import aiosqlite
+from bisect import bisect_left
+from fnmatch import translate
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
+from constants import ALL_TABLES, WILDCARD_SET
+from db_connection import connect
+from ngram_index import NGramIndex
+from recipe_graph import RecipeGraph
+from suggestion_trie import SuggestionTrie
+from typo_index import TypoIndex
+from wildcard_matcher import WildcardMatcher
+from text_normalizer import split_tier_suffix, to_fuzzy_key, to_search_key
+
+logger = logging.getLogger(__name__)
+
+# テーブルごとの名称カラム（正式名称, 一般名称）
+NAME_COLUMNS = {
+    'equipments': ('formal_name', 'common_name'),
+    'materials': ('formal_name', 'common_name'),
+    'mobs': ('formal_name', 'common_name'),
+    'npcs': ('name', None),
+    'gatherings': ('location', None),
+}
+
+
+def _key_range(sorted_keys: List[Tuple[str, int]], prefix: str) -> List[int]:
+    """ソート済み (キー, インデックス) からprefixで始まるものを二分探索で取り出す"""
+    start = bisect_left(sorted_keys, (prefix,))
+    end = bisect_left(sorted_keys, (prefix + '\uffff',))
+    return [index for _, index in sorted_keys[start:end]]
+
+
+class ItemCatalog:
+    """アイテムテーブル全体の読み取り専用スナップショット
+
+    CSV取り込みのたびに丸ごと作り直して差し替える。
+    保持している行は全リクエストで共有するため、外部にはコピーを返す。
+    """
+
+    def __init__(self, rows_by_table: Dict[str, List[Dict[str, Any]]], generation: int = 0,
+                 popularity: Optional[Dict[str, int]] = None):
+        self.generation = generation
+        self._entries: List[Dict[str, Any]] = []
+        self._formal_keys: List[str] = []
+        self._common_keys: List[str] = []
+        self._by_formal: Dict[str, List[int]] = {}
+        self._by_common: Dict[str, List[int]] = {}
+        self._by_key: Dict[tuple, int] = {}
+        self._wildcard_entries: Dict[str, List[int]] = {}
+        # 名称（正式名称・一般名称・NPC名・採集場所）の部分一致用インデックス
+        self._name_index = NGramIndex()
+        # 表記ゆれを吸収したキーの部分一致用インデックス
+        self._fuzzy_index = NGramIndex()
+
+        # テーブル順（equipments → materials → mobs → npcs → gatherings）で登録
+        for table in ALL_TABLES:
+            formal_column, common_column = NAME_COLUMNS[table]
+            for row in rows_by_table.get(table, []):
+                entry = dict(row)
+                entry['item_type'] = table
+                # 検索キーはCSV取り込み時に保存済み（未移行のDBではここで生成）
+                for column in (formal_column, common_column):
+                    if column and entry.get(f'{column}_key') is None:
+                        entry[f'{column}_key'] = to_search_key(entry.get(column))
+                if formal_column != 'formal_name':
+                    entry['formal_name'] = entry.get(formal_column)
+                    entry['formal_name_key'] = entry.get(f'{formal_column}_key')
+                self._add_entry(entry, common_column)
+
+        # 検索候補（正式名称・一般名称・NPC名・採集場所）のトライ木
+        self._suggestions = SuggestionTrie()
+        self._suggestion_names: Dict[str, Set[str]] = {}
+        self._popularity: Dict[str, int] = dict(popularity or {})
+        for entry in self._entries:
+            names = [entry.get('formal_name')]
+            names.extend((entry.get('common_name') or '').split(','))
+            for name in names:
+                name = (name or '').strip()
+                key = to_search_key(name)
+                if key:
+                    self._suggestions.add(name, key, self._popularity.get(key, 0))
+                    self._suggestion_names.setdefault(key, set()).add(name)
+
+        # ワイルドカード名のアイテムを具体名から引く照合器
+        self._wildcard_matcher = WildcardMatcher()
+        for indices in self._wildcard_entries.values():
+            for index in indices:
+                self._wildcard_matcher.add(self._entries[index].get('formal_name') or '', index)
+
+        # ワイルドカード検索用のソート済みキー（前方一致用と、後方一致用の逆順キー）
+        named = [(key, i) for i, key in enumerate(self._formal_keys) if key]
+        named += [(key, i) for i, key in enumerate(self._common_keys) if key]
+        self._sorted_keys = sorted(named)
+        self._sorted_reversed_keys = sorted((key[::-1], i) for key, i in named)
+
+        # レベル/ランク違いのアイテム群（基本名の検索キー → 段階順のインデックス）
+        families: Dict[str, Dict[int, Optional[int]]] = {}
+        for index, entry in enumerate(self._entries):
+            names = [entry.get('formal_name')]
+            names.extend((entry.get('common_name') or '').split(','))
+            for name in names:
+                base, tier = split_tier_suffix(name or '')
+                key = to_search_key(base)
+                if key:
+                    families.setdefault(key, {}).setdefault(index, tier)
+        self._families: Dict[str, List[Tuple[Optional[int], int]]] = {
+            key: sorted(((tier, index) for index, tier in members.items()),
+                        key=lambda member: (member[0] is not None, member[0] or 0, member[1]))
+            for key, members in families.items()
+        }
+
+        # 誤字候補の索引（正式名称・一般名称の検索キー）
+        self._typo_index = TypoIndex()
+        for key in set(self._by_formal) | set(self._by_common):
+            self._typo_index.add(key)
+
+        # 装備の製作レシピ（基本素材までの展開は構築時に計算済み）
+        self.recipes = RecipeGraph(entry for entry in self._entries if entry['item_type'] == 'equipments')
+
+    def _add_entry(self, entry: Dict[str, Any], common_column: Optional[str]):
+        """エントリと名称インデックスを登録"""
+        index = len(self._entries)
+        self._entries.append(entry)
+        self._by_key[(entry['item_type'], entry.get('id'))] = index
+
+        formal_key = entry.get('formal_name_key') or ''
+        common_key = (entry.get(f'{common_column}_key') if common_column else None) or ''
+        self._formal_keys.append(formal_key)
+        self._common_keys.append(common_key)
+        self._name_index.add(index, formal_key)
+        self._name_index.add(index, common_key)
+        self._fuzzy_index.add(index, to_fuzzy_key(formal_key))
+        self._fuzzy_index.add(index, to_fuzzy_key(common_key))
+
+        if formal_key:
+            self._by_formal.setdefault(formal_key, []).append(index)
+
+        # 一般名称はカンマ区切りで複数格納されている場合がある
+        if common_key:
+            for key in {common_key, *(part.strip() for part in common_key.split(','))}:
+                if key:
+                    self._by_common.setdefault(key, []).append(index)
+
+        if any(char in WILDCARD_SET for char in entry.get('formal_name') or ''):
+            self._wildcard_entries.setdefault(entry['item_type'], []).append(index)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _copies(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        """登録順に並べたエントリのコピーを返す"""
+        return [dict(self._entries[i]) for i in sorted(set(indices))]
+
+    def get(self, item_type: str, item_id: Any) -> Optional[Dict[str, Any]]:
+        """item_typeとidでエントリを取得"""
+        index = self._by_key.get((item_type, item_id))
+        return dict(self._entries[index]) if index is not None else None
+
+    def find_exact_formal(self, query: str) -> List[Dict[str, Any]]:
+        """正式名称（NPC名・採集場所を含む）の検索キー完全一致"""
+        return self._copies(self._by_formal.get(to_search_key(query), []))
+
+    def find_exact_common(self, query: str) -> List[Dict[str, Any]]:
+        """一般名称の検索キー完全一致（カンマ区切りの各名称を対象）"""
+        return self._copies(self._by_common.get(to_search_key(query), []))
+
+    def find_partial(self, query: str) -> List[Dict[str, Any]]:
+        """正式名称・一般名称の検索キー部分一致"""
+        key = to_search_key(query)
+        if not key:
+            return []
+        return self._copies(self._name_index.search(key))
+
+    def find_fuzzy(self, query: str) -> List[Dict[str, Any]]:
+        """表記ゆれを吸収したキーでの部分一致"""
+        key = to_fuzzy_key(query)
+        if not key:
+            return []
+        return self._copies(self._fuzzy_index.search(key))
+
+    def _wildcard_candidates(self, pattern: str) -> Iterable[int]:
+        """パターンのリテラル部分で索引を引き、照合対象を絞り込む"""
+        # 文字クラス（[...]）を含む場合はリテラルを特定できないため全件
+        if '[' in pattern:
+            return range(len(self._entries))
+
+        literals = re.split(r'[*?]', pattern)
+        prefix, suffix = literals[0], literals[-1]
+        if prefix:
+            return _key_range(self._sorted_keys, prefix)
+        if suffix:
+            return _key_range(self._sorted_reversed_keys, suffix[::-1])
+
+        # 両端がワイルドカードなら最長のリテラルを含むものに絞る
+        longest = max(literals, key=len)
+        if longest:
+            return self._name_index.search(longest)
+        return range(len(self._entries))
+
+    def find_wildcard(self, pattern: str) -> List[Dict[str, Any]]:
+        """fnmatch形式のパターンで正式名称・一般名称の検索キーを照合"""
+        pattern = to_search_key(pattern)
+        matcher = re.compile(translate(pattern))
+        return self._copies(
+            i for i in set(self._wildcard_candidates(pattern))
+            if matcher.match(self._formal_keys[i])
+            or (self._common_keys[i] and matcher.match(self._common_keys[i]))
+        )
+
+    def _exact_name_indices(self, name: str, tables: Set[str]) -> List[int]:
+        """表記どおりの正式名称・一般名称に一致するインデックス（登録順）"""
+        key = to_search_key(name)
+        return sorted(
+            i for i in set(self._by_formal.get(key, []) + self._by_common.get(key, []))
+            if self._entries[i]['item_type'] in tables
+            and name in (self._entries[i].get('formal_name'), self._entries[i].get('common_name'))
+        )
+
+    def find_by_exact_name(self, name: str, tables: Iterable[str]) -> List[Dict[str, Any]]:
+        """表記どおりの正式名称・一般名称の完全一致"""
+        return self._copies(self._exact_name_indices(name, set(tables)))
+
+    def resolve_names(self, names: Iterable[str], tables: Iterable[str],
+                      prefixes: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """複数の名前の完全一致をまとめて引く（名前 → エントリ）
+
+        prefixesを指定すると、その文字を先頭に付けた名前（例：「*破片」）の一致を後ろに続ける。
+        """
+        tables = set(tables)
+        prefixes = list(prefixes)
+        resolved = {}
+        for name in dict.fromkeys(names):
+            indices: Dict[int, None] = {}
+            for candidate in [name] + [prefix + name for prefix in prefixes]:
+                indices.update(dict.fromkeys(self._exact_name_indices(candidate, tables)))
+            resolved[name] = [dict(self._entries[i]) for i in indices]
+        return resolved
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[str]:
+        """検索キーがprefixで始まる名称を人気順に取得"""
+        key = to_search_key(prefix)
+        if not key:
+            return []
+        return self._suggestions.complete(key, limit)
+
+    def record_search(self, query: str, count: int = 1):
+        """検索されたクエリに一致する名称の人気度を加算"""
+        key = to_search_key(query)
+        self._popularity[key] = self._popularity.get(key, 0) + count
+        for name in self._suggestion_names.get(key, ()):
+            self._suggestions.bump(name, count)
+
+    def popularity(self, result: Dict[str, Any]) -> int:
+        """エントリの正式名称・一般名称が検索された回数"""
+        keys = {result.get('formal_name_key')}
+        keys.update(part.strip() for part in (result.get('common_name_key') or '').split(','))
+        return sum(self._popularity.get(key, 0) for key in keys if key)
+
+    def find_typo(self, query: str) -> List[Dict[str, Any]]:
+        """誤字を許容した正式名称・一般名称の一致（編集距離の近い順）
+
+        検索結果として返すため、「もしかして」の候補より厳しい許容距離で引く。
+        """
+        indices: List[int] = []
+        for key, _ in self._typo_index.lookup(to_search_key(query) or '', strict=True):
+            for index in sorted(self._by_formal.get(key, []) + self._by_common.get(key, [])):
+                if index not in indices:
+                    indices.append(index)
+        return [dict(self._entries[i]) for i in indices]
+
+    def did_you_mean(self, query: str, limit: int = 5) -> List[str]:
+        """誤字を許容した名称の候補（編集距離の近い順）"""
+        names: List[str] = []
+        for key, _ in self._typo_index.lookup(to_search_key(query) or ''):
+            for name in sorted(self._suggestion_names.get(key, ())):
+                if name not in names:
+                    names.append(name)
+        return names[:limit]
+
+    def find_family(self, name: str) -> List[Dict[str, Any]]:
+        """nameとレベル/ランク表記だけが違うアイテムを、nameの段階に近い順で返す"""
+        base, tier = split_tier_suffix(name)
+        members = self._families.get(to_search_key(base) or '', [])
+        if tier is not None:
+            # 段階の差が小さい順（同じ差なら低い段階を先に）
+            members = sorted(members, key=lambda member: (abs((member[0] or 0) - tier), member[0] or 0))
+        return [dict(self._entries[index]) for _, index in members]
+
+    def match_wildcard_entries(self, names: Iterable[str], tables: Iterable[str]) -> List[Dict[str, Any]]:
+        """具体名のいずれかにマッチするワイルドカード名のエントリ"""
+        tables = set(tables)
+        indices = set()
+        for name in names:
+            indices.update(self._wildcard_matcher.match(name))
+        return self._copies(i for i in indices if self._entries[i]['item_type'] in tables)
+
+
+# DBパスごとの最新カタログと世代番号
+_catalogs: Dict[str, ItemCatalog] = {}
+_generations: Dict[str, int] = {}
+
+
+def _catalog_key(db_path: str) -> str:
+    return os.path.abspath(db_path)
+
+
+def get_catalog(db_path: str) -> Optional[ItemCatalog]:
+    """読み込み済みのカタログを取得（未読み込みならNone）"""
+    return _catalogs.get(_catalog_key(db_path))
+
+
+async def _fetch_snapshot(db_path: str) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+    """全アイテムテーブルと検索統計を1接続で読み込む"""
+    rows_by_table = {}
+    popularity: Dict[str, int] = {}
+    async with connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        for table in ALL_TABLES:
+            cursor = await db.execute(f"SELECT * FROM {table} ORDER BY id")
+            rows = await cursor.fetchall()
+            rows_by_table[table] = [dict(row) for row in rows]
+
+        # 検索回数はクエリの検索キー単位で合算する
+        try:
+            cursor = await db.execute("SELECT item_name, search_count FROM search_stats")
+            for item_name, search_count in await cursor.fetchall():
+                key = to_search_key(item_name)
+                popularity[key] = popularity.get(key, 0) + (search_count or 0)
+        except aiosqlite.OperationalError as e:
+            logger.warning(f"検索統計を読み込めませんでした: {e}")
+    return rows_by_table, popularity
+
+
+async def load_catalog(db_path: str) -> ItemCatalog:
+    """DBからカタログを構築し、完成後に参照を差し替える"""
+    key = _catalog_key(db_path)
+    rows_by_table, popularity = await _fetch_snapshot(db_path)
+    generation = _generations.get(key, 0) + 1
+    catalog = ItemCatalog(rows_by_table, generation, popularity)
+    _catalogs[key] = catalog
+    _generations[key] = generation
+    logger.info(f"アイテムカタログを読み込みました: {len(catalog)}件 (世代 {generation})")
+    return catalog
+
+
+async def ensure_catalog(db_path: str) -> ItemCatalog:
+    """カタログを取得し、未読み込みであれば読み込む"""
+    catalog = get_catalog(db_path)
+    if catalog is None:
+        catalog = await load_catalog(db_path)
+    return catalog
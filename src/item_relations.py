@@ -0,0 +1,172 @@
+"""アイテム間の関連（必要素材・ドロップ・NPC取引・採集）の辺テーブル
+
+CSV取り込み時に自由記述の列を解析して item_relations に展開しておき、
+「どの装備に使われるか」「どのモブが落とすか」などを索引付きの1回の問い合わせで引けるようにする。
+"""
+import logging
+import re
+import aiosqlite
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from npc_parser import NPCExchangeParser
+from text_normalizer import to_search_key
+
+logger = logging.getLogger(__name__)
+
+# 関連の種類（source_type → target）
+RELATION_REQUIRED_MATERIAL = 'required_material'   # 装備 → 必要素材
+RELATION_DROP = 'drop'                             # モブ → ドロップアイテム
+RELATION_NPC_OBTAINABLE = 'npc_obtainable'         # NPC → 入手できるアイテム
+RELATION_NPC_REQUIRED = 'npc_required'             # NPC → 交換・納品に必要な素材
+RELATION_GATHERED_MATERIAL = 'gathered_material'   # 採集場所 → 入手できる素材
+
+# 関連を展開する元テーブルと、読み込むカラム
+SOURCE_COLUMNS = {
+    'equipments': ['required_materials'],
+    'mobs': ['drops'],
+    'npcs': ['obtainable_items', 'required_materials', 'exp', 'gold'],
+    'gatherings': ['obtained_materials'],
+}
+
+# 抽出規則を変えたら上げる（既存DBの関連は起動時に作り直す）
+RELATIONS_VERSION = 2
+
+_ENTRY_SEPARATOR = re.compile(r'[,\n、]')
+_PRICE = re.compile(r'^\d+G$')
+# 区切りなしで続く「名前:数量」（エフォート・エビデンスLv1:1魔法石Lv1:10）。
+# 数量が続かない「圧縮:」のような見出しは名前に含めない
+_QUANTIFIED_ITEM = re.compile(r'(?P<name>[^:]+?):(?P<quantity>\d+)')
+# クエストの納品条件（ハチの巣のかけら10個の納品）と討伐条件
+_DELIVERY = re.compile(r'^(?P<name>.+?)(?P<quantity>\d+)個の納品$')
+_DEFEAT = re.compile(r'の討伐$')
+# ドロップ名の末尾の個数（霊廟の残骸2）。Lv2・Rank2などの段階表記は除く
+_TRAILING_COUNT = re.compile(r'^(?P<name>.*?[^\d\s])(?P<count>\d+)$')
+_TIER_MARK = re.compile(r'(?:lv|レベル|rank|ランク)$', re.IGNORECASE)
+
+# (source_type, source_id, relation_type, target_name, target_key, quantity, drop_info, exchange_index)
+RelationRow = Tuple[str, int, str, str, str, Optional[str], Optional[str], Optional[int]]
+
+
+def _split_entries(text: Optional[str]) -> List[str]:
+    """カンマ・改行・読点で区切られた項目"""
+    if not text:
+        return []
+    return [entry.strip() for entry in _ENTRY_SEPARATOR.split(str(text)) if entry.strip()]
+
+
+def _split_quantity(entry: str) -> Tuple[str, str]:
+    """「名前:数量」を (名前, 数量) に分ける"""
+    if ':' in entry:
+        name, quantity = entry.split(':', 1)
+        return name.strip(), quantity.strip()
+    return entry.strip(), ''
+
+
+def _split_items(entry: str) -> List[Tuple[str, str]]:
+    """NPCの入手・必要欄の1項目を (名前, 数量) のリストに分ける
+
+    「名前:数量」の連続・見出し付き、クエストの「名前N個の納品」に対応する。
+    数量のない項目はそのまま1件として返す。
+    """
+    items = [(match.group('name').strip(), match.group('quantity'))
+             for match in _QUANTIFIED_ITEM.finditer(entry)]
+    if items:
+        return [(name, quantity) for name, quantity in items if name]
+    delivery = _DELIVERY.match(entry.strip())
+    if delivery:
+        return [(delivery.group('name').strip(), delivery.group('quantity'))]
+    return [(entry.strip(), '')]
+
+
+def _split_drop_count(name: str) -> Tuple[str, str]:
+    """ドロップ名の末尾の個数を分ける（なければ個数は空）"""
+    match = _TRAILING_COUNT.match(name)
+    if not match or _TIER_MARK.search(match.group('name')):
+        return name, ''
+    return match.group('name').strip(), match.group('count')
+
+
+def _split_drop_rate(entry: str) -> Tuple[str, str]:
+    """「名前(ドロップ率)」を (名前, ドロップ率) に分ける"""
+    if '(' in entry:
+        parts = entry.split('(')
+        return parts[0].strip(), parts[1].rstrip(')')
+    return entry.strip(), ''
+
+
+def extract_relations(table: str, row: Dict[str, Any]) -> List[RelationRow]:
+    """1行分の自由記述の列から関連を取り出す"""
+    source_id = row.get('id')
+    relations: List[RelationRow] = []
+
+    def add(relation_type: str, name: str, quantity: str = '', drop_info: str = '', exchange_index: Optional[int] = None):
+        key = to_search_key(name)
+        if key:
+            relations.append((table, source_id, relation_type, name, key,
+                              quantity or None, drop_info or None, exchange_index))
+
+    if table == 'equipments':
+        for entry in _split_entries(row.get('required_materials')):
+            add(RELATION_REQUIRED_MATERIAL, *_split_quantity(entry))
+
+    elif table == 'mobs':
+        for entry in _split_entries(row.get('drops')):
+            name, drop_rate = _split_drop_rate(entry)
+            add(RELATION_DROP, name, drop_info=drop_rate)
+            # 「霊廟の残骸2」は個数を除いた名前のアイテムのドロップとしても登録する
+            base, count = _split_drop_count(name)
+            if count:
+                add(RELATION_DROP, base, count, drop_rate)
+
+    elif table == 'npcs':
+        exchanges = NPCExchangeParser.parse_exchange_items(
+            row.get('obtainable_items', ''),
+            row.get('required_materials', ''),
+            row.get('exp', ''),
+            row.get('gold', '')
+        )
+        for exchange in exchanges:
+            index = exchange.get('index')
+            obtainable = exchange.get('obtainable_item')
+            if obtainable:
+                for name, quantity in _split_items(obtainable):
+                    add(RELATION_NPC_OBTAINABLE, name, quantity, exchange_index=index)
+            # 複数素材は「素材A:2 + 素材B:3」の形で返る。価格（50G）と討伐条件は素材ではない
+            for part in (exchange.get('required_materials') or '').split(' + '):
+                part = part.strip()
+                if part and not _PRICE.match(part) and not _DEFEAT.search(part):
+                    for name, quantity in _split_items(part):
+                        add(RELATION_NPC_REQUIRED, name, quantity, exchange_index=index)
+
+    elif table == 'gatherings':
+        for entry in _split_entries(row.get('obtained_materials')):
+            add(RELATION_GATHERED_MATERIAL, entry)
+
+    return relations
+
+
+async def rebuild_relations(db: aiosqlite.Connection, tables: Optional[Iterable[str]] = None) -> int:
+    """指定テーブル（省略時は全元テーブル）の関連を作り直し、登録した件数を返す（コミットは呼び出し側）"""
+    total = 0
+    for table in (tables if tables is not None else SOURCE_COLUMNS):
+        columns = SOURCE_COLUMNS.get(table)
+        if not columns:
+            continue
+
+        await db.execute("DELETE FROM item_relations WHERE source_type = ?", (table,))
+        cursor = await db.execute(f"SELECT id, {', '.join(columns)} FROM {table}")
+        rows = await cursor.fetchall()
+
+        relations: List[RelationRow] = []
+        for values in rows:
+            relations.extend(extract_relations(table, dict(zip(['id', *columns], values))))
+        if relations:
+            await db.executemany(
+                """
+                INSERT INTO item_relations
+                    (source_type, source_id, relation_type, target_name, target_key, quantity, drop_info, exchange_index)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                relations
+            )
+        total += len(relations)
+    return total
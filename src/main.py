@@ -12,8 +12,12 @@ from typing import Optional, List, Dict, Any
 
 from database import DatabaseManager
 from search_engine import SearchEngine
+from ranked_results import ChainedResults
 from embed_manager import EmbedManager, LocationAcquisitionView
 from csv_manager import CSVManager
+from recipe_graph import parse_target
+from shopping_list import MAX_SHOPPING_TARGETS, parse_targets
+from db_connection import close_read_pool, configure_query_profiler, enable_read_pool, get_query_profiler
 
 # 環境変数を読み込み
 load_dotenv()
@@ -50,6 +54,7 @@ class ItemReferenceBot(commands.Bot):
         logger.info(f"コマンドプレフィックス: '{self.command_prefix}'")
         
         # コンポーネントの初期化
+        configure_query_profiler(self.config.get('features', {}))
         self.db_manager = DatabaseManager(self.config['database']['path'])
         self.search_engine = SearchEngine(self.db_manager, self.config)
         self.embed_manager = EmbedManager(self.config)
@@ -61,6 +66,8 @@ class ItemReferenceBot(commands.Bot):
         self.processing_messages = set()
         # 古いメッセージIDを定期的にクリア（メモリ節約）
         self.last_cleanup = asyncio.get_event_loop().time()
+        # 関連アイテムの事前計算タスク
+        self.related_prewarm_task: Optional[asyncio.Task] = None
         
     def load_config(self) -> Dict[str, Any]:
         """設定ファイルを読み込み"""
@@ -94,6 +101,13 @@ class ItemReferenceBot(commands.Bot):
             # データベースの初期化
             await self.db_manager.initialize_database()
             
+            # 検索用の読み取り接続をリクエスト間で使い回す
+            enable_read_pool(self.db_manager.db_path, self.search_engine.read_connections)
+            
+            # 検索用のアイテムカタログを読み込み
+            await self.search_engine.load_catalog()
+            self.schedule_related_prewarm()
+            
             # スラッシュコマンドを同期
             await self.tree.sync()
             logger.info("スラッシュコマンドの同期が完了しました")
@@ -103,6 +117,24 @@ class ItemReferenceBot(commands.Bot):
             logger.error(f"BOTの初期化に失敗: {e}")
             raise
     
+    async def close(self):
+        """Bot終了時に読み取り接続のプールも閉じる"""
+        if self.related_prewarm_task is not None:
+            self.related_prewarm_task.cancel()
+        await close_read_pool(self.db_manager.db_path)
+        await super().close()
+    
+    def schedule_related_prewarm(self):
+        """検索ランキング上位のアイテムの関連アイテムをバックグラウンドで事前計算"""
+        count = self.config.get('features', {}).get('related_prewarm_count', 50)
+        if count <= 0:
+            return
+        
+        # データ更新で不要になった前回の計算は打ち切る
+        if self.related_prewarm_task is not None and not self.related_prewarm_task.done():
+            self.related_prewarm_task.cancel()
+        self.related_prewarm_task = asyncio.create_task(self.search_engine.prewarm_related_items(count))
+    
     async def on_ready(self):
         """Bot準備完了時の処理"""
         import os
@@ -199,13 +231,19 @@ class ItemReferenceBot(commands.Bot):
             queries = [q.strip() for q in query.split() if q.strip()]
             queries = queries[:self.config['features']['max_search_items']]
             
-            results = []
-            for q in queries:
-                search_results = await self.search_engine.search(q)
-                if search_results:
-                    results.extend(search_results)
-                    # 検索統計を更新
-                    await self.db_manager.update_search_stats(q)
+            # 全クエリをまとめて検索（結果は表示するページの分だけ並べる）
+            result_sets = []
+            matched_queries = []
+            for q, search_results in zip(queries, await self.search_engine.search_many(queries)):
+                # 誤字を許容した候補だけの場合は一致とせず、見つからなかったときの候補として出す
+                if search_results and not search_results[0].get('typo_suggestion'):
+                    result_sets.append(search_results)
+                    matched_queries.append(q)
+            results = ChainedResults(result_sets)
+            
+            # 検索統計をまとめて更新
+            await self.db_manager.update_search_stats_many(matched_queries)
+            await self.search_engine.record_searches(matched_queries)
             
             # 検索履歴を追加
             await self.db_manager.add_search_history(
@@ -380,6 +418,51 @@ class ItemCommands(commands.Cog):
             logger.error(f"履歴表示エラー: {e}")
             await ctx.reply("履歴表示中にエラーが発生しました")
 
+    @commands.command(name='craft', aliases=['tree'])
+    async def show_crafting_tree(self, ctx, *, target: str = None):
+        """装備の製作ツリーと基本素材の合計を表示（例: craft ウッドトップソード 2）"""
+        try:
+            if not target:
+                await ctx.reply(f"使い方: `{self.bot.command_prefix}craft <装備名> [個数]`")
+                return
+            
+            item_name, quantity = parse_target(target)
+            crafting = await self.bot.search_engine.get_crafting_tree(item_name, quantity)
+            if not crafting:
+                await ctx.reply(f"「{item_name}」の製作レシピが見つかりませんでした")
+                return
+            
+            embed = await self.bot.embed_manager.create_crafting_tree_embed(crafting)
+            await ctx.reply(embed=embed)
+            
+        except Exception as e:
+            logger.error(f"製作ツリー表示エラー: {e}")
+            await ctx.reply("製作ツリーの表示中にエラーが発生しました")
+
+    @commands.command(name='shopping', aliases=['shop'])
+    async def show_shopping_list(self, ctx, *, targets: str = None):
+        """複数の装備に必要な基本素材の合計と入手先を表示（改行・カンマ区切り、例: shopping ウッドソード 2, ストーンソード）"""
+        try:
+            items = parse_targets(targets or '')
+            if not items:
+                await ctx.reply(f"使い方: `{self.bot.command_prefix}shopping <装備名> [個数], <装備名> [個数], ...`（改行区切りも可）")
+                return
+            if len(items) > MAX_SHOPPING_TARGETS:
+                await ctx.reply(f"一度に指定できるのは{MAX_SHOPPING_TARGETS}件までです")
+                return
+            
+            shopping = await self.bot.search_engine.get_shopping_list(items)
+            if not shopping:
+                await ctx.reply("買い物リストの作成中にエラーが発生しました")
+                return
+            
+            embed = await self.bot.embed_manager.create_shopping_list_embed(shopping)
+            await ctx.reply(embed=embed)
+            
+        except Exception as e:
+            logger.error(f"買い物リスト表示エラー: {e}")
+            await ctx.reply("買い物リストの表示中にエラーが発生しました")
+
 class AdminCommands(commands.Cog):
     def __init__(self, bot: ItemReferenceBot):
         self.bot = bot
@@ -422,6 +505,7 @@ class AdminCommands(commands.Cog):
             )
             
             if result['success']:
+                self.bot.schedule_related_prewarm()
                 await interaction.followup.send(f"✅ {csv_type}データの更新が完了しました\n"
                               f"処理件数: {result['processed']}")
             else:
@@ -434,7 +518,10 @@ class AdminCommands(commands.Cog):
     @app_commands.command(name='stats', description='検索統計やシステム情報を表示')
     @app_commands.describe(stat_type='表示する統計の種類')
     @app_commands.choices(stat_type=[
-        app_commands.Choice(name='検索ランキング', value='search_ranking')
+        app_commands.Choice(name='検索ランキング', value='search_ranking'),
+        app_commands.Choice(name='検索キャッシュ', value='search_cache'),
+        app_commands.Choice(name='検索段階の所要時間', value='search_trace'),
+        app_commands.Choice(name='SQLプロファイル', value='sql_profile')
     ])
     async def show_stats(self, interaction: discord.Interaction, stat_type: str = 'search_ranking'):
         """統計情報を表示"""
@@ -449,6 +536,20 @@ class AdminCommands(commands.Cog):
                 ranking = await self.bot.db_manager.get_search_ranking(10)
                 embed = await self.bot.embed_manager.create_stats_embed(ranking, 'search_ranking')
                 await interaction.followup.send(embed=embed)
+            elif stat_type == 'search_cache':
+                cache_stats = self.bot.search_engine.get_cache_stats()
+                negative_stats = self.bot.search_engine.get_negative_cache_stats()
+                related_stats = self.bot.search_engine.get_related_cache_stats()
+                embed = await self.bot.embed_manager.create_cache_stats_embed(cache_stats, negative_stats, related_stats)
+                await interaction.followup.send(embed=embed)
+            elif stat_type == 'search_trace':
+                trace_stats = self.bot.search_engine.get_trace_stats()
+                embed = await self.bot.embed_manager.create_trace_stats_embed(trace_stats)
+                await interaction.followup.send(embed=embed)
+            elif stat_type == 'sql_profile':
+                profile_stats = get_query_profiler().get_stats(5)
+                embed = await self.bot.embed_manager.create_sql_profile_embed(profile_stats)
+                await interaction.followup.send(embed=embed)
                 
         except Exception as e:
             logger.error(f"統計表示エラー: {e}")
@@ -737,6 +838,7 @@ class AdminCommands(commands.Cog):
             result = await self.bot.csv_manager.process_csv_upload(attachment, csv_type)
             
             if result['success']:
+                self.bot.schedule_related_prewarm()
                 embed = discord.Embed(
                     title="✅ CSV アップロード成功",
                     description=result['message'],
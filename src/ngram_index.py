@@ -0,0 +1,50 @@
+from typing import Dict, List, Set, Iterable
+
+
+class NGramIndex:
+    """文字n-gram（1〜max_n文字）の転置インデックス
+
+    日本語の部分一致を全件走査せずに解決するため、
+    登録文字列の全n-gramから文書IDへのポスティングリストを保持する。
+    """
+
+    def __init__(self, max_n: int = 3):
+        self.max_n = max_n
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: Dict[int, List[str]] = {}
+
+    def add(self, doc_id: int, text: str):
+        """文書IDに文字列を登録（同じIDに複数登録可）"""
+        if not text:
+            return
+        self._texts.setdefault(doc_id, []).append(text)
+        for n in range(1, self.max_n + 1):
+            for i in range(len(text) - n + 1):
+                self._postings.setdefault(text[i:i + n], set()).add(doc_id)
+
+    def _grams(self, query: str) -> Iterable[str]:
+        """クエリを覆うmax_n文字のn-gram"""
+        n = self.max_n
+        return {query[i:i + n] for i in range(len(query) - n + 1)}
+
+    def search(self, query: str) -> Set[int]:
+        """queryを部分文字列として含む文書IDの集合"""
+        if not query:
+            return set(self._texts)
+
+        # max_n文字以下ならポスティングリストがそのまま答え
+        if len(query) <= self.max_n:
+            return set(self._postings.get(query, ()))
+
+        # 件数の少ないリストから積集合をとり、最後に実文字列で確認
+        postings = sorted((self._postings.get(gram, set()) for gram in self._grams(query)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+
+        return {
+            doc_id for doc_id in candidates
+            if any(query in text for text in self._texts[doc_id])
+        }
@@ -0,0 +1,130 @@
+import heapq
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class RankedResults(Sequence):
+    """スコア順に並ぶ検索結果
+
+    候補はヒープに積んだままにしておき、参照された順位までだけ取り出して並べる。
+    1ページ目の表示なら上位数件分の取り出しで済む。
+    """
+
+    def __init__(self, ranked: List[Tuple[tuple, Dict[str, Any]]], limit: Optional[int] = None):
+        # (並び順キー, 登録順, 結果) のヒープ。登録順で同点時の順序を安定させる
+        self._heap = [(sort_key, order, result) for order, (sort_key, result) in enumerate(ranked)]
+        heapq.heapify(self._heap)
+        self._sorted: List[Dict[str, Any]] = []
+        self._length = len(self._heap) if limit is None else min(limit, len(self._heap))
+
+    def _fill(self, count: int):
+        """上位count件まで並べる"""
+        count = min(count, self._length)
+        while len(self._sorted) < count:
+            self._sorted.append(heapq.heappop(self._heap)[2])
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(self._length))
+            if indices:
+                self._fill(max(indices) + 1)
+            return [self._sorted[i] for i in indices]
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('RankedResults index out of range')
+        self._fill(index + 1)
+        return self._sorted[index]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(self._length):
+            self._fill(index + 1)
+            yield self._sorted[index]
+
+    def __repr__(self) -> str:
+        return f"RankedResults({self._length}件, 整列済み{len(self._sorted)}件)"
+
+    def unordered(self) -> Iterator[Dict[str, Any]]:
+        """全件を並び順によらず列挙（件数制限がなければ並べ替えない）"""
+        yield from self._sorted
+        remaining = self._length - len(self._sorted)
+        if len(self._heap) > remaining:
+            # 件数制限で外れる候補を除く
+            yield from (entry[2] for entry in heapq.nsmallest(remaining, self._heap))
+        else:
+            yield from (entry[2] for entry in self._heap)
+
+    def copy(self) -> 'RankedResults':
+        """各結果の辞書をコピーした複製（整列済みの分はそのまま引き継ぐ）"""
+        duplicate = RankedResults.__new__(RankedResults)
+        duplicate._sorted = [dict(result) for result in self._sorted]
+        duplicate._heap = [(sort_key, order, dict(result)) for sort_key, order, result in self._heap]
+        duplicate._length = self._length
+        return duplicate
+
+
+class ChainedResults(Sequence):
+    """複数のクエリの検索結果を順につなげた列
+
+    各クエリの結果（RankedResultsなど）は、参照された位置の分だけ取り出す。
+    表示するページを切り出すだけなら、後ろの順位を並べる必要はない。
+    """
+
+    def __init__(self, parts: List[Sequence]):
+        self._parts = [part for part in parts if len(part)]
+        self._length = sum(len(part) for part in self._parts)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            results = []
+            offset = 0
+            for part in self._parts:
+                if start < offset + len(part) and stop > offset:
+                    results.extend(part[max(0, start - offset):stop - offset])
+                offset += len(part)
+            return results
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('ChainedResults index out of range')
+        for part in self._parts:
+            if index < len(part):
+                return part[index]
+            index -= len(part)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for part in self._parts:
+            yield from part
+
+    def __repr__(self) -> str:
+        return f"ChainedResults({self._length}件, {len(self._parts)}クエリ)"
+
+    def unordered(self) -> Iterator[Dict[str, Any]]:
+        """全件を並び順によらず列挙（各クエリの結果を並べ替えない）"""
+        for part in self._parts:
+            yield from iter_unordered(part)
+
+
+def iter_unordered(results) -> Iterator[Dict[str, Any]]:
+    """検索結果の全件を並び順によらず列挙（名前の集計など順位が要らない用途向け）"""
+    if isinstance(results, (RankedResults, ChainedResults)):
+        return results.unordered()
+    return iter(results)
+
+
+def copy_results(results) -> Any:
+    """検索結果の複製（RankedResultsは未整列のまま複製する）"""
+    if isinstance(results, RankedResults):
+        return results.copy()
+    return [dict(result) for result in results]
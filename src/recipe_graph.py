@@ -0,0 +1,206 @@
+"""装備の製作レシピのグラフと素材の展開
+
+装備の必要素材には他の装備も含まれる（ウッドトップソード → ウッドソード:1 + ボアの皮:8）。
+カタログの構築時（CSV取り込みごと）にレシピを有向グラフにまとめ、各アイテムを基本素材まで
+展開しきった合計（閉包）を先に計算しておく。深いレシピでもDBへの問い合わせや再帰なしで答えられる。
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from item_relations import RELATION_REQUIRED_MATERIAL, extract_relations
+from text_normalizer import to_search_key
+
+# 「名前:数量」「名前×数量」「名前 数量」「名前 x数量」の末尾の数量
+_TARGET_QUANTITY = re.compile(r'^(?P<name>.+?)\s*(?:[:：×]|\s[xX]?)\s*(?P<quantity>[0-9０-９]+)\s*個?$')
+
+
+def parse_target(text: str) -> Tuple[str, int]:
+    """「アイテム名」「アイテム名:3」「アイテム名 ×3」などを (名前, 個数) に分ける"""
+    text = text.strip()
+    match = _TARGET_QUANTITY.match(text)
+    if match:
+        return match.group('name').strip(), max(1, int(match.group('quantity')))
+    return text, 1
+
+
+def _to_quantity(value: Optional[str]) -> int:
+    """必要数（数字以外・未記入は1個として扱う）"""
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+class RecipeGraph:
+    """装備の必要素材から作る製作レシピの有向グラフ
+
+    レシピを持つアイテムごとに、基本素材（レシピを持たない素材）の合計・途中で作る装備の合計・
+    展開の深さを構築時にまとめて計算する。
+    循環するレシピは、深さ優先探索で見つけた戻り辺を切って非循環にし、切った先は基本素材として扱う。
+    """
+
+    def __init__(self, equipments: Iterable[Dict[str, Any]]):
+        # 検索キー → 表示名（レシピを持つ装備の正式名称と、素材として書かれた名前）
+        self._names: Dict[str, str] = {}
+        # 検索キー → [(素材の検索キー, 必要数)]（CSVに書かれた順）
+        self._recipes: Dict[str, List[Tuple[str, int]]] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+        for row in equipments:
+            key = to_search_key(row.get('formal_name'))
+            if not key or key in self._recipes:
+                continue
+            recipe = []
+            for relation in extract_relations('equipments', row):
+                if relation[2] != RELATION_REQUIRED_MATERIAL:
+                    continue
+                _, _, _, name, material_key, quantity, _, _ = relation
+                self._names.setdefault(material_key, name)
+                recipe.append((material_key, _to_quantity(quantity)))
+            if recipe:
+                self._names[key] = row.get('formal_name')
+                self._recipes[key] = recipe
+                self._entries[key] = row
+
+        # 循環を見つけて戻り辺を切る
+        self._cut_edges: Set[Tuple[str, str]] = set()
+        self.cycles: List[List[str]] = []
+        self._find_cycles()
+
+        # 非循環になったグラフで、子から順に閉包を計算
+        self._base_totals: Dict[str, Dict[str, int]] = {}
+        self._crafted_totals: Dict[str, Dict[str, int]] = {}
+        self._depths: Dict[str, int] = {}
+        for key in self._topological_order():
+            self._close(key)
+
+    def _children(self, key: str) -> List[Tuple[str, int]]:
+        """切った辺を除いた素材"""
+        return [(child, quantity) for child, quantity in self._recipes.get(key, [])
+                if (key, child) not in self._cut_edges]
+
+    def _find_cycles(self):
+        """深さ優先探索で戻り辺（循環）を見つける（再帰を使わない）"""
+        state: Dict[str, int] = {}  # 1: 探索中, 2: 探索済み
+        for root in self._recipes:
+            if state.get(root):
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [iter(self._recipes[root])]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                    continue
+                child_key = child[0]
+                if state.get(child_key) == 1:
+                    self._cut_edges.add((path[-1], child_key))
+                    cycle = path[path.index(child_key):] + [child_key]
+                    self.cycles.append([self._names.get(key, key) for key in cycle])
+                elif not state.get(child_key) and child_key in self._recipes:
+                    state[child_key] = 1
+                    path.append(child_key)
+                    stack.append(iter(self._recipes[child_key]))
+
+    def _topological_order(self) -> List[str]:
+        """素材が先に来る順（後順）にレシピを並べる"""
+        order: List[str] = []
+        visited: Set[str] = set()
+        for root in self._recipes:
+            if root in visited:
+                continue
+            visited.add(root)
+            stack = [(root, iter(self._children(root)))]
+            while stack:
+                key, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    order.append(key)
+                    stack.pop()
+                elif child[0] in self._recipes and child[0] not in visited:
+                    visited.add(child[0])
+                    stack.append((child[0], iter(self._children(child[0]))))
+        return order
+
+    def _close(self, key: str):
+        """素材の閉包を合算（素材側は計算済み。切った辺の先は基本素材として数える）"""
+        base: Dict[str, int] = {}
+        crafted: Dict[str, int] = {}
+        depth = 0
+        for child, quantity in self._recipes[key]:
+            if (key, child) not in self._cut_edges and child in self._base_totals:
+                crafted[child] = crafted.get(child, 0) + quantity
+                for name, count in self._crafted_totals[child].items():
+                    crafted[name] = crafted.get(name, 0) + count * quantity
+                for name, count in self._base_totals[child].items():
+                    base[name] = base.get(name, 0) + count * quantity
+                depth = max(depth, self._depths[child] + 1)
+            else:
+                base[child] = base.get(child, 0) + quantity
+                depth = max(depth, 1)
+        self._base_totals[key] = base
+        self._crafted_totals[key] = crafted
+        self._depths[key] = depth
+
+    def __len__(self) -> int:
+        return len(self._recipes)
+
+    def __contains__(self, name: str) -> bool:
+        return to_search_key(name) in self._recipes
+
+    def name(self, key: str) -> str:
+        """検索キーの表示名"""
+        return self._names.get(key, key)
+
+    def entry(self, name: str) -> Optional[Dict[str, Any]]:
+        """レシピを持つ装備の行"""
+        entry = self._entries.get(to_search_key(name))
+        return dict(entry) if entry is not None else None
+
+    def depth(self, name: str) -> int:
+        """展開の深さ（レシピがなければ0）"""
+        return self._depths.get(to_search_key(name), 0)
+
+    def base_materials(self, name: str, quantity: int = 1) -> List[Tuple[str, int]]:
+        """基本素材まで展開した必要数の合計（展開順）"""
+        totals = self._base_totals.get(to_search_key(name), {})
+        return [(self.name(key), count * quantity) for key, count in totals.items()]
+
+    def crafted_items(self, name: str, quantity: int = 1) -> List[Tuple[str, int]]:
+        """途中で作る装備の個数の合計（展開順）"""
+        totals = self._crafted_totals.get(to_search_key(name), {})
+        return [(self.name(key), count * quantity) for key, count in totals.items()]
+
+    def expand(self, name: str, quantity: int = 1, max_nodes: int = 200) -> Optional[Dict[str, Any]]:
+        """製作ツリー（各ノードは name / quantity / children / cycle）を作る
+
+        max_nodesを超える分は展開せず、truncatedを立てる。
+        """
+        root_key = to_search_key(name)
+        if root_key not in self._recipes:
+            return None
+
+        count = 0
+
+        def node(key: str, needed: int, parent: Optional[str]) -> Dict[str, Any]:
+            nonlocal count
+            count += 1
+            result = {
+                'name': self.name(key),
+                'quantity': needed,
+                'children': [],
+                'cycle': parent is not None and (parent, key) in self._cut_edges,
+                'truncated': False,
+            }
+            if result['cycle'] or key not in self._recipes:
+                return result
+            for child, child_quantity in self._recipes[key]:
+                if count >= max_nodes:
+                    result['truncated'] = True
+                    break
+                result['children'].append(node(child, needed * child_quantity, key))
+            return result
+
+        # 深さは閉包で上限が分かっているので再帰で組み立てる
+        return node(root_key, quantity, None)
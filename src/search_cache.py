@@ -0,0 +1,193 @@
+import os
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from ranked_results import copy_results
+
+
+class QueryCache:
+    """正規化済みクエリ→検索結果のLRUキャッシュ
+
+    エントリは有効期限（秒）を持ち、カタログの世代が変わった時点で全件破棄する。
+    結果の辞書は呼び出し側で書き換えられるため、格納・取得のたびにコピーする。
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation: Optional[int] = None
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync_generation(self, generation: int):
+        """カタログが更新されていればキャッシュを破棄"""
+        if self.generation != generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.generation = generation
+
+    def _copy(self, value: Any) -> Any:
+        """格納・取得する値のコピー"""
+        return copy_results(value)
+
+    def _lookup(self, key: str, generation: int) -> Optional[Any]:
+        """有効なエントリの値を取得（統計には数えない）"""
+        self._sync_generation(generation)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, key: str, generation: int) -> Optional[List[Dict[str, Any]]]:
+        """キャッシュ済みの結果を取得（なければNone）"""
+        value = self._lookup(key, generation)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self._copy(value)
+
+    def put(self, key: str, generation: int, results: List[Dict[str, Any]]):
+        """検索結果を格納（上限を超えたら最も古いものから削除）"""
+        self._sync_generation(generation)
+        self._entries[key] = (time.monotonic(), self._copy(results))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """全エントリを破棄"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class NegativeCache(QueryCache):
+    """0件だったクエリと、その検索候補のキャッシュ
+
+    雑談や誤字で結果キャッシュの人気クエリが追い出されないよう、別枠で保持する。
+    値は {'miss': 0件と分かっているか, 'suggestions': 候補の件数上限→検索候補}。
+    検索候補は結果のあるクエリ（入力途中の文字列）でも格納するため、0件かどうかは miss だけで判断する。
+    """
+
+    def _copy(self, value: Any) -> Any:
+        return {
+            'miss': value['miss'],
+            'suggestions': {limit: list(suggestions) for limit, suggestions in value['suggestions'].items()},
+        }
+
+    def _entry(self, key: str, generation: int) -> Dict[str, Any]:
+        """既存のエントリのコピー（なければ空のエントリ）"""
+        value = self._lookup(key, generation)
+        return self._copy(value) if value is not None else {'miss': False, 'suggestions': {}}
+
+    def record_miss(self, key: str, generation: int):
+        """0件だったクエリを登録（計算済みの候補は残す）"""
+        value = self._entry(key, generation)
+        if not value['miss']:
+            value['miss'] = True
+            self.put(key, generation, value)
+
+    def is_miss(self, key: str, generation: int) -> bool:
+        """0件と分かっているクエリか"""
+        value = self._lookup(key, generation)
+        if value is None or not value['miss']:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def get_suggestions(self, key: str, generation: int, limit: int) -> Optional[List[str]]:
+        """計算済みの検索候補を取得（なければNone）"""
+        value = self._lookup(key, generation)
+        if value is None or limit not in value['suggestions']:
+            return None
+        return list(value['suggestions'][limit])
+
+    def put_suggestions(self, key: str, generation: int, limit: int, suggestions: List[str]):
+        """検索候補を格納（0件かどうかは変えない）"""
+        value = self._entry(key, generation)
+        value['suggestions'][limit] = list(suggestions)
+        self.put(key, generation, value)
+
+
+class RelatedItemsCache(QueryCache):
+    """(item_type, id) → 関連アイテム検索結果のキャッシュ
+
+    関連アイテムはCSV取り込みまで変わらないため、既定では有効期限を設けずカタログの世代だけで破棄する。
+    値は「区分 → アイテム一覧（採集情報は辞書）」の辞書。
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = float('inf')):
+        super().__init__(max_size, ttl)
+
+    @staticmethod
+    def make_key(item_type: str, item_id: Any) -> str:
+        return f"{item_type}:{item_id}"
+
+    def _copy(self, value: Any) -> Any:
+        return {
+            category: copy_results(items) if isinstance(items, list) else dict(items)
+            for category, items in value.items()
+        }
+
+
+# DBパスごとに共有するキャッシュ（SearchEngineは画面ごとに生成されるため）
+_caches: Dict[str, QueryCache] = {}
+_negative_caches: Dict[str, NegativeCache] = {}
+_related_caches: Dict[str, RelatedItemsCache] = {}
+
+
+def get_query_cache(db_path: str, max_size: int = 256, ttl: float = 600) -> QueryCache:
+    """DBパスに対応する結果キャッシュを取得（なければ作成）"""
+    key = os.path.abspath(db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = QueryCache(max_size, ttl)
+        _caches[key] = cache
+    return cache
+
+
+def get_negative_cache(db_path: str, max_size: int = 1024, ttl: float = 600) -> NegativeCache:
+    """DBパスに対応する0件クエリのキャッシュを取得（なければ作成）"""
+    key = os.path.abspath(db_path)
+    cache = _negative_caches.get(key)
+    if cache is None:
+        cache = NegativeCache(max_size, ttl)
+        _negative_caches[key] = cache
+    return cache
+
+
+def get_related_cache(db_path: str, max_size: int = 512) -> RelatedItemsCache:
+    """DBパスに対応する関連アイテムのキャッシュを取得（なければ作成）"""
+    key = os.path.abspath(db_path)
+    cache = _related_caches.get(key)
+    if cache is None:
+        cache = RelatedItemsCache(max_size)
+        _related_caches[key] = cache
+    return cache
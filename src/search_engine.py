@@ -1,172 +1,294 @@
 import logging
 import aiosqlite
 import re
+import asyncio
 import jaconv
-from fnmatch import fnmatch
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterable, Tuple
 from database import DatabaseManager
-from constants import WILDCARD_CHARS, WILDCARD_SET
+from db_connection import connect
+from constants import WILDCARD_CHARS
+from item_catalog import ItemCatalog, ensure_catalog, get_catalog, load_catalog
+from text_normalizer import split_tier_suffix, to_search_key
+from search_session import current_session, search_session
+from search_cache import NegativeCache, QueryCache, RelatedItemsCache, get_negative_cache, get_query_cache, get_related_cache
+from ranked_results import RankedResults, copy_results
+from candidate_set import CandidateSet
+from item_relations import RELATION_DROP, RELATION_GATHERED_MATERIAL, RELATION_NPC_OBTAINABLE, RELATION_NPC_REQUIRED, RELATION_REQUIRED_MATERIAL
+from search_trace import SearchTracer, get_search_tracer
+from shopping_list import SOURCE_RELATIONS, aggregate_targets, attach_sources
 
 logger = logging.getLogger(__name__)
 
+
+def request_scoped(method):
+    """メソッド全体を1つの検索セッション（共有接続・同一スナップショット）で実行"""
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with search_session(self.db_manager.db_path, self.tracer is not None):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+def traced_stage(stage: str):
+    """メソッド全体を1つの検索段階として計測（計測が有効な場合のみ）"""
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            return await self._run_stage(stage, method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
 class SearchEngine:
     def __init__(self, db_manager: DatabaseManager, config: Dict[str, Any]):
         self.db_manager = db_manager
         self.config = config
-        self.fuzzy_map = {
-            # 長音変換（ー、～、〜）
-            'ー': ['−', '一', '～', '〜'],
-            '−': ['ー', '一', '～', '〜'],
-            '～': ['ー', '−', '一', '〜'],
-            '〜': ['ー', '−', '一', '～'],
-            
-            # カタカナ表記ゆれ
-            'ヴ': ['ブ', 'ビ'],
-            'ヴァ': ['バ'],
-            'ヴィ': ['ビ'],
-            'ヴェ': ['ベ'],
-            'ヴォ': ['ボ'],
-            
-            # ひらがな・カタカナ変換は個別に実装
-            # 数字の全角半角も個別に実装
-            
-            # 特殊文字
-            '&': ['＆', 'アンド'],
-            '＆': ['&', 'アンド'],
-            
-            # よくある誤字
-            'ず': ['づ'],
-            'づ': ['ず'],
-            'じ': ['ぢ'],
-            'ぢ': ['じ'],
-            
-            # 助詞の省略/付加（「の」）
-            # これは別途処理
-        }
+    
+    @property
+    def query_cache(self) -> QueryCache:
+        """検索結果キャッシュ（DBごとに共有）"""
+        features = self.config.get('features', {})
+        return get_query_cache(
+            self.db_manager.db_path,
+            features.get('search_cache_size', 256),
+            features.get('search_cache_ttl', 600)
+        )
+    
+    @property
+    def negative_cache(self) -> NegativeCache:
+        """0件クエリのキャッシュ（DBごとに共有）"""
+        features = self.config.get('features', {})
+        return get_negative_cache(
+            self.db_manager.db_path,
+            features.get('negative_cache_size', 1024),
+            features.get('search_cache_ttl', 600)
+        )
+    
+    @property
+    def related_cache(self) -> RelatedItemsCache:
+        """関連アイテムのキャッシュ（DBごとに共有）"""
+        features = self.config.get('features', {})
+        return get_related_cache(self.db_manager.db_path, features.get('related_cache_size', 512))
+    
+    @property
+    def read_connections(self) -> int:
+        """リクエスト間で使い回す読み取り接続の数（並行するリクエストそれぞれが1接続を使う）"""
+        return self.config.get('features', {}).get('search_read_connections', 4)
+    
+    @property
+    def tracer(self) -> Optional[SearchTracer]:
+        """検索段階の計測記録（設定で有効な場合のみ、DBごとに共有）"""
+        if not self.config.get('features', {}).get('search_tracing', False):
+            return None
+        return get_search_tracer(self.db_manager.db_path)
+    
+    async def _run_stage(self, stage: str, coroutine):
+        """検索段階を実行し、計測が有効なら所要時間・取得件数・SQL実行数を記録"""
+        tracer = self.tracer
+        if tracer is None:
+            return await coroutine
         
-        # ひらがな・カタカナ・漢字の対応表
-        self.reading_map = {
-            # 武器・防具関連
-            'つるぎ': ['剣', '刀', 'ツルギ'],
-            'けん': ['剣', '刀', 'ケン'],
-            'かたな': ['刀', '剣', 'カタナ'],
-            'たて': ['盾', 'タテ'],
-            'よろい': ['鎧', 'ヨロイ'],
-            'かぶと': ['兜', 'カブト'],
-            
-            # 材料関連
-            'いし': ['石', 'イシ'],
-            'きんぞく': ['金属', 'キンゾク'],
-            'ぬの': ['布', 'ヌノ'],
-            'かわ': ['革', '皮', 'カワ'],
-            'き': ['木', 'キ'],
-            'もくざい': ['木材', 'モクザイ'],
-            
-            # モンスター関連
-            'りゅう': ['竜', '龍', 'リュウ'],
-            'ドラゴン': ['竜', '龍', 'どらごん'],
-            'まじゅう': ['魔獣', 'マジュウ'],
-            'ようせい': ['妖精', 'ヨウセイ'],
-            'フェアリー': ['妖精', 'ふぇありー'],
-            
-            # 色関連
-            'あか': ['赤', 'アカ'],
-            'あお': ['青', 'アオ'],
-            'きいろ': ['黄', 'キイロ'],
-            'みどり': ['緑', 'ミドリ'],
-            'くろ': ['黒', 'クロ'],
-            'しろ': ['白', 'シロ'],
-            'きん': ['金', 'キン'],
-            'ぎん': ['銀', 'ギン'],
-            
-            # 自然・元素関連
-            'ひかり': ['光', '輝', 'ヒカリ'],
-            'やみ': ['闇', '暗', 'ヤミ'],
-            'ほのお': ['炎', '焔', 'ホノオ'],
-            'みず': ['水', 'ミズ'],
-            'かぜ': ['風', 'カゼ'],
-            'つち': ['土', '地', 'ツチ'],
-            'こおり': ['氷', 'コオリ'],
-            'かみなり': ['雷', 'カミナリ'],
-            
-            # その他
-            'ちから': ['力', 'チカラ'],
-            'こころ': ['心', 'ココロ'],
-            'たましい': ['魂', 'タマシイ'],
-            'せい': ['聖', '生', '性', 'セイ'],
-            'あんこく': ['暗黒', 'アンコク'],
-        }
+        # SQL実行数は検索セッションの共有接続で数える（並行検索中は同じセッションの分を含む）
+        session = current_session(self.db_manager.db_path)
+        with tracer.stage(stage, session) as record:
+            results = await coroutine
+            if isinstance(results, dict):
+                record.rows = sum(len(items) for items in results.values())
+            else:
+                record.rows = len(results or [])
+        return results
     
+    def get_trace_stats(self) -> Dict[str, Dict[str, Any]]:
+        """検索段階ごとの計測の集計（計測が無効なら空）"""
+        tracer = self.tracer
+        return tracer.get_stats() if tracer is not None else {}
+    
+    @request_scoped
     async def search(self, query: str) -> List[Dict[str, Any]]:
         """統合検索機能 - 優先順位に基づいて検索"""
         try:
             # クエリを正規化
             normalized_query = self._normalize_query(query)
-            all_results = []
-            
-            # 1. 正式名称での完全一致検索
-            exact_formal_results = await self._search_exact_formal_name(normalized_query)
-            all_results.extend(exact_formal_results)
-            
-            # 2. 一般名称での完全一致検索
-            exact_common_results = await self._search_exact_common_name(normalized_query)
-            # 重複を除外しながら追加
-            for result in exact_common_results:
-                if not any(r['id'] == result['id'] and r['item_type'] == result['item_type'] for r in all_results):
-                    all_results.append(result)
-            
-            # 完全一致が見つかった場合は、部分一致も含めて返す
-            if all_results:
-                # 部分一致も検索して追加
-                partial_results = await self._search_partial_match(normalized_query)
-                for result in partial_results:
-                    if not any(r['id'] == result['id'] and r['item_type'] == result['item_type'] for r in all_results):
-                        all_results.append(result)
-                # 重複除去とスコアリングを行う（制限なし）
-                sorted_results = self._deduplicate_and_score_results(all_results, normalized_query)
-                return sorted_results
-            
-            # 3. レベル/ランク表記を除去して再検索
-            cleaned_query = self._remove_level_rank_suffix(normalized_query)
-            if cleaned_query != normalized_query and cleaned_query:
-                logger.info(f"レベル/ランク除去: '{normalized_query}' → '{cleaned_query}'")
-                # レベル/ランクを除去したクエリで再度検索
-                level_removed_results = await self._search_with_cleaned_query(cleaned_query)
-                if level_removed_results:
-                    # オリジナルのクエリ情報を結果に含める
-                    for result in level_removed_results:
-                        result['original_query'] = query
-                        result['cleaned_query'] = cleaned_query
-                    return level_removed_results
             
-            # 4. ワイルドカード検索（*や?が含まれている場合）
-            if self._has_wildcards(query):
-                results = await self._search_wildcard(query)
-                if results:
-                    # ワイルドカード検索の結果にもオリジナルクエリ情報を含める
-                    for result in results:
+            # カタログの世代が同じ間はキャッシュした結果を返す
+            catalog = await self._get_catalog()
+            if self.negative_cache.is_miss(normalized_query, catalog.generation):
+                return []
+            cached_results = self.query_cache.get(normalized_query, catalog.generation)
+            if cached_results is not None:
+                # 元のクエリを付ける段階は全件に付けるので、先頭になければ書き換えない
+                # （スコア順の結果を最後まで並べずに済む）
+                if cached_results and 'original_query' in cached_results[0]:
+                    for result in cached_results:
                         result['original_query'] = query
-                    return results
-            
-            # 5. 表記ゆれ対応検索
-            results = await self._search_fuzzy(normalized_query)
-            if results:
-                return results
+                return cached_results
             
-            # 6. 部分一致検索（最後の手段）
-            results = await self._search_partial_match(normalized_query)
+            results = await self._search_cascade(query, normalized_query)
             if results:
-                return results
-            
-            # 7. ワイルドカード形式での検索（例：「トト・ノーマルの破片」→「*破片」）
-            # アイテム名の末尾部分を抽出してワイルドカード検索
-            wildcard_results = await self._search_with_wildcard_suffix(normalized_query)
-            return wildcard_results
+                self.query_cache.put(normalized_query, catalog.generation, results)
+            else:
+                # 0件のクエリは結果キャッシュを圧迫しないよう別枠で覚える
+                self.negative_cache.record_miss(normalized_query, catalog.generation)
+            return results
             
         except Exception as e:
             logger.error(f"検索エラー: {e}")
             return []
     
+    @request_scoped
+    async def search_many(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """複数クエリをまとめて検索（結果はqueriesと同じ順）
+
+        同じ正規化結果のクエリは1回だけ検索し、残りは並行に実行する。
+        接続とカタログは1つの検索セッションで共有する。
+        """
+        try:
+            await self._get_catalog()
+            
+            unique_queries = {}
+            for query in queries:
+                unique_queries.setdefault(self._normalize_query(query), query)
+            
+            results = await asyncio.gather(*(self.search(query) for query in unique_queries.values()))
+            results_by_key = dict(zip(unique_queries.keys(), results))
+            
+            # 重複したクエリにも別々の辞書を返す
+            return [copy_results(results_by_key[self._normalize_query(query)]) for query in queries]
+            
+        except Exception as e:
+            logger.error(f"複数検索エラー: {e}")
+            return [[] for _ in queries]
+    
+    async def _search_cascade(self, query: str, normalized_query: str) -> List[Dict[str, Any]]:
+        """優先順位に沿って各検索を順に試す"""
+        candidates = CandidateSet()
+        
+        # 1. 正式名称での完全一致検索
+        candidates.add(await self._run_stage('exact_formal', self._search_exact_formal_name(normalized_query)), 'exact_formal')
+        
+        # 2. 一般名称での完全一致検索（重複は除外される）
+        candidates.add(await self._run_stage('exact_common', self._search_exact_common_name(normalized_query)), 'exact_common')
+        
+        # 完全一致が見つかった場合は、部分一致も含めて返す
+        if candidates:
+            # 部分一致も検索して追加
+            candidates.add(await self._run_stage('partial', self._search_partial_match(normalized_query)), 'partial')
+            # スコアリングを行う（制限なし）
+            return self._deduplicate_and_score_results(candidates, normalized_query)
+        
+        # 3. レベル/ランク表記を除去して再検索
+        cleaned_query = self._remove_level_rank_suffix(normalized_query)
+        if cleaned_query != normalized_query and cleaned_query:
+            logger.info(f"レベル/ランク除去: '{normalized_query}' → '{cleaned_query}'")
+            # 同じ基本名のレベル/ランク違いを段階の近い順に並べ、除去したクエリでの再検索結果を続ける
+            level_removed_results = await self._run_stage('level_strip', self._search_level_stripped(normalized_query, cleaned_query))
+            if level_removed_results:
+                # オリジナルのクエリ情報を結果に含める
+                for result in level_removed_results:
+                    result['original_query'] = query
+                    result['cleaned_query'] = cleaned_query
+                return level_removed_results
+        
+        # 4. ワイルドカード検索（*や?が含まれている場合）
+        if self._has_wildcards(query):
+            results = await self._run_stage('wildcard', self._search_wildcard(query))
+            if results:
+                # ワイルドカード検索の結果にもオリジナルクエリ情報を含める
+                for result in results:
+                    result['original_query'] = query
+                return results
+        
+        # 5. 表記ゆれ対応検索
+        results = await self._run_stage('fuzzy', self._search_fuzzy(normalized_query))
+        if results:
+            return results
+        
+        # 6. 部分一致検索（最後の手段）
+        results = await self._run_stage('partial_fallback', self._search_partial_match(normalized_query))
+        if results:
+            return results
+        
+        # 7. ワイルドカード形式での検索（例：「トト・ノーマルの破片」→「*破片」）
+        # アイテム名の末尾部分を抽出してワイルドカード検索
+        wildcard_results = await self._run_stage('wildcard_suffix', self._search_with_wildcard_suffix(normalized_query))
+        if wildcard_results:
+            return wildcard_results
+        
+        # 8. 誤字を許容した検索（編集距離1〜2の名称）
+        # 一致ではなく候補なので、呼び出し側で自動表示しないよう印を付ける
+        if self.config.get('features', {}).get('typo_search', True):
+            typo_results = await self._run_stage('typo', self._search_typo(normalized_query))
+            for result in typo_results:
+                result['original_query'] = query
+                result['typo_suggestion'] = True
+            return typo_results
+        
+        return []
+    
+    async def _get_catalog(self) -> ItemCatalog:
+        """検索に使うアイテムカタログを取得（未読み込みなら読み込む）
+
+        検索セッション中は最初に取得したカタログを使い続ける。
+        """
+        session = current_session(self.db_manager.db_path)
+        if session is None:
+            return await ensure_catalog(self.db_manager.db_path)
+        if session.catalog is None:
+            session.catalog = await ensure_catalog(self.db_manager.db_path)
+        return session.catalog
+    
+    def _current_catalog(self) -> Optional[ItemCatalog]:
+        """読み込み済みのカタログ（検索セッション中は固定したもの）"""
+        session = current_session(self.db_manager.db_path)
+        if session is not None and session.catalog is not None:
+            return session.catalog
+        return get_catalog(self.db_manager.db_path)
+    
+    @asynccontextmanager
+    async def _connect(self) -> AsyncIterator[aiosqlite.Connection]:
+        """DB接続を取得（検索セッション中はセッションの読み取り接続を借りる）"""
+        session = current_session(self.db_manager.db_path)
+        if session is not None:
+            async with session.lease() as db:
+                yield db
+            return
+        
+        async with connect(self.db_manager.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            yield db
+    
+    async def _shared_lookup(self, method, *args) -> List[Dict[str, Any]]:
+        """同じ引数の問い合わせは検索セッション内で1回だけ実行し、結果の複製を返す"""
+        session = current_session(self.db_manager.db_path)
+        if session is None:
+            return await method(*args)
+        results = await session.shared((method.__name__, *args), lambda: method(*args))
+        return copy_results(results)
+    
+    async def record_searches(self, queries: List[str]):
+        """検索されたクエリを検索候補の人気度に反映"""
+        catalog = await self._get_catalog()
+        for query in queries:
+            catalog.record_search(query)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """検索結果キャッシュの統計情報"""
+        return self.query_cache.get_stats()
+    
+    def get_negative_cache_stats(self) -> Dict[str, Any]:
+        """0件クエリキャッシュの統計情報"""
+        return self.negative_cache.get_stats()
+    
+    def get_related_cache_stats(self) -> Dict[str, Any]:
+        """関連アイテムキャッシュの統計情報"""
+        return self.related_cache.get_stats()
+    
+    async def load_catalog(self) -> ItemCatalog:
+        """アイテムカタログをDBから読み込み直す"""
+        return await load_catalog(self.db_manager.db_path)
+    
     def _normalize_query(self, query: str) -> str:
         """クエリの正規化"""
         try:
@@ -191,22 +313,8 @@ class SearchEngine:
     def _remove_level_rank_suffix(self, item_name: str) -> str:
         """アイテム名からレベル/ランク表記を除去"""
         try:
-            # レベル表記のパターン（Lv1, Lv.1, レベル1など）
-            # Lv、レベル、ランクの表記を除去
-            patterns = [
-                r'[Ll][Vv]\.?\s*\d+$',  # Lv1, Lv.1, lv1など
-                r'レベル\s*\d+$',        # レベル1など
-                r'ランク\s*[A-Za-z\d]+$', # ランクA, ランク1など
-                r'[Rr]ank\s*[A-Za-z\d]+$', # RankA, Rank1など（英語表記）
-                r'★+$',                  # ★★など
-                r'\s*\d+$'               # 末尾の数字のみ（スペース含む）
-            ]
-            
-            cleaned_name = item_name
-            for pattern in patterns:
-                cleaned_name = re.sub(pattern, '', cleaned_name).strip()
-            
-            return cleaned_name
+            # Lv1, Lv.1, レベル1, ランクA, RankA, ★★, 末尾の数字を除去（結果は名称ごとにキャッシュ）
+            return split_tier_suffix(item_name)[0]
             
         except Exception as e:
             logger.warning(f"レベル/ランク除去エラー: {e}")
@@ -219,37 +327,9 @@ class SearchEngine:
     async def _search_exact_formal_name(self, query: str) -> List[Dict[str, Any]]:
         """正式名称の完全一致検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # formal_nameを持つテーブル
-                tables = ['equipments', 'materials', 'mobs']
-                for table in tables:
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table} WHERE LOWER(formal_name) = ?",
-                        (query,)
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                
-                # npcsテーブル（nameカラムを使用）
-                cursor = await db.execute(
-                    "SELECT *, 'npcs' as item_type, name as formal_name FROM npcs WHERE LOWER(name) = ?",
-                    (query,)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                # gatheringsテーブル（locationカラムを使用）
-                cursor = await db.execute(
-                    "SELECT *, 'gatherings' as item_type, location as formal_name FROM gatherings WHERE LOWER(location) = ?",
-                    (query,)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                return results
+            catalog = await self._get_catalog()
+            # NPCはname、採集場所はlocationを正式名称として扱う
+            return catalog.find_exact_formal(query)
                 
         except Exception as e:
             logger.error(f"正式名称検索エラー: {e}")
@@ -258,23 +338,9 @@ class SearchEngine:
     async def _search_exact_common_name(self, query: str) -> List[Dict[str, Any]]:
         """一般名称の完全一致検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # common_nameを持つテーブル
-                tables = ['equipments', 'materials', 'mobs']
-                
-                for table in tables:
-                    # 複数の一般名称をカンマ区切りで格納している場合に対応
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table} WHERE LOWER(common_name) = ? OR LOWER(common_name) LIKE ? OR LOWER(common_name) LIKE ? OR LOWER(common_name) LIKE ?",
-                        (query, f'{query},%', f'%,{query},%', f'%,{query}')
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                
-                return results
+            catalog = await self._get_catalog()
+            # 複数の一般名称をカンマ区切りで格納している場合にも対応
+            return catalog.find_exact_common(query)
                 
         except Exception as e:
             logger.error(f"一般名称検索エラー: {e}")
@@ -286,214 +352,130 @@ class SearchEngine:
             # 全角ワイルドカードを半角に変換
             normalized_query = query.replace('＊', '*').replace('？', '?')
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # テーブルごとに処理
-                
-                # formal_name/common_nameを持つテーブル
-                for table in ['equipments', 'materials', 'mobs']:
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table}"
-                    )
-                    rows = await cursor.fetchall()
-                    
-                    for row in rows:
-                        row_dict = dict(row)
-                        formal_name = row_dict.get('formal_name', '')
-                        common_name = row_dict.get('common_name', '') or ''
-                        
-                        if (fnmatch(formal_name.lower(), normalized_query.lower()) or 
-                            fnmatch(common_name.lower(), normalized_query.lower())):
-                            results.append(row_dict)
-                
-                # npcsテーブル (nameカラムを使用)
-                cursor = await db.execute(
-                    "SELECT *, 'npcs' as item_type, name as formal_name FROM npcs"
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    name = row_dict.get('name', '')
-                    
-                    if fnmatch(name.lower(), normalized_query.lower()):
-                        results.append(row_dict)
-                
-                # gatheringsテーブル（locationカラムを使用）
-                cursor = await db.execute(
-                    "SELECT *, 'gatherings' as item_type, location as formal_name FROM gatherings"
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    location = row_dict.get('location', '')
-                    
-                    if fnmatch(location.lower(), normalized_query.lower()):
-                        results.append(row_dict)
-                
-                return results
+            catalog = await self._get_catalog()
+            return catalog.find_wildcard(normalized_query)
                 
         except Exception as e:
             logger.error(f"ワイルドカード検索エラー: {e}")
             return []
     
     async def _search_fuzzy(self, query: str) -> List[Dict[str, Any]]:
-        """表記ゆれ対応検索"""
+        """表記ゆれ対応検索
+
+        ひらがな・カタカナ、長音、表記ゆれ・読みの対応表、「の」の有無は
+        索引とクエリの双方を同じ正規形に変換して吸収するため、1回の照合で済む。
+        """
         try:
-            all_results = []
-            
-            # 1. ひらがな・カタカナ変換
-            hiragana_query = jaconv.kata2hira(query)
-            katakana_query = jaconv.hira2kata(query)
-            
-            if hiragana_query != query:
-                results = await self._search_partial_match(hiragana_query)
-                all_results.extend(results)
-            
-            if katakana_query != query:
-                results = await self._search_partial_match(katakana_query)
-                all_results.extend(results)
-            
-            # 2. 定義済みの表記ゆれ対応
-            for original, alternatives in self.fuzzy_map.items():
-                if original in query:
-                    for alternative in alternatives:
-                        variant_query = query.replace(original, alternative)
-                        results = await self._search_partial_match(variant_query)
-                        all_results.extend(results)
-            
-            # 3. 読み方マップの対応
-            for reading, kanji_list in self.reading_map.items():
-                if reading in query:
-                    for kanji in kanji_list:
-                        variant_query = query.replace(reading, kanji)
-                        results = await self._search_partial_match(variant_query)
-                        all_results.extend(results)
-            
-            # 4. 「の」の追加/削除
-            if 'の' not in query:
-                # 2文字以上の場合、途中に「の」を追加
-                for i in range(1, len(query)):
-                    variant_query = query[:i] + 'の' + query[i:]
-                    results = await self._search_partial_match(variant_query)
-                    all_results.extend(results)
-            else:
-                # 「の」を削除
-                variant_query = query.replace('の', '')
-                results = await self._search_partial_match(variant_query)
-                all_results.extend(results)
+            catalog = await self._get_catalog()
+            results = catalog.find_fuzzy(query)
             
-            # 重複除去とスコアリング
-            return self._deduplicate_and_score_results(all_results, query, limit=20)
+            # 正規化で新たに見つかったものがなければ部分一致検索に任せる
+            candidates = CandidateSet()
+            candidates.add(catalog.find_partial(query), 'partial')
+            if candidates.add(results, 'fuzzy') == 0:
+                return []
+            
+            # 部分一致の結果に表記ゆれで見つかったものを加え、件数は絞らない
+            return self._deduplicate_and_score_results(candidates, query)
             
         except Exception as e:
             logger.error(f"表記ゆれ検索エラー: {e}")
             return []
     
+    async def _search_typo(self, query: str) -> List[Dict[str, Any]]:
+        """誤字を許容した検索（編集距離の近い順）"""
+        try:
+            catalog = await self._get_catalog()
+            return catalog.find_typo(query)
+            
+        except Exception as e:
+            logger.error(f"誤字許容検索エラー: {e}")
+            return []
+    
     async def _search_partial_match(self, query: str) -> List[Dict[str, Any]]:
         """部分一致検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # formal_name/common_nameを持つテーブル
-                tables = ['equipments', 'materials', 'mobs']
-                
-                for table in tables:
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table} WHERE LOWER(formal_name) LIKE ? OR LOWER(common_name) LIKE ?",
-                        (f'%{query}%', f'%{query}%')
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                
-                # npcsテーブル
-                cursor = await db.execute(
-                    "SELECT *, 'npcs' as item_type, name as formal_name FROM npcs WHERE LOWER(name) LIKE ?",
-                    (f'%{query}%',)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                # gatheringsテーブル
-                cursor = await db.execute(
-                    "SELECT *, 'gatherings' as item_type, location as formal_name FROM gatherings WHERE LOWER(location) LIKE ?",
-                    (f'%{query}%',)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                return results
+            catalog = await self._get_catalog()
+            return catalog.find_partial(query)
                 
         except Exception as e:
             logger.error(f"部分一致検索エラー: {e}")
             return []
     
+    async def _search_level_family(self, query: str) -> List[Dict[str, Any]]:
+        """レベル/ランク違いのアイテム群から段階の近い順に検索"""
+        try:
+            catalog = await self._get_catalog()
+            results = catalog.find_family(query)
+            cleaned_query = self._remove_level_rank_suffix(query)
+            cleaned_key = to_search_key(cleaned_query)
+            for result in results:
+                result['search_score'] = self._calculate_relevance_score(result, cleaned_query, cleaned_key)
+            return results
+            
+        except Exception as e:
+            logger.error(f"レベル/ランク違い検索エラー: {e}")
+            return []
+    
+    async def _search_level_stripped(self, query: str, cleaned_query: str) -> List[Dict[str, Any]]:
+        """レベル/ランク違いのアイテム群を段階の近い順に並べ、除去したクエリでの再検索結果を後に続ける
+        
+        アイテム群が段階のない基本名だけでも、部分一致など再検索で見つかる候補は落とさない。
+        """
+        candidates = CandidateSet()
+        candidates.add(await self._search_level_family(query), 'level_family')
+        candidates.add(await self._search_with_cleaned_query(cleaned_query), 'cleaned_query')
+        return list(candidates)
+    
     async def _search_with_cleaned_query(self, cleaned_query: str) -> List[Dict[str, Any]]:
         """クリーンなクエリで再検索（完全一致・部分一致含む）"""
         try:
-            all_results = []
+            candidates = CandidateSet()
             
             # 1. 正式名称での完全一致
-            exact_formal = await self._search_exact_formal_name(cleaned_query)
-            all_results.extend(exact_formal)
+            candidates.add(await self._search_exact_formal_name(cleaned_query), 'exact_formal')
             
             # 2. 一般名称での完全一致
-            exact_common = await self._search_exact_common_name(cleaned_query)
-            for result in exact_common:
-                if not any(r['id'] == result['id'] and r['item_type'] == result['item_type'] for r in all_results):
-                    all_results.append(result)
+            candidates.add(await self._search_exact_common_name(cleaned_query), 'exact_common')
             
             # 3. 部分一致
-            partial = await self._search_partial_match(cleaned_query)
-            for result in partial:
-                if not any(r['id'] == result['id'] and r['item_type'] == result['item_type'] for r in all_results):
-                    all_results.append(result)
+            candidates.add(await self._search_partial_match(cleaned_query), 'partial')
             
-            # 重複除去とスコアリング
-            return self._deduplicate_and_score_results(all_results, cleaned_query)
+            # スコアリング
+            return self._deduplicate_and_score_results(candidates, cleaned_query)
             
         except Exception as e:
             logger.error(f"クリーンクエリ検索エラー: {e}")
             return []
     
-    def _deduplicate_and_score_results(self, results: List[Dict[str, Any]], query: str, limit: int = None) -> List[Dict[str, Any]]:
-        """重複除去とスコアリング"""
+    def _deduplicate_and_score_results(self, results, query: str, limit: int = None) -> RankedResults:
+        """重複除去とスコアリング（上位から必要な分だけ並べる）"""
         try:
-            # 重複除去（id + item_typeで識別）
-            unique_results = {}
-            for result in results:
-                key = f"{result.get('id')}_{result.get('item_type')}"
-                if key not in unique_results:
-                    unique_results[key] = result
-                    # スコアを計算
-                    unique_results[key]['search_score'] = self._calculate_relevance_score(result, query)
-            
-            # スコアでソート
-            sorted_results = sorted(unique_results.values(), key=lambda x: x.get('search_score', 0), reverse=True)
+            candidates = results if isinstance(results, CandidateSet) else CandidateSet.from_results(results, 'merged')
+            catalog = self._current_catalog()
+            query_key = to_search_key(query)
             
-            # 制限がある場合は適用
-            if limit is not None:
-                return sorted_results[:limit]
+            ranked = []
+            for result in candidates:
+                # スコアを計算（同点は検索回数の多い順、次に先の検索段階で見つかった順）
+                result['search_score'] = self._calculate_relevance_score(result, query, query_key)
+                popularity = catalog.popularity(result) if catalog else 0
+                ranked.append(((-result['search_score'], -popularity, candidates.stage_rank(result)), result))
             
-            return sorted_results
+            return RankedResults(ranked, limit)
             
         except Exception as e:
             logger.error(f"重複除去・スコアリングエラー: {e}")
-            return results
+            return list(results)
     
-    def _calculate_relevance_score(self, result: Dict[str, Any], query: str) -> float:
+    def _calculate_relevance_score(self, result: Dict[str, Any], query: str, query_key: Optional[str] = None) -> float:
         """検索結果の関連性スコアを計算"""
         score = 0.0
-        query_lower = query.lower()
+        query_lower = query_key if query_key is not None else to_search_key(query)
         
-        # formal_nameとcommon_nameを取得
-        formal_name = (result.get('formal_name') or '').lower()
-        common_name = (result.get('common_name') or '').lower()
+        # formal_nameとcommon_nameの検索キーを取得（カタログ外の結果はここで生成）
+        formal_name = result.get('formal_name_key') or to_search_key(result.get('formal_name') or '')
+        common_name = result.get('common_name_key') or to_search_key(result.get('common_name') or '')
         
         # 完全一致
         if formal_name == query_lower:
@@ -523,7 +505,51 @@ class SearchEngine:
         
         return score
     
+    @request_scoped
+    @traced_stage('related_items')
     async def search_related_items(self, item_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """関連アイテムを検索（カタログの世代が同じ間はキャッシュした結果を返す）"""
+        try:
+            item_id = item_data.get('id')
+            if item_id is None or not item_data.get('formal_name'):
+                return await self._collect_related_items(item_data)
+            
+            catalog = await self._get_catalog()
+            key = RelatedItemsCache.make_key(item_data.get('item_type'), item_id)
+            cached_related = self.related_cache.get(key, catalog.generation)
+            if cached_related is not None:
+                return cached_related
+            
+            related_items = await self._collect_related_items(item_data)
+            if related_items:
+                self.related_cache.put(key, catalog.generation, related_items)
+            return related_items
+            
+        except Exception as e:
+            logger.error(f"関連アイテム検索エラー: {e}")
+            return {}
+    
+    async def prewarm_related_items(self, limit: int = 50) -> int:
+        """検索ランキング上位のアイテムの関連アイテムを事前に計算し、計算した件数を返す"""
+        try:
+            ranking = await self.db_manager.get_search_ranking(limit)
+            queries = [entry['item_name'] for entry in ranking]
+            
+            # 各クエリで最初に表示されるアイテムを温める
+            warmed = 0
+            for results in await self.search_many(queries):
+                if results:
+                    await self.search_related_items(results[0])
+                    warmed += 1
+            
+            logger.info(f"関連アイテムを事前計算しました: {warmed}件")
+            return warmed
+            
+        except Exception as e:
+            logger.error(f"関連アイテム事前計算エラー: {e}")
+            return 0
+    
+    async def _collect_related_items(self, item_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
         """関連アイテムを検索（新仕様）"""
         try:
             item_name = item_data.get('formal_name')
@@ -539,16 +565,27 @@ class SearchEngine:
                 related_items['usage_destinations'] = []  # 利用先
                 related_items['acquisition_sources'] = []  # 入手元
                 
-                # 利用先の検索
+                # 利用先・入手元の各区分は互いに独立しているので並行して検索する
+                # （納品先のNPCは利用先と同じ問い合わせなので1回にまとめる）
+                (equipment_using, npcs_using, mobs_dropping, gathering_info,
+                 gathering_locations, npcs_providing, npcs_requiring) = await asyncio.gather(
+                    self._search_equipment_using_material(item_name),
+                    self._shared_lookup(self._search_npcs_using_material, item_name),
+                    self._search_mobs_dropping_item(item_name),
+                    self._search_gathering_info(item_name),
+                    self._search_gathering_locations(item_name),
+                    self._search_npcs_providing_material(item_name),
+                    self._shared_lookup(self._search_npcs_using_material, item_name),
+                )
+                
+                # 利用先
                 # 1. equipmentテーブルで必要素材に含まれるもの
-                equipment_using = await self._search_equipment_using_material(item_name)
                 for eq in equipment_using:
                     eq['relation_type'] = 'material_for_equipment'
                     eq['relation_detail'] = await self._extract_material_usage(eq.get('required_materials', ''), item_name)
                     related_items['usage_destinations'].append(eq)
                 
                 # 2. npcsテーブルで必要素材に含まれるもの（納品・交換）
-                npcs_using = await self._search_npcs_using_material(item_name)
                 for npc in npcs_using:
                     npc['relation_type'] = 'material_for_npc'
                     # 実際の交換データを解析して詳細を取得
@@ -556,27 +593,23 @@ class SearchEngine:
                     npc['exchange_data'] = exchange_detail
                     related_items['usage_destinations'].append(npc)
                 
-                # 入手元の検索
+                # 入手元
                 # 1. mobsからのドロップ
-                mobs_dropping = await self._search_mobs_dropping_item(item_name)
                 for mob in mobs_dropping:
                     mob['relation_type'] = 'drop_from_mob'
                     related_items['acquisition_sources'].append(mob)
                 
                 # 2. gatheringの場所情報
-                gathering_info = await self._search_gathering_info(item_name)
                 if gathering_info:
                     # acquisition_infoとして格納
                     related_items['acquisition_info'] = gathering_info
                     
-                    # gathering_locationsテーブルからも検索
-                    gathering_locations = await self._search_gathering_locations(item_name)
+                    # gathering_locationsテーブルからの検索結果も加える
                     for loc in gathering_locations:
                         loc['relation_type'] = 'gathering_location'
                         related_items['acquisition_sources'].append(loc)
                 
                 # 3. npcsからの取得（購入・交換・クエスト）
-                npcs_providing = await self._search_npcs_providing_material(item_name)
                 for npc in npcs_providing:
                     npc['relation_type'] = 'npc_source'
                     npc['source_type'] = 'obtainable'  # 入手元
@@ -586,7 +619,6 @@ class SearchEngine:
                     related_items['acquisition_sources'].append(npc)
                 
                 # 4. npcsへの納品（入手元と利用先を区別）
-                npcs_requiring = await self._search_npcs_using_material(item_name)
                 for npc in npcs_requiring:
                     # 既に利用先に含まれていない場合のみ追加
                     if not any(dest['id'] == npc['id'] for dest in related_items['usage_destinations'] if dest.get('relation_type') == 'material_for_npc'):
@@ -599,26 +631,34 @@ class SearchEngine:
                 related_items['materials'] = []  # 必要素材
                 related_items['acquisition_sources'] = []  # 入手元
                 
+                # 入手元の各区分は互いに独立しているので並行して検索する
+                mobs_dropping, npcs_providing, gathering_info, gathering_locations = await asyncio.gather(
+                    self._search_mobs_dropping_item(item_name),
+                    self._search_npcs_providing_material(item_name),
+                    self._search_gathering_info(item_name),
+                    self._search_gathering_locations(item_name),
+                )
+                
                 # 必要素材の抽出と検索
                 required_materials = item_data.get('required_materials', '')
                 if required_materials:
                     material_list = await self._parse_required_materials(required_materials)
+                    resolved = await self._resolve_items_by_names(
+                        [material_info['name'] for material_info in material_list], ['materials']
+                    )
                     for material_info in material_list:
-                        material_name = material_info['name']
-                        material_results = await self._search_material_by_name(material_name)
-                        for material in material_results:
+                        for material in resolved.get(material_info['name'], []):
+                            material = dict(material)
                             material['required_quantity'] = material_info.get('quantity', '')
                             related_items['materials'].append(material)
                 
-                # 入手元の検索
+                # 入手元
                 # 1. mobsからのドロップ
-                mobs_dropping = await self._search_mobs_dropping_item(item_name)
                 for mob in mobs_dropping:
                     mob['relation_type'] = 'drop_from_mob'
                     related_items['acquisition_sources'].append(mob)
                 
                 # 2. npcsからの取得
-                npcs_providing = await self._search_npcs_providing_material(item_name)
                 for npc in npcs_providing:
                     npc['relation_type'] = 'npc_source'
                     npc['source_type'] = 'obtainable'
@@ -627,12 +667,10 @@ class SearchEngine:
                     related_items['acquisition_sources'].append(npc)
                 
                 # 3. 採集関連の情報（特定の装備が採集で得られる場合）
-                gathering_info = await self._search_gathering_info(item_name)
                 if gathering_info:
                     related_items['acquisition_info'] = gathering_info
                     
-                    # gathering_locationsテーブルからも検索
-                    gathering_locations = await self._search_gathering_locations(item_name)
+                    # gathering_locationsテーブルからの検索結果も加える
                     for loc in gathering_locations:
                         loc['relation_type'] = 'gathering_location'
                         related_items['acquisition_sources'].append(loc)
@@ -645,25 +683,28 @@ class SearchEngine:
                 dropped_items = item_data.get('drops', '')  # カラム名を修正
                 if dropped_items:
                     item_list = await self._parse_dropped_items(dropped_items)
+                    drop_names = [item_info['name'] for item_info in item_list]
+                    # equipmentsとmaterialsからまとめて検索（*アイテム名の形式のワイルドカードアイテムも含む）
+                    resolved = await self._resolve_items_by_names(drop_names, ['equipments', 'materials'], WILDCARD_CHARS)
+                    
+                    # 見つからない場合は、レベル/ランクを除去した名前でまとめて再検索
+                    missing = [name for name in drop_names if not resolved.get(name)]
+                    cleaned_names = {name: self._remove_level_rank_suffix(name) for name in missing}
+                    cleaned_resolved = await self._resolve_items_by_names(
+                        [cleaned for name, cleaned in cleaned_names.items() if cleaned != name],
+                        ['equipments', 'materials'], WILDCARD_CHARS
+                    )
+                    for name, cleaned in cleaned_names.items():
+                        if cleaned != name:
+                            resolved[name] = cleaned_resolved.get(cleaned, [])
+                        # それでも見つからない場合、ワイルドカードアイテムを検索
+                        if not resolved.get(name):
+                            resolved[name] = await self._find_matching_wildcard_items(name)
+                    
                     for item_info in item_list:
                         item_name_to_search = item_info['name']
-                        # equipmentsとmaterialsから検索
-                        item_results = await self._search_item_by_name(item_name_to_search)
-                        
-                        # 見つからない場合は、ワイルドカード検索を試みる
-                        if not item_results:
-                            # レベル/ランクを除去してからワイルドカード検索
-                            cleaned_item_name = self._remove_level_rank_suffix(item_name_to_search)
-                            if cleaned_item_name != item_name_to_search:
-                                # まず、レベル/ランクを除去した名前で通常検索
-                                item_results = await self._search_item_by_name(cleaned_item_name)
-                            
-                            # それでも見つからない場合、ワイルドカードアイテムを検索
-                            if not item_results:
-                                wildcard_results = await self._find_matching_wildcard_items(item_name_to_search)
-                                item_results.extend(wildcard_results)
-                        
-                        for item in item_results:
+                        for item in resolved.get(item_name_to_search, []):
+                            item = dict(item)
                             item['drop_info'] = item_info.get('drop_rate', '')
                             # ワイルドカードアイテムの場合、元のアイテム名も保持
                             if any(c in item.get('formal_name', '') for c in WILDCARD_CHARS):
@@ -687,29 +728,42 @@ class SearchEngine:
                         item_data.get('gold', '')
                     )
                     
-                    # 各交換パターンについてアイテムを検索
-                    for exchange in exchanges:
-                        # 取得可能アイテムを検索
+                    # 各交換パターンの必要素材を解析し、アイテム・素材をまとめて検索
+                    exchange_materials = [
+                        await self._parse_required_materials(exchange.get('required_materials', ''))
+                        for exchange in exchanges
+                    ]
+                    item_names = [
+                        exchange['obtainable_item'].split(':')[0].strip()
+                        for exchange in exchanges if exchange.get('obtainable_item')
+                    ]
+                    resolved_items = await self._resolve_items_by_names(
+                        item_names, ['equipments', 'materials'], WILDCARD_CHARS
+                    )
+                    resolved_materials = await self._resolve_items_by_names(
+                        [mat_info['name'] for material_list in exchange_materials for mat_info in material_list],
+                        ['materials']
+                    )
+                    
+                    for exchange, material_list in zip(exchanges, exchange_materials):
+                        # 取得可能アイテム
                         obtainable_item = exchange.get('obtainable_item', '')
                         if obtainable_item:
                             item_name_only = obtainable_item.split(':')[0].strip()
-                            item_results = await self._search_item_by_name(item_name_only)
-                            for item in item_results:
+                            for item in resolved_items.get(item_name_only, []):
+                                item = dict(item)
                                 item['exchange_info'] = exchange
                                 related_items['obtainable_items'].append(item)
                         
-                        # 必要素材を検索
-                        required_mats = exchange.get('required_materials', '')
-                        if required_mats:
-                            material_list = await self._parse_required_materials(required_mats)
-                            for mat_info in material_list:
-                                mat_results = await self._search_material_by_name(mat_info['name'])
-                                for mat in mat_results:
+                        # 必要素材
+                        for mat_info in material_list:
+                            for mat in resolved_materials.get(mat_info['name'], []):
+                                # 重複チェック
+                                if not any(m['id'] == mat['id'] for m in related_items['required_materials']):
+                                    mat = dict(mat)
                                     mat['required_quantity'] = mat_info.get('quantity', '')
                                     mat['exchange_info'] = exchange
-                                    # 重複チェック
-                                    if not any(m['id'] == mat['id'] for m in related_items['required_materials']):
-                                        related_items['required_materials'].append(mat)
+                                    related_items['required_materials'].append(mat)
             
             return related_items
             
@@ -720,24 +774,9 @@ class SearchEngine:
     async def _search_equipment_using_material(self, material_name: str) -> List[Dict[str, Any]]:
         """指定した素材を必要とする装備を検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # required_materialsカラムに含まれる装備を検索
-                cursor = await db.execute(
-                    "SELECT *, 'equipments' as item_type FROM equipments WHERE required_materials LIKE ?",
-                    (f'%{material_name}%',)
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    # 素材リストを解析して実際に含まれているか確認
-                    if self._check_material_in_requirements(row_dict.get('required_materials', ''), material_name):
-                        results.append(row_dict)
-                
-                return results
+            return await self._select_relation_sources(
+                'equipments', RELATION_REQUIRED_MATERIAL, material_name, "*, 'equipments' as item_type"
+            )
                 
         except Exception as e:
             logger.error(f"Equipment using material検索エラー: {e}")
@@ -746,24 +785,7 @@ class SearchEngine:
     async def _search_mobs_dropping_item(self, item_name: str) -> List[Dict[str, Any]]:
         """指定したアイテムをドロップするモブを検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # dropsカラムに含まれるモブを検索
-                cursor = await db.execute(
-                    "SELECT *, 'mobs' as item_type FROM mobs WHERE drops LIKE ?",
-                    (f'%{item_name}%',)
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    # ドロップアイテムリストを解析して実際に含まれているか確認
-                    if self._check_item_in_drops(row_dict.get('drops', ''), item_name):
-                        results.append(row_dict)
-                
-                return results
+            return await self._select_relation_sources('mobs', RELATION_DROP, item_name, "*, 'mobs' as item_type")
                 
         except Exception as e:
             logger.error(f"Mobs dropping item検索エラー: {e}")
@@ -772,8 +794,7 @@ class SearchEngine:
     async def _search_gathering_info(self, item_name: str) -> Optional[Dict[str, str]]:
         """アイテムの採集情報を検索（新しいテーブル構造対応）"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self._connect() as db:
                 
                 # materialsテーブルのacquisition_category, methodを確認
                 cursor = await db.execute(
@@ -800,35 +821,54 @@ class SearchEngine:
             return None
     
     async def _search_gathering_locations(self, item_name: str) -> List[Dict[str, Any]]:
-        """gathering_locationsテーブルから採集場所を検索"""
+        """指定した素材が採れる採集場所を検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # gatheringsテーブルを検索
-                cursor = await db.execute(
-                    """
-                    SELECT *, 'gatherings' as item_type 
-                    FROM gatherings 
-                    WHERE resource_name LIKE ?
-                    """,
-                    (f'%{item_name}%',)
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    # resource_nameを確認
-                    if item_name.lower() in row_dict.get('resource_name', '').lower():
-                        results.append(row_dict)
-                
-                return results
+            results = await self._select_relation_sources(
+                'gatherings', RELATION_GATHERED_MATERIAL, item_name, "*, 'gatherings' as item_type"
+            )
+            for result in results:
+                result['formal_name'] = result.get('location', '')
+            return results
                 
         except Exception as e:
             logger.error(f"採集場所検索エラー: {e}")
             return []
     
+    async def _select_relation_sources(self, table: str, relation_type: str, target_name: str, columns: str = '*') -> List[Dict[str, Any]]:
+        """関連テーブルから、target_nameを関連先に持つ元テーブルの行を取得（索引で1回の問い合わせ）"""
+        async with self._connect() as db:
+            cursor = await db.execute(
+                f"""
+                SELECT {columns} FROM {table}
+                WHERE id IN (
+                    SELECT source_id FROM item_relations
+                    WHERE target_key = ? AND relation_type = ? AND source_type = ?
+                )
+                ORDER BY id
+                """,
+                (to_search_key(target_name), relation_type, table)
+            )
+            return [dict(row) for row in await cursor.fetchall()]
+    
+    async def _select_relations_by_targets(self, target_keys: List[str], relation_types: List[str],
+                                           chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """複数の関連先（検索キー）の関連をまとめて取得（SQLの変数上限を超えないよう分割）"""
+        relations = []
+        async with self._connect() as db:
+            for start in range(0, len(target_keys), chunk_size):
+                keys = target_keys[start:start + chunk_size]
+                cursor = await db.execute(
+                    f"""
+                    SELECT * FROM item_relations
+                    WHERE target_key IN ({', '.join('?' * len(keys))})
+                    AND relation_type IN ({', '.join('?' * len(relation_types))})
+                    ORDER BY source_type, source_id, id
+                    """,
+                    (*keys, *relation_types)
+                )
+                relations.extend(dict(row) for row in await cursor.fetchall())
+        return relations
+    
     def _check_material_in_requirements(self, requirements_str: str, material_name: str) -> bool:
         """必要素材リストに特定の素材が含まれているかチェック"""
         try:
@@ -853,52 +893,6 @@ class SearchEngine:
             logger.warning(f"素材チェックエラー: {e}")
             return False
     
-    def _check_item_in_drops(self, drops_str: str, item_name: str) -> bool:
-        """ドロップアイテムリストに特定のアイテムが含まれているかチェック"""
-        try:
-            if not drops_str:
-                return False
-            
-            # カンマまたは改行で分割
-            items = re.split(r'[,\n、]', drops_str)
-            for item in items:
-                item = item.strip()
-                # ドロップ率の情報を除去
-                if '(' in item:
-                    item = item.split('(')[0].strip()
-                
-                if item == item_name or item_name in item:
-                    return True
-            
-            return False
-            
-        except Exception as e:
-            logger.warning(f"ドロップアイテムチェックエラー: {e}")
-            return False
-    
-    def _check_item_in_obtainable_items(self, obtainable_str: str, item_name: str) -> bool:
-        """取得可能アイテムリストに特定のアイテムが含まれているかチェック"""
-        try:
-            if not obtainable_str:
-                return False
-            
-            # カンマまたは改行で分割
-            items = re.split(r'[,\n、]', obtainable_str)
-            for item in items:
-                item = item.strip()
-                # 数量情報を除去
-                if ':' in item:
-                    item = item.split(':')[0].strip()
-                
-                if item == item_name or item_name in item:
-                    return True
-            
-            return False
-            
-        except Exception as e:
-            logger.warning(f"取得可能アイテムチェックエラー: {e}")
-            return False
-    
     async def _parse_required_materials(self, materials_str: str) -> List[Dict[str, str]]:
         """必要素材文字列を解析"""
         try:
@@ -967,78 +961,23 @@ class SearchEngine:
             logger.error(f"ドロップアイテム解析エラー: {e}")
             return []
     
-    async def _search_material_by_name(self, material_name: str) -> List[Dict[str, Any]]:
-        """素材名で素材を検索"""
-        try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                cursor = await db.execute(
-                    "SELECT *, 'materials' as item_type FROM materials WHERE formal_name = ? OR common_name = ?",
-                    (material_name, material_name)
-                )
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
-                
-        except Exception as e:
-            logger.error(f"素材名検索エラー: {e}")
-            return []
-    
-    async def _search_item_by_name(self, item_name: str) -> List[Dict[str, Any]]:
-        """アイテム名で装備・素材を検索（ワイルドカードアイテムも含む）"""
+    async def _resolve_items_by_names(self, names: List[str], tables: List[str],
+                                      wildcard_prefixes: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """詳細画面に出す名前をまとめて表記どおりの完全一致で検索（名前 → アイテム）
+
+        カタログから引くため、名前の数によらずSQLは実行しない。
+        wildcard_prefixesの各文字を先頭に付けた名前（例：「*破片」）のアイテムも含める。
+        """
         try:
-            results = []
-            
-            # equipmentsから検索
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                cursor = await db.execute(
-                    "SELECT *, 'equipments' as item_type FROM equipments WHERE formal_name = ? OR common_name = ?",
-                    (item_name, item_name)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                # materialsから検索
-                cursor = await db.execute(
-                    "SELECT *, 'materials' as item_type FROM materials WHERE formal_name = ? OR common_name = ?",
-                    (item_name, item_name)
-                )
-                rows = await cursor.fetchall()
-                results.extend([dict(row) for row in rows])
-                
-                # ワイルドカードアイテムも検索（*アイテム名の形式）
-                wildcard_patterns = [f"*{item_name}", f"?{item_name}", f"＊{item_name}", f"？{item_name}"]
-                for pattern in wildcard_patterns:
-                    # equipmentsから検索
-                    cursor = await db.execute(
-                        "SELECT *, 'equipments' as item_type FROM equipments WHERE formal_name = ? OR common_name = ?",
-                        (pattern, pattern)
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                    
-                    # materialsから検索
-                    cursor = await db.execute(
-                        "SELECT *, 'materials' as item_type FROM materials WHERE formal_name = ? OR common_name = ?",
-                        (pattern, pattern)
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-            
-            # 重複を除去
-            unique_results = {}
-            for result in results:
-                key = f"{result.get('id')}_{result.get('item_type')}"
-                if key not in unique_results:
-                    unique_results[key] = result
+            if not names:
+                return {}
             
-            return list(unique_results.values())
+            catalog = await self._get_catalog()
+            return catalog.resolve_names(names, tables, wildcard_prefixes)
             
         except Exception as e:
-            logger.error(f"アイテム名検索エラー: {e}")
-            return []
+            logger.error(f"アイテム名一括検索エラー: {e}")
+            return {}
     
     async def _extract_material_usage(self, requirements_str: str, target_material: str) -> str:
         """必要素材リストから特定素材の使用情報を抽出"""
@@ -1066,53 +1005,81 @@ class SearchEngine:
             logger.warning(f"素材使用情報抽出エラー: {e}")
             return ""
     
+    @request_scoped
+    async def get_crafting_tree(self, query: str, quantity: int = 1) -> Optional[Dict[str, Any]]:
+        """製作ツリーと基本素材の合計を取得（レシピを持つ装備が見つからなければNone）"""
+        try:
+            catalog = await self._get_catalog()
+            recipes = catalog.recipes
+            
+            name = query if query in recipes else None
+            if name is None:
+                # 表記ゆれ・レベル違いなどは通常の検索で解決し、レシピを持つ最初の装備を使う
+                for result in await self.search(query):
+                    if result.get('item_type') == 'equipments' and result.get('formal_name') in recipes:
+                        name = result['formal_name']
+                        break
+            if name is None:
+                return None
+            
+            return {
+                'item': recipes.entry(name),
+                'quantity': quantity,
+                'tree': recipes.expand(name, quantity),
+                'base_materials': recipes.base_materials(name, quantity),
+                'crafted_items': recipes.crafted_items(name, quantity),
+                'depth': recipes.depth(name),
+            }
+            
+        except Exception as e:
+            logger.error(f"製作ツリー取得エラー: {e}")
+            return None
+    
+    @request_scoped
+    async def get_shopping_list(self, targets: List[Tuple[str, int]]) -> Optional[Dict[str, Any]]:
+        """複数の対象（名前, 個数）の基本素材の合計と、各素材の入手先を取得
+        
+        名前はカタログとレシピのグラフでまとめて解決し、入手先は全素材分を1回の問い合わせで引く。
+        """
+        try:
+            catalog = await self._get_catalog()
+            shopping = aggregate_targets(catalog, targets)
+            
+            # 一覧にない名前も入手先があれば素材として数えるため、同じ問い合わせで引く
+            keys = [material['key'] for material in shopping['materials']]
+            keys += [target['key'] for target in shopping['unresolved'] if target['key']]
+            relations = await self._select_relations_by_targets(list(dict.fromkeys(keys)), SOURCE_RELATIONS) if keys else []
+            return attach_sources(catalog, shopping, relations)
+            
+        except Exception as e:
+            logger.error(f"買い物リスト取得エラー: {e}")
+            return None
+    
+    @request_scoped
     async def get_search_suggestions(self, partial_query: str, limit: int = 5) -> List[str]:
         """検索候補を取得"""
         try:
             if len(partial_query) < 2:
                 return []
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                suggestions = set()
-                
-                # formal_nameとcommon_nameを持つテーブル
-                tables_with_formal_name = ['equipments', 'materials', 'mobs']
-                
-                for table in tables_with_formal_name:
-                    # 正式名称から候補を取得
-                    cursor = await db.execute(
-                        f"SELECT formal_name FROM {table} WHERE LOWER(formal_name) LIKE ? LIMIT ?",
-                        (f'{partial_query.lower()}%', limit)
-                    )
-                    rows = await cursor.fetchall()
-                    suggestions.update([row['formal_name'] for row in rows])
-                    
-                    # 一般名称から候補を取得
-                    cursor = await db.execute(
-                        f"SELECT common_name FROM {table} WHERE LOWER(common_name) LIKE ? AND common_name IS NOT NULL LIMIT ?",
-                        (f'{partial_query.lower()}%', limit)
-                    )
-                    rows = await cursor.fetchall()
-                    suggestions.update([row['common_name'] for row in rows])
-                
-                # gatheringsテーブルのlocationから候補を取得
-                cursor = await db.execute(
-                    "SELECT location FROM gatherings WHERE LOWER(location) LIKE ? LIMIT ?",
-                    (f'{partial_query.lower()}%', limit)
-                )
-                rows = await cursor.fetchall()
-                suggestions.update([row['location'] for row in rows])
-                
-                # npcsテーブルのnameから候補を取得
-                cursor = await db.execute(
-                    "SELECT name FROM npcs WHERE LOWER(name) LIKE ? LIMIT ?",
-                    (f'{partial_query.lower()}%', limit)
-                )
-                rows = await cursor.fetchall()
-                suggestions.update([row['name'] for row in rows])
-                
-                return sorted(list(suggestions))[:limit]
+            # 0件クエリの候補は計算済みならそのまま返す
+            key = self._normalize_query(partial_query)
+            catalog = await self._get_catalog()
+            cached_suggestions = self.negative_cache.get_suggestions(key, catalog.generation, limit)
+            if cached_suggestions is not None:
+                return cached_suggestions
+            
+            # 正式名称・一般名称・NPC名・採集場所から人気順に候補を取得
+            suggestions = catalog.suggest(partial_query, limit)
+            
+            # 前方一致で足りない分は誤字を許容した候補で補う
+            for suggestion in catalog.did_you_mean(partial_query, limit):
+                if len(suggestions) >= limit:
+                    break
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+            self.negative_cache.put_suggestions(key, catalog.generation, limit, suggestions)
+            return suggestions
                 
         except Exception as e:
             logger.error(f"検索候補取得エラー: {e}")
@@ -1121,26 +1088,11 @@ class SearchEngine:
     async def _search_npcs_using_material(self, material_name: str) -> List[Dict[str, Any]]:
         """指定した素材を必要とするNPCを検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # required_materialsカラムに含まれるNPCを検索
-                cursor = await db.execute(
-                    "SELECT * FROM npcs WHERE required_materials LIKE ?",
-                    (f'%{material_name}%',)
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    # 素材リストを解析して実際に含まれているか確認
-                    if self._check_material_in_npc_requirements(row_dict.get('required_materials', ''), material_name):
-                        row_dict['formal_name'] = row_dict.get('name', '')
-                        row_dict['item_type'] = 'npcs'
-                        results.append(row_dict)
-                
-                return results
+            results = await self._select_relation_sources('npcs', RELATION_NPC_REQUIRED, material_name)
+            for result in results:
+                result['formal_name'] = result.get('name', '')
+                result['item_type'] = 'npcs'
+            return results
                 
         except Exception as e:
             logger.error(f"NPCs using material検索エラー: {e}")
@@ -1149,39 +1101,16 @@ class SearchEngine:
     async def _search_npcs_providing_material(self, material_name: str) -> List[Dict[str, Any]]:
         """指定した素材/装備を提供するNPCを検索"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # obtainable_itemsカラムに含まれるNPCを検索
-                cursor = await db.execute(
-                    "SELECT * FROM npcs WHERE obtainable_items LIKE ?",
-                    (f'%{material_name}%',)
-                )
-                rows = await cursor.fetchall()
-                
-                for row in rows:
-                    row_dict = dict(row)
-                    # アイテムリストを解析して実際に含まれているか確認
-                    if self._check_material_in_npc_obtainable(row_dict.get('obtainable_items', ''), material_name):
-                        row_dict['formal_name'] = row_dict.get('name', '')
-                        row_dict['item_type'] = 'npcs'
-                        results.append(row_dict)
-                
-                return results
+            results = await self._select_relation_sources('npcs', RELATION_NPC_OBTAINABLE, material_name)
+            for result in results:
+                result['formal_name'] = result.get('name', '')
+                result['item_type'] = 'npcs'
+            return results
                 
         except Exception as e:
             logger.error(f"NPCs providing material検索エラー: {e}")
             return []
     
-    def _check_material_in_npc_requirements(self, requirements_str: str, material_name: str) -> bool:
-        """NPC必要素材リストに特定の素材が含まれているかチェック"""
-        return self._check_material_in_requirements(requirements_str, material_name)
-    
-    def _check_material_in_npc_obtainable(self, obtainable_str: str, material_name: str) -> bool:
-        """NPC取得可能アイテムリストに特定の素材が含まれているかチェック"""
-        return self._check_item_in_obtainable_items(obtainable_str, material_name)
-    
     async def _extract_npc_exchange_detail(self, npc_data: Dict[str, Any], target_item: str) -> Optional[Dict[str, Any]]:
         """NPCの交換詳細から特定アイテムに関する情報を抽出"""
         try:
@@ -1297,38 +1226,9 @@ class SearchEngine:
     async def _search_exact_wildcard_item(self, wildcard_query: str) -> List[Dict[str, Any]]:
         """ワイルドカードアイテムの完全一致検索（例：「*破片」という名前のアイテムを検索）"""
         try:
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # 各テーブルでワイルドカード名と完全一致するアイテムを検索
-                tables = ['equipments', 'materials', 'mobs']
-                
-                for table in tables:
-                    # formal_nameが完全一致
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table} WHERE formal_name = ?",
-                        (wildcard_query,)
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                    
-                    # common_nameが完全一致
-                    cursor = await db.execute(
-                        f"SELECT *, '{table}' as item_type FROM {table} WHERE common_name = ?",
-                        (wildcard_query,)
-                    )
-                    rows = await cursor.fetchall()
-                    results.extend([dict(row) for row in rows])
-                
-                # 重複を除去
-                unique_results = {}
-                for result in results:
-                    key = f"{result.get('id')}_{result.get('item_type')}"
-                    if key not in unique_results:
-                        unique_results[key] = result
-                
-                return list(unique_results.values())
+            catalog = await self._get_catalog()
+            # 各テーブルでワイルドカード名と完全一致するアイテムを検索
+            return catalog.find_by_exact_name(wildcard_query, ['equipments', 'materials', 'mobs'])
                 
         except Exception as e:
             logger.error(f"ワイルドカードアイテム完全一致検索エラー: {e}")
@@ -1340,93 +1240,10 @@ class SearchEngine:
             # レベル/ランクを除去
             cleaned_name = self._remove_level_rank_suffix(item_name)
             
-            async with aiosqlite.connect(self.db_manager.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                results = []
-                
-                # ワイルドカード文字のリスト
-                wildcard_chars = ['*', '?', '＊', '？']
-                
-                # 各テーブルでワイルドカードアイテムを検索
-                tables = ['equipments', 'materials']
-                
-                for table in tables:
-                    # ワイルドカードを含むアイテムを取得
-                    query = f"""
-                        SELECT *, '{table}' as item_type FROM {table} 
-                        WHERE formal_name LIKE '%*%' OR formal_name LIKE '%?%' 
-                        OR formal_name LIKE '%＊%' OR formal_name LIKE '%？%'
-                    """
-                    cursor = await db.execute(query)
-                    rows = await cursor.fetchall()
-                    
-                    for row in rows:
-                        row_dict = dict(row)
-                        wildcard_name = row_dict.get('formal_name', '')
-                        
-                        # ワイルドカードアイテムが元のアイテム名にマッチするかチェック
-                        if self._matches_wildcard_pattern(wildcard_name, item_name):
-                            results.append(row_dict)
-                        # レベル/ランクを除去した名前でもチェック
-                        elif cleaned_name != item_name and self._matches_wildcard_pattern(wildcard_name, cleaned_name):
-                            results.append(row_dict)
-                
-                return results
+            # ワイルドカードを含む装備・素材を照合（レベル/ランクを除去した名前でもチェック）
+            catalog = await self._get_catalog()
+            return catalog.match_wildcard_entries({item_name, cleaned_name}, ['equipments', 'materials'])
                 
         except Exception as e:
             logger.error(f"ワイルドカードアイテム検索エラー: {e}")
-            return []
-    
-    def _matches_wildcard_pattern(self, wildcard_pattern: str, item_name: str) -> bool:
-        """ワイルドカードパターンがアイテム名にマッチするかチェック"""
-        try:
-            # ワイルドカード文字を統一（全角も半角も*として扱う）
-            wildcard_chars = WILDCARD_SET
-            
-            # パターンからワイルドカード文字の位置を特定
-            wildcard_positions = []
-            for i, char in enumerate(wildcard_pattern):
-                if char in wildcard_chars:
-                    wildcard_positions.append(i)
-            
-            if not wildcard_positions:
-                return False
-            
-            # ワイルドカード以外の部分を抽出
-            pattern_parts = []
-            last_pos = 0
-            
-            for pos in wildcard_positions:
-                if pos > last_pos:
-                    pattern_parts.append(wildcard_pattern[last_pos:pos])
-                pattern_parts.append('*')  # ワイルドカードマーカー
-                last_pos = pos + 1
-            
-            if last_pos < len(wildcard_pattern):
-                pattern_parts.append(wildcard_pattern[last_pos:])
-            
-            # マッチング処理
-            if pattern_parts[0] == '*':
-                # 前方ワイルドカード（例：*破片）
-                suffix = ''.join(pattern_parts[1:])
-                return item_name.endswith(suffix)
-            elif pattern_parts[-1] == '*':
-                # 後方ワイルドカード（例：グロースクリスタル*）
-                prefix = ''.join(pattern_parts[:-1])
-                return item_name.startswith(prefix)
-            else:
-                # 中間ワイルドカード（例：【圧縮】*アイテム）
-                # ワイルドカード部分以外が完全一致しているかチェック
-                item_pos = 0
-                for part in pattern_parts:
-                    if part == '*':
-                        continue
-                    pos = item_name.find(part, item_pos)
-                    if pos == -1:
-                        return False
-                    item_pos = pos + len(part)
-                return True
-                
-        except Exception as e:
-            logger.warning(f"ワイルドカードパターンマッチングエラー: {e}")
-            return False
\ No newline at end of file
+            return []
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import aiosqlite
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+from db_connection import get_read_pool, open_connection
+
+logger = logging.getLogger(__name__)
+
+
+class SearchSession:
+    """1回の検索リクエストで共有する接続とカタログ
+
+    接続は最初の問い合わせ時に開き、読み取りトランザクションを張って
+    リクエスト中のすべての問い合わせを同じスナップショットにそろえる。
+    並行して実行される問い合わせも同じ接続を使う（接続ごとにスナップショットが分かれるため、
+    接続を追加しない）。カタログも最初に取得したものを使い続ける。
+    読み取り接続のプールが有効なら、接続はそこから借りて終了時に返す。
+    trace_statementsを指定すると、共有接続で実行したSQLの数をstatementsに数える。
+    """
+
+    def __init__(self, db_path: str, trace_statements: bool = False):
+        self.db_path = os.path.abspath(db_path)
+        self.catalog: Optional[Any] = None
+        self.trace_statements = trace_statements
+        self.statements = 0
+        self._db: Optional[aiosqlite.Connection] = None
+        # 同じセッション内で実行中・実行済みの問い合わせ（キー → タスク）
+        self._shared: Dict[Hashable, asyncio.Future] = {}
+        # 並行して実行される検索が同時に共有接続を開かないようにする
+        self._connect_lock = asyncio.Lock()
+
+    async def _open(self) -> aiosqlite.Connection:
+        """読み取りトランザクションを張った接続を開く（プールが有効ならそこから借りる）"""
+        pool = get_read_pool(self.db_path)
+        if pool is not None:
+            db = await pool.acquire()
+        else:
+            db = await open_connection(self.db_path)
+            db.row_factory = aiosqlite.Row
+        if self.trace_statements:
+            await db.set_trace_callback(self._count_statement)
+        await db.execute("BEGIN")
+        return db
+
+    async def connection(self) -> aiosqlite.Connection:
+        """共有接続を取得（未接続なら開く）"""
+        async with self._connect_lock:
+            if self._db is None:
+                self._db = await self._open()
+        return self._db
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[aiosqlite.Connection]:
+        """問い合わせ1回分の読み取り接続を借りる（常に共有接続。並行する問い合わせは接続内で順に実行される）"""
+        yield await self.connection()
+
+    async def shared(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """同じキーの問い合わせはセッション内で1回だけ実行し、結果を共有する
+
+        結果は呼び出し元どうしで同じオブジェクトになるため、書き換える場合は複製すること。
+        """
+        task = self._shared.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._shared[key] = task
+        return await asyncio.shield(task)
+
+    def _count_statement(self, statement: str):
+        """SQL実行ごとに呼ばれるコールバック（接続のスレッドで実行される）"""
+        self.statements += 1
+
+    async def close(self):
+        """読み取りトランザクションを終了して接続を閉じる"""
+        for task in self._shared.values():
+            task.cancel()
+        self._shared.clear()
+        db, self._db = self._db, None
+        if db is not None:
+            await self._close_connection(db)
+
+    async def _close_connection(self, db: aiosqlite.Connection):
+        """トランザクションを終了し、接続をプールに返す（プールがなければ閉じる）"""
+        pool = get_read_pool(self.db_path)
+        try:
+            await db.rollback()
+            if self.trace_statements:
+                await db.set_trace_callback(None)
+        except Exception as e:
+            logger.warning(f"検索セッションの終了エラー: {e}")
+            pool = None
+        if pool is not None:
+            await pool.release(db)
+        else:
+            await db.close()
+
+
+_current_session: ContextVar[Optional[SearchSession]] = ContextVar('search_session', default=None)
+
+
+def current_session(db_path: str) -> Optional[SearchSession]:
+    """実行中の検索セッションを取得（同じDBのものがなければNone）"""
+    session = _current_session.get()
+    if session is not None and session.db_path == os.path.abspath(db_path):
+        return session
+    return None
+
+
+@asynccontextmanager
+async def search_session(db_path: str, trace_statements: bool = False) -> AsyncIterator[SearchSession]:
+    """検索セッションを開始（実行中のセッションがあればそれを使う）"""
+    session = current_session(db_path)
+    if session is not None:
+        yield session
+        return
+
+    session = SearchSession(db_path, trace_statements)
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+        await session.close()
@@ -0,0 +1,98 @@
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+def percentile(sorted_values: List[float], ratio: float) -> float:
+    """ソート済みの値から最近傍順位法でパーセンタイルを求める"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class StageRecord:
+    """1回の検索段階の計測値"""
+
+    __slots__ = ('rows', 'statements')
+
+    def __init__(self):
+        self.rows = 0
+        self.statements = 0
+
+
+class SearchTracer:
+    """検索段階ごとの所要時間・取得件数・SQL実行数の記録
+
+    段階ごとに直近max_samples回分を保持し、パーセンタイルを集計する。
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        # 段階名 → (所要時間ms, 取得件数, SQL実行数) の直近の記録
+        self._samples: Dict[str, Deque[Tuple[float, int, int]]] = {}
+
+    def record(self, stage: str, elapsed_ms: float, rows: int = 0, statements: int = 0):
+        """1回分の計測値を記録"""
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = deque(maxlen=self.max_samples)
+            self._samples[stage] = samples
+        samples.append((elapsed_ms, rows, statements))
+
+    @contextmanager
+    def stage(self, stage: str, statement_counter: Optional[Any] = None) -> Iterator[StageRecord]:
+        """with内の処理を1段階として計測（取得件数は呼び出し側がrowsに設定）
+
+        statement_counterにはstatements属性でSQL実行数を数えているオブジェクトを渡す。
+        """
+        record = StageRecord()
+        statements_before = statement_counter.statements if statement_counter is not None else 0
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if statement_counter is not None:
+                record.statements = statement_counter.statements - statements_before
+            self.record(stage, elapsed_ms, record.rows, record.statements)
+
+    def clear(self):
+        """記録を破棄"""
+        self._samples.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """段階ごとの集計（回数、p50/p95/p99、平均件数、平均SQL実行数）"""
+        stats = {}
+        for stage, samples in self._samples.items():
+            if not samples:
+                continue
+            latencies = sorted(sample[0] for sample in samples)
+            count = len(samples)
+            stats[stage] = {
+                'count': count,
+                'p50_ms': percentile(latencies, 0.50),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'max_ms': latencies[-1],
+                'avg_rows': sum(sample[1] for sample in samples) / count,
+                'avg_statements': sum(sample[2] for sample in samples) / count,
+            }
+        return stats
+
+
+# DBパス → 計測記録（検索エンジンのインスタンスをまたいで共有）
+_tracers: Dict[str, SearchTracer] = {}
+
+
+def get_search_tracer(db_path: str, max_samples: int = 1000) -> SearchTracer:
+    """DBパスに対応する計測記録を取得（なければ作成）"""
+    key = os.path.abspath(db_path)
+    tracer = _tracers.get(key)
+    if tracer is None:
+        tracer = SearchTracer(max_samples)
+        _tracers[key] = tracer
+    return tracer
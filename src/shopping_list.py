@@ -0,0 +1,196 @@
+"""複数の装備の必要素材をまとめた買い物リスト
+
+貼り付けられた装備名を、カタログ（名前の索引と製作レシピのグラフ）でまとめて解決し、
+基本素材の合計を出す。各素材の入手先（ドロップするモブ・採集場所・NPC）は、
+全素材の検索キーで item_relations を一度に引いた結果から組み立てる。
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from item_catalog import ItemCatalog
+from item_relations import RELATION_DROP, RELATION_GATHERED_MATERIAL, RELATION_NPC_OBTAINABLE
+from npc_parser import NPCExchangeParser
+from recipe_graph import parse_target
+from text_normalizer import to_search_key
+
+# 1回の買い物リストで受け付ける対象の最大数
+MAX_SHOPPING_TARGETS = 20
+
+# 入手先として引く関連の種類
+SOURCE_RELATIONS = [RELATION_DROP, RELATION_GATHERED_MATERIAL, RELATION_NPC_OBTAINABLE]
+
+# 対象として受け付けるテーブル（装備はレシピで展開し、素材・レシピのない装備はそのまま数える）
+TARGET_TABLES = ('equipments', 'materials')
+
+_TARGET_SEPARATOR = re.compile(r'[,\n、，]')
+_PRICE = re.compile(r'^(?P<gold>\d+)G$')
+
+
+def parse_targets(text: str) -> List[Tuple[str, int]]:
+    """改行・カンマ区切りの対象を (名前, 個数) のリストにする（同じ名前は個数を合算）"""
+    totals: Dict[str, int] = {}
+    for part in _TARGET_SEPARATOR.split(text or ''):
+        if not part.strip():
+            continue
+        name, quantity = parse_target(part)
+        totals[name] = totals.get(name, 0) + quantity
+    return list(totals.items())
+
+
+def _per_exchange(quantity: Optional[str]) -> int:
+    """1回の購入・交換で手に入る個数（未記入は1個）"""
+    try:
+        return max(1, int(quantity))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _resolve_target(catalog: ItemCatalog, name: str) -> Optional[Dict[str, Any]]:
+    """対象名を装備・素材のエントリに解決（レシピを持つ装備を優先）"""
+    if name in catalog.recipes:
+        return catalog.recipes.entry(name)
+    for entry in catalog.find_exact_formal(name) + catalog.find_exact_common(name):
+        if entry['item_type'] in TARGET_TABLES:
+            return entry
+    return None
+
+
+def aggregate_targets(catalog: ItemCatalog, targets: Iterable[Tuple[str, int]]) -> Dict[str, Any]:
+    """対象をまとめて解決し、基本素材と途中で作る装備の合計を出す（DBには問い合わせない）"""
+    recipes = catalog.recipes
+    resolved = []
+    unresolved = []
+    materials: Dict[str, Dict[str, Any]] = {}
+    crafted: Dict[str, int] = {}
+
+    def add_material(name: str, count: int):
+        key = to_search_key(name)
+        material = materials.setdefault(key, {'name': name, 'key': key, 'quantity': 0})
+        material['quantity'] += count
+
+    for name, quantity in targets:
+        entry = _resolve_target(catalog, name)
+        if entry is None:
+            unresolved.append({'name': name, 'key': to_search_key(name), 'quantity': quantity,
+                               'suggestions': catalog.did_you_mean(name, 3)})
+            continue
+
+        formal_name = entry.get('formal_name') or name
+        resolved.append({'name': formal_name, 'quantity': quantity, 'item': entry})
+        if formal_name in recipes:
+            for material_name, count in recipes.base_materials(formal_name, quantity):
+                add_material(material_name, count)
+            for crafted_name, count in recipes.crafted_items(formal_name, quantity):
+                crafted[crafted_name] = crafted.get(crafted_name, 0) + count
+        else:
+            # レシピのない装備・素材はそれ自体を入手する
+            add_material(formal_name, quantity)
+
+    return {
+        'targets': resolved,
+        'unresolved': unresolved,
+        'materials': list(materials.values()),
+        'crafted_items': list(crafted.items()),
+    }
+
+
+def _npc_offer(npc: Dict[str, Any], exchanges: List[Dict[str, Any]],
+               relation: Dict[str, Any], needed: int) -> Dict[str, Any]:
+    """NPCの購入・交換1件分（必要数を揃えるための回数と、価格があれば合計Gold）"""
+    index = relation.get('exchange_index') or 0
+    required = exchanges[index].get('required_materials') if index < len(exchanges) else None
+    times = -(-needed // _per_exchange(relation.get('quantity')))
+
+    price = _PRICE.match(required or '')
+    return {
+        'name': npc.get('name', ''),
+        'business_type': npc.get('business_type') or '',
+        'required': required or '',
+        'times': times,
+        'gold': int(price.group('gold')) * times if price else None,
+    }
+
+
+def attach_sources(catalog: ItemCatalog, shopping: Dict[str, Any],
+                   relations: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """aggregate_targetsの結果に、各素材の入手先とNPCから買う場合のGoldを付ける
+
+    relationsは全素材と未解決の名前の検索キーで引いた item_relations の行（入手先の行はカタログから引く）。
+    装備・素材の一覧にない名前でも、モブ・採集場所・NPCから入手できるものは素材として数える。
+    """
+    materials = {material['key']: material for material in shopping['materials']}
+    relations = list(relations)
+    supplied = {relation['target_key']: relation['target_name'] for relation in relations}
+    unresolved = []
+    for target in shopping['unresolved']:
+        name = supplied.get(target['key'])
+        if name is None:
+            unresolved.append(target)
+            continue
+        shopping['targets'].append({'name': name, 'quantity': target['quantity'], 'item': None})
+        material = materials.setdefault(target['key'], {'name': name, 'key': target['key'], 'quantity': 0})
+        material['quantity'] += target['quantity']
+    shopping['unresolved'] = unresolved
+    shopping['materials'] = list(materials.values())
+    for material in materials.values():
+        material.update({'mobs': [], 'gatherings': [], 'npcs': [], 'acquisition': '', 'gold': None})
+
+    seen = set()
+    # NPCごとの交換パターン（複数の素材を扱うNPCでも1回だけ解析する）
+    npc_exchanges: Dict[Any, List[Dict[str, Any]]] = {}
+    for relation in relations:
+        material = materials.get(relation['target_key'])
+        source = catalog.get(relation['source_type'], relation['source_id'])
+        if material is None or source is None:
+            continue
+
+        relation_type = relation['relation_type']
+        if relation_type == RELATION_DROP:
+            # 同じモブの別レベルは1件にまとめる
+            key = (material['key'], relation_type, source.get('formal_name'), source.get('area'))
+            if key not in seen:
+                material['mobs'].append({
+                    'name': source.get('formal_name', ''),
+                    'area': source.get('area') or '',
+                    'drop_rate': relation.get('drop_info') or '',
+                })
+        elif relation_type == RELATION_GATHERED_MATERIAL:
+            key = (material['key'], relation_type, source.get('location'), source.get('collection_method'))
+            if key not in seen:
+                material['gatherings'].append({
+                    'location': source.get('location', ''),
+                    'method': source.get('collection_method') or '',
+                })
+        elif relation_type == RELATION_NPC_OBTAINABLE:
+            if relation['source_id'] not in npc_exchanges:
+                npc_exchanges[relation['source_id']] = NPCExchangeParser.parse_exchange_items(
+                    source.get('obtainable_items', ''),
+                    source.get('required_materials', ''),
+                    source.get('exp', ''),
+                    source.get('gold', '')
+                )
+            offer = _npc_offer(source, npc_exchanges[relation['source_id']], relation, material['quantity'])
+            # 同じNPCが複数の街にいる場合は同じ条件の取引を1件にまとめる
+            key = (material['key'], relation_type, offer['name'], offer['required'], offer['times'])
+            if key not in seen:
+                material['npcs'].append(offer)
+        else:
+            continue
+        seen.add(key)
+
+    # 素材の入手方法（採取・モブ討伐など）。ワイルドカード名（魔法石*）の素材にも一致させる
+    names = [material['name'] for material in materials.values()]
+    entries = catalog.resolve_names(names, ['materials'])
+    for material in materials.values():
+        found = entries.get(material['name']) or catalog.match_wildcard_entries([material['name']], ['materials'])
+        if found:
+            material['acquisition'] = found[0].get('acquisition_category') or ''
+
+        # 価格のある取引を安い順に、交換・納品はその後に並べる
+        material['npcs'].sort(key=lambda offer: (offer['gold'] is None, offer['gold'] or 0))
+        prices = [offer['gold'] for offer in material['npcs'] if offer['gold'] is not None]
+        if prices:
+            material['gold'] = min(prices)
+
+    shopping['total_gold'] = sum(material['gold'] or 0 for material in materials.values())
+    shopping['priced_materials'] = sum(1 for material in materials.values() if material['gold'] is not None)
+    return shopping
@@ -0,0 +1,81 @@
+from typing import Dict, List, Tuple
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # (-人気度, 表示名) の昇順 = 人気順・同点は名前順
+        self.top: List[Tuple[int, str]] = []
+
+
+class SuggestionTrie:
+    """検索キーの前方一致で補完候補を返すトライ木
+
+    各ノードにその配下の上位max_top件を保持しておき、
+    候補の取得はプレフィックスをたどるだけで済ませる。
+    """
+
+    def __init__(self, max_top: int = 10):
+        self.max_top = max_top
+        self._root = _Node()
+        self._scores: Dict[str, int] = {}
+        self._keys: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _path(self, key: str):
+        """キーをたどるノード列（ルートを含む）"""
+        node = self._root
+        yield node
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            yield node
+
+    def _update_top(self, node: _Node, name: str, score: int):
+        """ノードの上位候補にnameを反映"""
+        entry = (-score, name)
+        top = [item for item in node.top if item[1] != name]
+        if len(top) < self.max_top or entry < top[-1]:
+            top.append(entry)
+            top.sort()
+            del top[self.max_top:]
+        node.top = top
+
+    def add(self, name: str, key: str, score: int = 0):
+        """表示名nameを検索キーkeyで登録（登録済みなら人気度を更新）"""
+        if not name or not key:
+            return
+        if name in self._scores:
+            score = max(score, self._scores[name])
+        self._scores[name] = score
+        self._keys[name] = key
+        for node in self._path(key):
+            self._update_top(node, name, score)
+
+    def bump(self, name: str, count: int = 1):
+        """登録済みの候補の人気度を加算"""
+        if name not in self._scores:
+            return
+        self._scores[name] += count
+        for node in self._path(self._keys[name]):
+            self._update_top(node, name, self._scores[name])
+
+    def complete(self, prefix_key: str, limit: int = 5) -> List[str]:
+        """prefix_keyで始まる候補を人気順に最大limit件"""
+        node = self._root
+        for char in prefix_key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        if limit <= self.max_top:
+            return [name for _, name in node.top[:limit]]
+
+        candidates = sorted(
+            (-score, name) for name, score in self._scores.items()
+            if self._keys[name].startswith(prefix_key)
+        )
+        return [name for _, name in candidates[:limit]]
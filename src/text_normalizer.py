@@ -0,0 +1,211 @@
+"""検索キー（正規化済み名称）の生成"""
+import re
+import jaconv
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# 長音として扱う文字（全角チルダは半角化後の'~'）
+LONG_VOWEL_CHARS = ('~', '〜', '−', '‐', '―')
+_LONG_VOWEL_TABLE = str.maketrans({char: 'ー' for char in LONG_VOWEL_CHARS})
+
+FUZZY_MAP = {
+    # 長音変換（ー、～、〜）
+    'ー': ['−', '一', '～', '〜'],
+    '−': ['ー', '一', '～', '〜'],
+    '～': ['ー', '−', '一', '〜'],
+    '〜': ['ー', '−', '一', '～'],
+
+    # カタカナ表記ゆれ
+    'ヴ': ['ブ'],  # ヴィ→ビは下で個別に対応
+    'ヴァ': ['バ'],
+    'ヴィ': ['ビ'],
+    'ヴェ': ['ベ'],
+    'ヴォ': ['ボ'],
+
+    # ひらがな・カタカナ、英数字の全角半角は検索キーで統一済み
+
+    # 特殊文字
+    '&': ['＆', 'アンド'],
+    '＆': ['&', 'アンド'],
+
+    # よくある誤字
+    'ず': ['づ'],
+    'づ': ['ず'],
+    'じ': ['ぢ'],
+    'ぢ': ['じ'],
+
+    # 助詞の省略/付加（「の」）は正規化時に除去して対応
+}
+
+# ひらがな・カタカナ・漢字の対応表
+READING_MAP = {
+    # 武器・防具関連
+    'つるぎ': ['剣', '刀', 'ツルギ'],
+    'けん': ['剣', '刀', 'ケン'],
+    'かたな': ['刀', '剣', 'カタナ'],
+    'たて': ['盾', 'タテ'],
+    'よろい': ['鎧', 'ヨロイ'],
+    'かぶと': ['兜', 'カブト'],
+
+    # 材料関連
+    'いし': ['石', 'イシ'],
+    'きんぞく': ['金属', 'キンゾク'],
+    'ぬの': ['布', 'ヌノ'],
+    'かわ': ['革', '皮', 'カワ'],
+    'き': ['木', 'キ'],
+    'もくざい': ['木材', 'モクザイ'],
+
+    # モンスター関連
+    'りゅう': ['竜', '龍', 'リュウ'],
+    'ドラゴン': ['竜', '龍', 'どらごん'],
+    'まじゅう': ['魔獣', 'マジュウ'],
+    'ようせい': ['妖精', 'ヨウセイ'],
+    'フェアリー': ['妖精', 'ふぇありー'],
+
+    # 色関連
+    'あか': ['赤', 'アカ'],
+    'あお': ['青', 'アオ'],
+    'きいろ': ['黄', 'キイロ'],
+    'みどり': ['緑', 'ミドリ'],
+    'くろ': ['黒', 'クロ'],
+    'しろ': ['白', 'シロ'],
+    'きん': ['金', 'キン'],
+    'ぎん': ['銀', 'ギン'],
+
+    # 自然・元素関連
+    'ひかり': ['光', '輝', 'ヒカリ'],
+    'やみ': ['闇', '暗', 'ヤミ'],
+    'ほのお': ['炎', '焔', 'ホノオ'],
+    'みず': ['水', 'ミズ'],
+    'かぜ': ['風', 'カゼ'],
+    'つち': ['土', '地', 'ツチ'],
+    'こおり': ['氷', 'コオリ'],
+    'かみなり': ['雷', 'カミナリ'],
+
+    # その他
+    'ちから': ['力', 'チカラ'],
+    'こころ': ['心', 'ココロ'],
+    'たましい': ['魂', 'タマシイ'],
+    'せい': ['聖', '生', '性', 'セイ'],
+    'あんこく': ['暗黒', 'アンコク'],
+}
+
+
+def to_search_key(text: Optional[str]) -> Optional[str]:
+    """名称を検索キーに変換
+
+    全角英数→半角、半角カナ→全角、小文字化、カタカナ→ひらがな、
+    長音記号の統一を行う。ワイルドカード文字（*, ?）は半角にそろえて残す。
+    """
+    if text is None:
+        return None
+
+    text = str(text).strip()
+    text = jaconv.z2h(text, kana=False, ascii=True, digit=True)
+    text = jaconv.h2z(text, kana=True, ascii=False, digit=False)
+    text = text.lower()
+    text = jaconv.kata2hira(text)
+    return text.translate(_LONG_VOWEL_TABLE)
+
+
+# 助詞の「の」は、直後が漢字・カタカナのひらがなの「の」（トトの羽、ボアのソード）。
+# カタカナの「ノ」（ノーマル、キノコ）は名前の一部なので、カタカナの前の「の」はかな統一の前に除く。
+# 漢字の前の「の」は、対応表の置き換え（ぬの服 → 布服、ほのおのけん → 炎の剣）の後で除く
+_PARTICLE_NO_BEFORE_KATAKANA_PATTERN = re.compile(r'(?<=.)の(?=[\u30a1-\u30faｦ-ﾝ])')
+_PARTICLE_NO_BEFORE_KANJI_PATTERN = re.compile(r'(?<=.)の(?=[\u4e00-\u9fff々])')
+
+
+def _particle_free_key(text: str) -> str:
+    """助詞の「の」を除いた検索キー"""
+    key = to_search_key(_PARTICLE_NO_BEFORE_KATAKANA_PATTERN.sub('', str(text)))
+    return _PARTICLE_NO_BEFORE_KANJI_PATTERN.sub('', key)
+
+
+def _build_canonical_forms() -> Dict[str, str]:
+    """対応表の同値関係をまとめ、各表記から代表表記への置換表を作る"""
+    parent: Dict[str, str] = {}
+
+    def find(form: str) -> str:
+        parent.setdefault(form, form)
+        while parent[form] != form:
+            parent[form] = parent[parent[form]]
+            form = parent[form]
+        return form
+
+    # 表記ゆれキーでは助詞の「の」を先に除去するため、対応表の表記も同じ規則でそろえる
+    for mapping in (FUZZY_MAP, READING_MAP):
+        for original, alternatives in mapping.items():
+            for alternative in alternatives:
+                a = find(_particle_free_key(original))
+                b = find(_particle_free_key(alternative))
+                if a != b:
+                    parent[max(a, b, key=lambda f: (len(f), f))] = min(a, b, key=lambda f: (len(f), f))
+
+    # 代表表記（最も短い表記）に置き換えるのは別表記のみ
+    return {form: find(form) for form in parent if find(form) != form}
+
+
+_CANONICAL_FORMS = _build_canonical_forms()
+# 長い表記から順に照合する（「きん」を「き」より先に置換）
+_CANONICAL_PATTERN = re.compile('|'.join(
+    re.escape(form) for form in sorted(_CANONICAL_FORMS, key=len, reverse=True)
+))
+
+
+def to_fuzzy_key(text: Optional[str]) -> Optional[str]:
+    """名称を表記ゆれ吸収用のキーに変換
+
+    助詞の「の」（漢字・カタカナの前のひらがなの「の」）を除去し、対応表の表記を代表表記へ置き換える。
+    カタカナの「ノ」（ノーマル、キノコ）は残す。
+    索引側とクエリ側の両方に同じ変換をかけることで、
+    表記ゆれの組み合わせを列挙せずに1回の照合で済ませる。
+
+    代表表記が別の表記を含む場合（木材 → き材）や、置き換えで「の」の直後が漢字になる場合
+    （ほのおのけん → 炎の剣）があるため、置き換えは変化がなくなるまで繰り返す。
+    1回の置き換えで文字列は短くなるか辞書順で小さくなるので必ず止まり、
+    結果に再度かけても変わらない（to_fuzzy_key(to_fuzzy_key(x)) == to_fuzzy_key(x)）。
+    """
+    if text is None:
+        return None
+    key = to_search_key(_PARTICLE_NO_BEFORE_KATAKANA_PATTERN.sub('', str(text)))
+    while True:
+        replaced = _CANONICAL_PATTERN.sub(lambda m: _CANONICAL_FORMS[m.group(0)], key)
+        replaced = _PARTICLE_NO_BEFORE_KANJI_PATTERN.sub('', replaced)
+        if replaced == key:
+            return key
+        key = replaced
+
+
+# 末尾のレベル/ランク表記（Lv1, Lv.1, レベル1, ランクA, RankA, ★★, 末尾の数字）
+_TIER_SUFFIX_PATTERN = re.compile(
+    r'\s*(?:[Ll][Vv]\.?\s*(?P<level>\d+)'
+    r'|レベル\s*(?P<level_ja>\d+)'
+    r'|(?:ランク|[Rr]ank)\s*(?P<rank>[A-Za-z\d]+)'
+    r'|(?P<stars>★+)'
+    r'|(?P<number>\d+))$'
+)
+
+
+@lru_cache(maxsize=4096)
+def split_tier_suffix(name: str) -> Tuple[str, Optional[int]]:
+    """名称を (レベル/ランク表記を除いた基本名, 段階) に分ける
+
+    「魔法石Lv2★」のように表記が重なっていれば続けて除去し、段階は末尾の表記から取る。
+    段階表記がない、または英字ランクの場合の段階はNone。
+    """
+    base = name.strip()
+    tier = None
+    first = True
+    while True:
+        match = _TIER_SUFFIX_PATTERN.search(base)
+        if not match:
+            break
+        if first:
+            if match.group('stars'):
+                tier = len(match.group('stars'))
+            else:
+                value = match.group('level') or match.group('level_ja') or match.group('rank') or match.group('number')
+                tier = int(value) if value.isdigit() else None
+            first = False
+        base = base[:match.start()].strip()
+    return base, tier
@@ -0,0 +1,89 @@
+from itertools import combinations
+from typing import Dict, List, Set, Tuple
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """隣接文字の入れ替えを1操作と数える編集距離（max_distanceを超えたらmax_distance+1）"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class TypoIndex:
+    """削除辞書（SymSpell方式）による誤字候補の索引
+
+    登録キーから最大max_distance文字を削除した文字列をすべて索引しておき、
+    クエリ側も同様に削除した文字列で引いて候補を絞り、最後に編集距離で確認する。
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._deletes: Dict[str, Set[str]] = {}
+        self._max_key_length = 0
+
+    @staticmethod
+    def allowed_distance(key: str, strict: bool = False) -> int:
+        """キーの長さに応じた許容距離（短い名前ほど厳しくする）
+
+        strictは「もしかして」の候補ではなく検索結果として返す場合の基準で、
+        短い語（テスト、夏弓）が別の名前に化けないよう、距離1に5文字以上、距離2に8文字以上を求める。
+        """
+        if strict:
+            if len(key) <= 4:
+                return 0
+            if len(key) <= 7:
+                return 1
+            return 2
+        if len(key) <= 1:
+            return 0
+        if len(key) <= 4:
+            return 1
+        return 2
+
+    def _deletions(self, key: str, distance: int) -> Set[str]:
+        """keyから最大distance文字を削除した文字列"""
+        variants = {key}
+        for n in range(1, min(distance, len(key)) + 1):
+            for positions in combinations(range(len(key)), n):
+                variants.add(''.join(c for i, c in enumerate(key) if i not in positions))
+        return variants
+
+    def add(self, key: str):
+        """検索キーを登録"""
+        if not key:
+            return
+        self._max_key_length = max(self._max_key_length, len(key))
+        for variant in self._deletions(key, self.max_distance):
+            self._deletes.setdefault(variant, set()).add(key)
+
+    def lookup(self, query: str, strict: bool = False) -> List[Tuple[str, int]]:
+        """queryから許容距離内の登録キーを (キー, 距離) の距離順で返す"""
+        distance = min(self.allowed_distance(query, strict), self.max_distance)
+        # 登録キーより長すぎるクエリは削除文字列を作るまでもなく候補がない
+        if distance == 0 or len(query) > self._max_key_length + distance:
+            return []
+
+        candidates = set()
+        for variant in self._deletions(query, distance):
+            candidates.update(self._deletes.get(variant, ()))
+
+        matches = []
+        for key in candidates:
+            key_distance = edit_distance(query, key, distance)
+            if key_distance <= distance:
+                matches.append((key, key_distance))
+        matches.sort(key=lambda match: (match[1], abs(len(match[0]) - len(query)), match[0]))
+        return matches
@@ -0,0 +1,93 @@
+from typing import Dict, List, Set, Tuple
+from constants import WILDCARD_SET
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.ids: List[int] = []
+
+
+def _split_pattern(pattern: str) -> List[str]:
+    """パターンをリテラル部分とワイルドカードマーカー（'*'）に分割"""
+    parts: List[str] = []
+    literal = ''
+    for char in pattern:
+        if char in WILDCARD_SET:
+            if literal:
+                parts.append(literal)
+                literal = ''
+            parts.append('*')
+        else:
+            literal += char
+    if literal:
+        parts.append(literal)
+    return parts
+
+
+class WildcardMatcher:
+    """ワイルドカード名のアイテム（「*破片」「魔法石*」など）を具体名から引く照合器
+
+    前方ワイルドカードは末尾リテラルを逆順にしたトライ木、
+    後方ワイルドカードは先頭リテラルのトライ木、それ以外は中間パターンの一覧で持ち、
+    具体名を1回たどるだけで該当するパターンをすべて求める。
+    """
+
+    def __init__(self):
+        self._prefix_root = _TrieNode()
+        self._suffix_root = _TrieNode()
+        self._infix_patterns: List[Tuple[List[str], int]] = []
+
+    @staticmethod
+    def _insert(root: _TrieNode, literal: str, pattern_id: int):
+        node = root
+        for char in literal:
+            node = node.children.setdefault(char, _TrieNode())
+        node.ids.append(pattern_id)
+
+    def add(self, pattern: str, pattern_id: int) -> bool:
+        """ワイルドカードを含むパターンを登録（含まなければ登録しない）"""
+        parts = _split_pattern(pattern)
+        if '*' not in parts:
+            return False
+
+        if parts[0] == '*':
+            # 前方ワイルドカード（例：*破片）
+            self._insert(self._suffix_root, ''.join(parts[1:])[::-1], pattern_id)
+        elif parts[-1] == '*':
+            # 後方ワイルドカード（例：グロースクリスタル*）
+            self._insert(self._prefix_root, ''.join(parts[:-1]), pattern_id)
+        else:
+            # 中間ワイルドカード（例：【圧縮】*アイテム）
+            self._infix_patterns.append(([part for part in parts if part != '*'], pattern_id))
+        return True
+
+    @staticmethod
+    def _walk(root: _TrieNode, text: str, matched: Set[int]):
+        """textの先頭からトライ木をたどり、途中で終わるパターンを集める"""
+        node = root
+        matched.update(node.ids)
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                return
+            matched.update(node.ids)
+
+    def match(self, name: str) -> Set[int]:
+        """nameにマッチするパターンのID"""
+        matched: Set[int] = set()
+        self._walk(self._prefix_root, name, matched)
+        self._walk(self._suffix_root, name[::-1], matched)
+
+        for parts, pattern_id in self._infix_patterns:
+            position = 0
+            for part in parts:
+                position = name.find(part, position)
+                if position == -1:
+                    break
+                position += len(part)
+            else:
+                matched.add(pattern_id)
+        return matched
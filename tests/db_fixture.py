@@ -0,0 +1,55 @@
+"""
+テスト用の一時データベース
+
+run_with_database（temporary_database）で一時ディレクトリにDBを作ってテストを実行し、seed_database で行を入れる。
+検索キー（<カラム名>_key）と関連テーブルは、行を入れた後の初期化で本番と同じ規則で埋める。
+"""
+
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from database import DatabaseManager
+
+
+def insert_rows(path, rows):
+    """{テーブル名: [行の辞書]} の行をそのまま入れる"""
+    conn = sqlite3.connect(path)
+    try:
+        for table, table_rows in rows.items():
+            for row in table_rows:
+                conn.execute(
+                    f"INSERT INTO {table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    tuple(row.values())
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def seed_database(path, rows=None):
+    """DBを初期化して行を入れ、検索キーと関連を埋めたDatabaseManagerを返す"""
+    db_manager = DatabaseManager(path)
+    await db_manager.initialize_database()
+    if rows:
+        insert_rows(path, rows)
+        # CSV取り込み後の起動時と同じく、検索キーと関連を埋める
+        await db_manager.initialize_database()
+    return db_manager
+
+
+@contextmanager
+def temporary_database():
+    """一時ディレクトリに置くDBのパスを返す（抜けるとディレクトリごと消す）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        yield os.path.join(tmp, 'items.db')
+
+
+def run_with_database(test, *args):
+    """一時ディレクトリのDBのパスを渡して test(path, *args) を実行"""
+    with temporary_database() as path:
+        return asyncio.run(test(path, *args))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+search_historyを使った検索ベンチマークのテスト
+"""
+
+import sys
+import os
+import asyncio
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import seed_database, temporary_database
+from benchmark import main, make_variants, run_benchmark
+
+
+def test_make_variants():
+    """ひらがな・半角カナ・誤字・レベル表記の変形"""
+    variants = make_variants('スライム')
+    assert 'すらいむ' in variants
+    assert 'ｽﾗｲﾑ' in variants
+    assert 'スライムLv2' in variants
+    assert 'スイラム' in variants
+    assert 'スライム' not in variants
+
+
+async def _prepare(path):
+    await seed_database(path, {
+        'materials': [{'formal_name': 'トトの羽'}],
+        'mobs': [{'formal_name': 'トト', 'drops': 'トトの羽'}],
+        'search_history': [
+            {'user_id': '1', 'query': query, 'result_count': count}
+            for query, count in [('トト', 1), ('トトの羽', 1), ('存在しないアイテム', 0)]
+        ],
+    })
+
+
+def test_run_benchmark():
+    """履歴クエリを流して操作ごとの計測結果をJSONで出力する"""
+    with temporary_database() as path:
+        asyncio.run(_prepare(path))
+        
+        with open(path, 'rb') as f:
+            original = f.read()
+        result = asyncio.run(run_benchmark(path, variants=False, cold=True))
+        # 計測は複製したDBで行い、元のDBには書き込まない
+        with open(path, 'rb') as f:
+            assert f.read() == original
+        assert result['db_path'] == path
+        assert result['history_queries'] == 3
+        assert result['search']['operations'] == 3
+        # 関連アイテムはキャッシュを破棄した場合と載っている場合を分けて計測する
+        related = result['search_related_items']
+        assert related['cold']['operations'] == related['warm']['operations'] == 2
+        assert related['cold']['statements_per_op'] > 0
+        assert related['warm']['statements_per_op'] == 0
+        assert result['result_count_changed'] == 0
+        assert 'exact_formal' in result['stages']
+        
+        output = os.path.join(os.path.dirname(path), 'benchmark.json')
+        assert main(['--db', path, '--output', output, '--repeat', '2']) == 0
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        assert report['total_queries'] > 6
+        assert report['search']['p50_ms'] <= report['search']['p99_ms']
+
+
+if __name__ == "__main__":
+    test_make_variants()
+    test_run_benchmark()
+    print("✅ 検索ベンチマークテスト完了")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+検索候補セット（段階ごとの重複除去）のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from candidate_set import CandidateSet
+
+
+def item(item_type, item_id, name):
+    return {'item_type': item_type, 'id': item_id, 'formal_name': name}
+
+
+def test_deduplicate_across_stages():
+    """同じ(item_type, id)は最初の結果だけを残し、最初に見つけた段階の順番を返す"""
+    candidates = CandidateSet()
+    assert not candidates
+    assert candidates.add([item('materials', 1, '木の枝')], 'exact_formal') == 1
+    assert candidates.add([item('materials', 1, '木の枝'), item('equipments', 1, '木の剣')], 'partial') == 1
+    
+    assert len(candidates) == 2
+    assert [r['item_type'] for r in candidates] == ['materials', 'equipments']
+    assert candidates.stage_rank(item('materials', 1, '')) == 0
+    assert candidates.stage_rank(item('equipments', 1, '')) == 1
+    assert item('equipments', 1, '') in candidates
+    assert item('equipments', 2, '') not in candidates
+
+
+def test_from_results():
+    """1段階の結果からも作成でき、同一結果内の重複も除く"""
+    candidates = CandidateSet.from_results([item('mobs', 3, 'スライム'), item('mobs', 3, 'スライム')], 'fuzzy')
+    assert len(candidates) == 1
+    assert candidates.stage_rank(item('mobs', 3, '')) == 0
+
+
+if __name__ == "__main__":
+    test_deduplicate_across_stages()
+    test_from_results()
+    print("✅ 検索候補セットのテスト完了")
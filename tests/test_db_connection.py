@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+DB接続ファクトリとSQLプロファイラのテスト
+"""
+
+import sys
+import os
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import aiosqlite
+from db_fixture import run_with_database, seed_database
+from db_connection import ProfiledConnection, configure_query_profiler, connect, get_query_profiler, normalize_sql
+from search_engine import SearchEngine
+
+
+def test_normalize_sql():
+    """リテラルとIN句のプレースホルダ列をまとめる"""
+    assert normalize_sql("SELECT *\n  FROM mobs WHERE id = 3 AND name = 'トト'") == "SELECT * FROM mobs WHERE id = ? AND name = ?"
+    assert normalize_sql("SELECT * FROM mobs WHERE id IN (?, ?, ?)") == "SELECT * FROM mobs WHERE id IN (?)"
+
+
+async def _run_profiled(path, caplog_records):
+    db_manager = await seed_database(path, {
+        'materials': [{'formal_name': 'トトの羽'}],
+        'mobs': [{'formal_name': 'トト', 'drops': 'トトの羽'}],
+    })
+
+    profiler = configure_query_profiler({'sql_profiling': True, 'sql_slow_query_ms': 0})
+    profiler.reset()
+    try:
+        async with connect(path) as db:
+            assert isinstance(db, ProfiledConnection)
+            db.row_factory = aiosqlite.Row
+            # await と async with の両方で使える
+            async with db.execute("SELECT * FROM mobs WHERE id = ?", (1,)) as cursor:
+                rows = await cursor.fetchall()
+            assert rows[0]['formal_name'] == 'トト'
+            cursor = await db.execute("SELECT * FROM mobs WHERE id = 1")
+            assert (await cursor.fetchone())['formal_name'] == 'トト'
+            cursor = await db.executemany("INSERT INTO search_history (user_id, query) VALUES (?, ?)", [('1', 'a'), ('1', 'b')])
+            assert cursor.rowcount == 2
+            await db.commit()
+
+        # 他のモジュールも同じファクトリを通る
+        engine = SearchEngine(db_manager, {})
+        results = await engine.search('トト')
+        await engine.search_related_items(results[0])
+        await db_manager.update_search_stats_many(['トト'])
+
+        stats = {s['sql']: s for s in profiler.top(100, 'count')}
+        assert stats["SELECT * FROM mobs WHERE id = ?"]['count'] == 2
+        assert stats["SELECT * FROM mobs WHERE id = ?"]['rows'] == 2
+        assert stats["INSERT INTO search_history (user_id, query) VALUES (?)"]['rows'] == 2
+        assert any(sql.startswith("SELECT * FROM materials") for sql in stats)
+        assert any('search_stats' in sql for sql in stats)
+
+        summary = profiler.get_stats(3)
+        assert summary['enabled'] and len(summary['slowest']) == 3
+        assert summary['executions'] >= summary['statements']
+        # 閾値を超えたSELECTは文ごとに1回だけ実行計画をログに出す
+        plans = [r for r in caplog_records if '実行計画' in r.getMessage()]
+        assert plans
+        assert len(plans) == len({r.getMessage().split('\n')[0].split(': ', 1)[1] for r in plans})
+    finally:
+        configure_query_profiler({})
+        profiler.reset()
+
+    async with connect(path) as db:
+        assert not isinstance(db, ProfiledConnection)
+
+
+class _Collector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_profiled_connection():
+    """プロファイラが有効なときだけ接続を包み、SQL文ごとに集計する"""
+    collector = _Collector()
+    logger = logging.getLogger('db_connection')
+    logger.addHandler(collector)
+    try:
+        run_with_database(_run_profiled, collector.records)
+    finally:
+        logger.removeHandler(collector)
+
+
+if __name__ == "__main__":
+    test_normalize_sql()
+    test_profiled_connection()
+    print("✅ DB接続ファクトリのテスト完了")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+インメモリアイテムカタログのテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import run_with_database, seed_database
+from item_catalog import ItemCatalog
+from search_engine import SearchEngine
+
+ROWS = {
+    'equipments': [
+        {'id': 1, 'formal_name': 'ウッドソード', 'common_name': '木剣', 'required_materials': '木の棒:8,トトの羽:4'},
+        {'id': 2, 'formal_name': 'ウッドトップソード', 'common_name': '木剣', 'required_materials': 'ウッドソード:1,ボアの皮:8'},
+    ],
+    'materials': [
+        {'id': 10, 'formal_name': 'トトの羽', 'common_name': 'トト羽,羽'},
+        {'id': 11, 'formal_name': '*破片', 'common_name': None},
+    ],
+    'mobs': [
+        {'id': 20, 'formal_name': 'トト', 'common_name': None, 'drops': 'トトの羽,トト・ノーマルの破片'},
+    ],
+    'npcs': [
+        {'id': 30, 'name': 'アヴィル', 'location': 'レポロ'},
+    ],
+    'gatherings': [
+        {'id': 40, 'location': 'レポロ', 'collection_method': '採取'},
+    ],
+}
+
+
+def test_exact_and_common_lookup():
+    """完全一致・一般名称検索"""
+    catalog = ItemCatalog(ROWS)
+    assert [r['id'] for r in catalog.find_exact_formal('ウッドソード')] == [1]
+    assert [r['id'] for r in catalog.find_exact_common('木剣')] == [1, 2]
+    assert [r['id'] for r in catalog.find_exact_common('羽')] == [10]
+    # NPC名・採集場所はformal_nameとして扱う
+    npc = catalog.find_exact_formal('アヴィル')[0]
+    assert npc['item_type'] == 'npcs' and npc['formal_name'] == 'アヴィル'
+    assert [r['item_type'] for r in catalog.find_exact_formal('レポロ')] == ['gatherings']
+
+
+def test_partial_and_wildcard():
+    """部分一致・ワイルドカード検索（テーブル順を維持）"""
+    catalog = ItemCatalog(ROWS)
+    assert [(r['item_type'], r['id']) for r in catalog.find_partial('トト')] == [
+        ('materials', 10), ('mobs', 20)
+    ]
+    # 空白だけのクエリは全件に一致させない
+    assert catalog.find_partial('') == catalog.find_partial(' 　') == []
+    assert [r['id'] for r in catalog.find_wildcard('ウッド*')] == [1, 2]
+
+
+def test_wildcard_plan():
+    """前方・後方・中間のリテラルで候補を絞っても全件照合と同じ結果"""
+    catalog = ItemCatalog(ROWS)
+    assert [r['id'] for r in catalog.find_wildcard('ｳｯﾄﾞ*')] == [1, 2]
+    assert [r['id'] for r in catalog.find_wildcard('*ソード')] == [1, 2]
+    assert [r['id'] for r in catalog.find_wildcard('*トップ*')] == [2]
+    assert [r['id'] for r in catalog.find_wildcard('トト?羽')] == [10]
+    assert [(r['item_type'], r['id']) for r in catalog.find_wildcard('*羽*')] == [
+        ('materials', 10)
+    ]
+    assert len(catalog.find_wildcard('*')) == 7
+
+
+def test_returns_copies():
+    """返却値を書き換えてもカタログは変わらない"""
+    catalog = ItemCatalog(ROWS)
+    result = catalog.find_exact_formal('トト')[0]
+    result['original_query'] = 'トト'
+    assert 'original_query' not in catalog.find_exact_formal('トト')[0]
+    assert catalog.get('mobs', 20)['formal_name'] == 'トト'
+
+
+def test_level_family():
+    """レベル/ランク違いのアイテムを段階の近い順に引く"""
+    rows = {'materials': [
+        {'id': 1, 'formal_name': '魔法石', 'common_name': None},
+        {'id': 2, 'formal_name': '魔法石Lv1', 'common_name': None},
+        {'id': 3, 'formal_name': '魔法石Lv3', 'common_name': None},
+        {'id': 4, 'formal_name': '魔法石Lv2', 'common_name': None},
+        {'id': 5, 'formal_name': '魔法石の欠片', 'common_name': None},
+    ]}
+    catalog = ItemCatalog(rows)
+    assert [r['id'] for r in catalog.find_family('魔法石')] == [1, 2, 4, 3]
+    assert [r['id'] for r in catalog.find_family('魔法石Lv4')] == [3, 4, 2, 1]
+    assert [r['id'] for r in catalog.find_family('魔法石 lv.2')][:3] == [4, 2, 3]
+    assert catalog.find_family('魔法石の欠片Lv2')[0]['id'] == 5
+    assert catalog.find_family('火炎石Lv1') == []
+
+
+async def _run_level_family_search(path):
+    db_manager = await seed_database(path, {
+        'mobs': [{'formal_name': name} for name in ('スライム', 'サンドスライム', '魔法石の番人')],
+        'materials': [{'formal_name': name} for name in ('魔法石Lv1', '魔法石Lv2', '魔法石Lv3')],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    
+    # 段階のない基本名だけのアイテム群でも、部分一致の候補を落とさない
+    results = await engine.search('スライム2')
+    assert [r['formal_name'] for r in results] == ['スライム', 'サンドスライム']
+    
+    # 段階違いを近い順に並べ、除去したクエリでの候補を後に続ける
+    results = await engine.search('魔法石Lv5')
+    assert [r['formal_name'] for r in results] == ['魔法石Lv3', '魔法石Lv2', '魔法石Lv1', '魔法石の番人']
+
+
+def test_level_family_search():
+    """レベル/ランク付きのクエリで、アイテム群と除去したクエリの結果を合わせて返す"""
+    run_with_database(_run_level_family_search)
+
+
+def test_resolve_names():
+    """複数の名前を表記どおりの完全一致でまとめて引く（ワイルドカード名は後ろに続ける）"""
+    catalog = ItemCatalog(ROWS)
+    resolved = catalog.resolve_names(['トトの羽', '破片', 'ウッドソード', 'トトの羽'], ['materials'], ['*'])
+    assert list(resolved) == ['トトの羽', '破片', 'ウッドソード']
+    assert [r['id'] for r in resolved['トトの羽']] == [10]
+    assert [r['id'] for r in resolved['破片']] == [11]
+    assert resolved['ウッドソード'] == []
+    # 一般名称は表記どおり（カンマ区切りのまま）でのみ一致
+    assert catalog.resolve_names(['トト羽'], ['materials'])['トト羽'] == []
+    assert [r['id'] for r in catalog.resolve_names(['木剣'], ['equipments'])['木剣']] == [1, 2]
+
+
+if __name__ == "__main__":
+    test_exact_and_common_lookup()
+    test_partial_and_wildcard()
+    test_wildcard_plan()
+    test_returns_copies()
+    test_level_family()
+    test_level_family_search()
+    test_resolve_names()
+    print("✅ アイテムカタログテスト完了")
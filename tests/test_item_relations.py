@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+アイテム関連テーブル（CSV取り込み時に展開する辺）のテスト
+"""
+
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import insert_rows, run_with_database, seed_database
+from db_connection import connect
+from item_relations import RELATIONS_VERSION, extract_relations, rebuild_relations
+from search_engine import SearchEngine
+from search_session import search_session
+from text_normalizer import to_search_key
+
+
+def test_extract_relations():
+    """自由記述の列から数量・ドロップ率・交換番号付きの関連を取り出す"""
+    relations = extract_relations('equipments', {'id': 1, 'required_materials': '木の棒:8,トトの羽:4'})
+    assert [(r[2], r[3], r[4], r[5]) for r in relations] == [
+        ('required_material', '木の棒', '木の棒', '8'),
+        ('required_material', 'トトの羽', 'ととの羽', '4'),
+    ]
+    
+    relations = extract_relations('mobs', {'id': 2, 'drops': 'トトの羽(10%)、トト・ノーマルの破片'})
+    assert [(r[3], r[6]) for r in relations] == [('トトの羽', '10%'), ('トト・ノーマルの破片', None)]
+    
+    # 価格は素材として扱わず、複数素材の交換は素材ごとに同じ交換番号で登録
+    relations = extract_relations('npcs', {
+        'id': 3, 'obtainable_items': '始まりの鍛治槌:1,上級装備:1', 'required_materials': '50G,素材A:2素材B:3'
+    })
+    assert [(r[2], r[3], r[5], r[7]) for r in relations] == [
+        ('npc_obtainable', '始まりの鍛治槌', '1', 0),
+        ('npc_obtainable', '上級装備', '1', 1),
+        ('npc_required', '素材A', '2', 1),
+        ('npc_required', '素材B', '3', 1),
+    ]
+    
+    relations = extract_relations('gatherings', {'id': 4, 'obtained_materials': '綺麗な果実, 紫の水晶'})
+    assert [r[3] for r in relations] == ['綺麗な果実', '紫の水晶']
+
+
+def test_extract_irregular_entries():
+    """連続した「名前:数量」・見出し・クエストの納品条件・ドロップの個数を読み分ける"""
+    # 入手側も必要側と同じく、区切りなしで続く複数アイテムを分ける
+    relations = extract_relations('npcs', {
+        'id': 5,
+        'obtainable_items': 'エフォート・エビデンスLv1:1魔法石Lv1:10,魔結晶:10',
+        'required_materials': 'ハチの巣のかけら10個の納品,Lv10以上のしかばね20匹の討伐',
+    })
+    assert [(r[2], r[3], r[5], r[7]) for r in relations] == [
+        ('npc_obtainable', 'エフォート・エビデンスLv1', '1', 0),
+        ('npc_obtainable', '魔法石Lv1', '10', 0),
+        ('npc_required', 'ハチの巣のかけら', '10', 0),
+        ('npc_obtainable', '魔結晶', '10', 1),
+    ]
+    
+    # 「圧縮:」は見出しなので名前に含めない
+    relations = extract_relations('npcs', {
+        'id': 6, 'obtainable_items': '石:64,圧縮:[圧縮]石:1', 'required_materials': '[圧縮]石:1,圧縮:石:64'
+    })
+    assert [(r[2], r[3], r[5]) for r in relations] == [
+        ('npc_obtainable', '石', '64'),
+        ('npc_required', '[圧縮]石', '1'),
+        ('npc_obtainable', '[圧縮]石', '1'),
+        ('npc_required', '石', '64'),
+    ]
+    
+    # 末尾の個数は除いた名前でも引けるようにし、Lv表記は個数として扱わない
+    relations = extract_relations('mobs', {'id': 7, 'drops': '霊廟の残骸2,魔法石Lv1,グロースクリスタルLv3(5%)'})
+    assert [(r[3], r[5], r[6]) for r in relations] == [
+        ('霊廟の残骸2', None, None),
+        ('霊廟の残骸', '2', None),
+        ('魔法石Lv1', None, None),
+        ('グロースクリスタルLv3', None, '5%'),
+    ]
+
+
+async def _run_relations(path):
+    db_manager = await seed_database(path, {
+        'materials': [{'id': 1, 'formal_name': 'ボアの皮', 'acquisition_category': '採取'}],
+        'equipments': [{'id': 10, 'formal_name': 'ボアの服', 'required_materials': 'ボアの皮:8'}],
+        'mobs': [{'id': 20, 'formal_name': 'ファングボア', 'drops': 'ボアの皮,ボアの牙'}],
+        'npcs': [{
+            'id': 30, 'location': 'レポロ', 'name': 'カイト', 'business_type': '交換',
+            'obtainable_items': 'ボアの皮:64', 'required_materials': '[圧縮]ボアの皮:1'
+        }],
+        'gatherings': [{
+            'id': 40, 'location': 'セシド', 'collection_method': '採取', 'obtained_materials': '綺麗な果実, ボアの皮'
+        }],
+    })
+    
+    async with connect(path) as db:
+        assert await rebuild_relations(db) == 7
+        await db.commit()
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    material = (await engine.search('ボアの皮'))[0]
+    related = await engine.search_related_items(material)
+    
+    assert [r['id'] for r in related['usage_destinations']] == [10]
+    sources = {(r['item_type'], r['id'], r['relation_type']) for r in related['acquisition_sources']}
+    # 「[圧縮]ボアの皮」を要求するNPCは、名前の一部が一致するだけなので利用先に含めない
+    assert sources == {
+        ('mobs', 20, 'drop_from_mob'),
+        ('npcs', 30, 'npc_source'),
+        ('gatherings', 40, 'gathering_location'),
+    }
+    gathering = next(r for r in related['acquisition_sources'] if r['item_type'] == 'gatherings')
+    assert gathering['formal_name'] == 'セシド' and gathering['collection_method'] == '採取'
+
+
+def test_related_items_from_relations():
+    """関連アイテムを関連テーブルから完全一致で引く"""
+    run_with_database(_run_relations)
+
+
+async def _run_batched_lookup(path):
+    db_manager = await seed_database(path, {
+        'materials': [{'id': i, 'formal_name': f'素材{i}'} for i in range(1, 31)] + [{'id': 100, 'formal_name': '*破片'}],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    statements = []
+    for count in (1, 30):
+        mob = {
+            'item_type': 'mobs', 'id': count, 'formal_name': 'テストモブ',
+            'drops': ','.join(f'素材{i}(1%)' for i in range(1, count + 1)) + ',スライムの破片'
+        }
+        async with search_session(path, trace_statements=True) as session:
+            related = await engine.search_related_items(mob)
+            statements.append(session.statements)
+        
+        assert [r['id'] for r in related['dropped_items']] == list(range(1, count + 1)) + [100]
+        assert related['dropped_items'][0]['drop_info'] == '1%'
+        assert related['dropped_items'][-1]['original_drop_name'] == 'スライムの破片'
+    
+    # ドロップの数によらずSQLの実行数は変わらない
+    assert statements[0] == statements[1]
+
+
+async def _run_relations_version(path):
+    db_manager = await seed_database(path)
+    insert_rows(path, {
+        'mobs': [{'id': 1, 'formal_name': 'ヨルズ', 'drops': '霊廟の残骸2'}],
+        # 旧い抽出規則で作られた関連（版の記録なし）
+        'item_relations': [{
+            'source_type': 'mobs', 'source_id': 1, 'relation_type': 'drop',
+            'target_name': '霊廟の残骸2', 'target_key': '霊廟の残骸2'
+        }],
+    })
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM schema_versions")
+    conn.commit()
+    conn.close()
+    
+    # 起動時に現在の規則で作り直し、版を記録する
+    await db_manager.initialize_database()
+    conn = sqlite3.connect(path)
+    targets = [row[0] for row in conn.execute("SELECT target_name FROM item_relations ORDER BY id")]
+    version = conn.execute("SELECT version FROM schema_versions WHERE name = 'item_relations'").fetchone()[0]
+    conn.close()
+    assert targets == ['霊廟の残骸2', '霊廟の残骸']
+    assert version == RELATIONS_VERSION
+
+
+def test_relations_rebuilt_on_version_change():
+    """抽出規則の版が変わった既存DBの関連は起動時に作り直す"""
+    run_with_database(_run_relations_version)
+
+
+async def _run_stale_search_keys(path):
+    db_manager = await seed_database(path, {
+        'mobs': [{'id': 1, 'formal_name': 'トト', 'drops': 'トトの羽'}],
+    })
+    
+    # 旧い正規化の規則で保存されたキー（名前のキーと関連のキー）
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE mobs SET formal_name_key = 'トト' WHERE id = 1")
+    conn.execute("UPDATE item_relations SET target_key = 'トトの羽'")
+    conn.commit()
+    conn.close()
+    
+    # 起動時に現在の規則で計算し直し、関連も作り直す
+    await db_manager.initialize_database()
+    conn = sqlite3.connect(path)
+    name_key = conn.execute("SELECT formal_name_key FROM mobs WHERE id = 1").fetchone()[0]
+    target_keys = [row[0] for row in conn.execute("SELECT target_key FROM item_relations")]
+    conn.close()
+    assert name_key == to_search_key('トト')
+    assert target_keys == [to_search_key('トトの羽')]
+
+
+def test_stale_search_keys_recomputed():
+    """正規化の規則が変わった既存DBの検索キーは起動時に計算し直す"""
+    run_with_database(_run_stale_search_keys)
+
+
+def test_related_items_batched_lookup():
+    """ドロップ・必要素材の名前はまとめて引き、件数に比例したSQLを実行しない"""
+    run_with_database(_run_batched_lookup)
+
+
+if __name__ == "__main__":
+    test_extract_relations()
+    test_extract_irregular_entries()
+    test_relations_rebuilt_on_version_change()
+    test_stale_search_keys_recomputed()
+    test_related_items_from_relations()
+    test_related_items_batched_lookup()
+    print("✅ アイテム関連テーブルのテスト完了")
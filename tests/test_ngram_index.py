@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+n-gram転置インデックスの部分一致テスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from ngram_index import NGramIndex
+
+
+def build_index():
+    index = NGramIndex()
+    names = ['ウッドソード', 'ウッドトップソード', 'ストーンソード', 'トトの羽', '石', '魔法石*']
+    for doc_id, name in enumerate(names):
+        index.add(doc_id, name)
+    index.add(3, 'トト羽')  # 一般名称
+    return index
+
+
+def test_short_queries_use_postings():
+    """1〜3文字のクエリ"""
+    index = build_index()
+    assert index.search('石') == {4, 5}
+    assert index.search('ソード') == {0, 1, 2}
+    assert index.search('ト羽') == {3}
+
+
+def test_long_queries_are_verified():
+    """4文字以上はn-gramの積集合を実文字列で確認する"""
+    index = build_index()
+    assert index.search('ウッドソード') == {0}
+    assert index.search('トップソード') == {1}
+    # n-gramはすべて含むが連続しない文字列はヒットしない
+    assert index.search('ソードウッド') == set()
+    assert index.search('存在しないアイテム') == set()
+
+
+if __name__ == "__main__":
+    test_short_queries_use_postings()
+    test_long_queries_are_verified()
+    print("✅ n-gramインデックステスト完了")
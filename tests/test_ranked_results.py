@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+スコア順検索結果（ヒープによる上位選択）のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from ranked_results import ChainedResults, RankedResults, copy_results, iter_unordered
+
+
+def build_results(limit=None):
+    scores = [30, 95, 50, 95, 10]
+    ranked = [((-score,), {'id': i, 'search_score': score}) for i, score in enumerate(scores)]
+    return RankedResults(ranked, limit)
+
+
+def test_lazy_top_k():
+    """参照した順位までだけ並べ、同点は登録順"""
+    results = build_results()
+    assert len(results) == 5
+    assert results[0]['id'] == 1
+    assert repr(results) == 'RankedResults(5件, 整列済み1件)'
+    assert [r['id'] for r in results[:3]] == [1, 3, 2]
+    assert results[-1]['id'] == 4
+    assert [r['id'] for r in results] == [1, 3, 2, 0, 4]
+
+
+def test_limit_and_copy():
+    """件数制限と、未整列のままの複製"""
+    results = build_results(limit=2)
+    assert len(results) == 2 and [r['id'] for r in results] == [1, 3]
+
+    results = build_results()
+    duplicate = copy_results(results)
+    duplicate[0]['original_query'] = 'x'
+    assert 'original_query' not in results[0]
+    assert [r['id'] for r in duplicate] == [1, 3, 2, 0, 4]
+    assert copy_results([{'id': 1}]) == [{'id': 1}]
+
+
+def test_chained_results():
+    """複数クエリの結果をつなげ、切り出したページの分だけ並べる"""
+    first = build_results()
+    second = [{'id': 10}, {'id': 11}]
+    results = ChainedResults([first, [], second])
+    assert len(results) == 7
+    assert [r['id'] for r in results[:2]] == [1, 3]
+    assert repr(first) == 'RankedResults(5件, 整列済み2件)'
+    assert [r['id'] for r in results[4:6]] == [4, 10]
+    assert results[5]['id'] == 10 and results[-1]['id'] == 11
+    assert [r['id'] for r in results[::3]] == [1, 0, 11]
+    assert [r['id'] for r in results] == [1, 3, 2, 0, 4, 10, 11]
+    assert results[7:] == [] and not ChainedResults([[], []])
+    try:
+        results[7]
+        assert False
+    except IndexError:
+        pass
+
+
+def test_iter_unordered():
+    """並び順の要らない集計では、並べ替えずに全件を列挙する"""
+    results = build_results()
+    results[0]
+    assert sorted(r['id'] for r in iter_unordered(results)) == [0, 1, 2, 3, 4]
+    assert repr(results) == 'RankedResults(5件, 整列済み1件)'
+    
+    # 件数制限で外れる候補は含めない
+    assert sorted(r['id'] for r in iter_unordered(build_results(limit=3))) == [1, 2, 3]
+    
+    chained = ChainedResults([build_results(), [{'id': 10}]])
+    assert sorted(r['id'] for r in iter_unordered(chained)) == [0, 1, 2, 3, 4, 10]
+    assert sorted(r['id'] for r in iter_unordered([{'id': 7}])) == [7]
+
+
+if __name__ == "__main__":
+    test_lazy_top_k()
+    test_limit_and_copy()
+    test_chained_results()
+    test_iter_unordered()
+    print("✅ スコア順検索結果テスト完了")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+製作レシピのグラフ（基本素材までの展開）のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import run_with_database, seed_database
+from item_catalog import ItemCatalog
+from recipe_graph import RecipeGraph, parse_target
+from search_engine import SearchEngine
+
+EQUIPMENTS = [
+    {'id': 1, 'formal_name': 'ウッドソード', 'required_materials': '木の棒:8,トトの羽:4'},
+    {'id': 2, 'formal_name': 'ウッドトップソード', 'required_materials': 'ウッドソード:1,ボアの皮:8'},
+    {'id': 3, 'formal_name': 'ウッドシールド', 'required_materials': '木の棒:4'},
+    # 同じ中間素材（ウッドソード）を2経路で使う
+    {'id': 4, 'formal_name': '双剣の盾', 'required_materials': 'ウッドトップソード:2,ウッドソード:1,ウッドシールド:1'},
+    {'id': 5, 'formal_name': '布の服', 'required_materials': None},
+]
+
+
+def test_base_material_closure():
+    """基本素材の合計・途中で作る装備・深さを構築時に計算"""
+    graph = RecipeGraph(EQUIPMENTS)
+    assert len(graph) == 4
+    assert 'ウッドトップソード' in graph and '布の服' not in graph and '木の棒' not in graph
+
+    assert graph.base_materials('ウッドトップソード', 2) == [('木の棒', 16), ('トトの羽', 8), ('ボアの皮', 16)]
+    assert graph.crafted_items('ウッドトップソード', 2) == [('ウッドソード', 2)]
+    assert graph.depth('ウッドトップソード') == 2
+
+    # ウッドソードは 2×1 + 1 = 3本、木の棒は 3×8 + 4 = 28本
+    assert dict(graph.base_materials('双剣の盾')) == {'木の棒': 28, 'トトの羽': 12, 'ボアの皮': 16}
+    assert dict(graph.crafted_items('双剣の盾')) == {'ウッドトップソード': 2, 'ウッドソード': 3, 'ウッドシールド': 1}
+    assert graph.depth('双剣の盾') == 3
+
+    # 表記ゆれ（ひらがな）でも引ける
+    assert graph.base_materials('うっどそーど') == [('木の棒', 8), ('トトの羽', 4)]
+    assert graph.entry('ウッドソード')['id'] == 1
+    assert graph.base_materials('木の棒') == []
+
+
+def test_expand_tree():
+    """製作ツリーは必要数を掛け合わせて展開し、上限を超えたら打ち切る"""
+    graph = RecipeGraph(EQUIPMENTS)
+    tree = graph.expand('ウッドトップソード', 3)
+    assert tree['name'] == 'ウッドトップソード' and tree['quantity'] == 3
+    sword, hide = tree['children']
+    assert (sword['name'], sword['quantity']) == ('ウッドソード', 3)
+    assert [(c['name'], c['quantity']) for c in sword['children']] == [('木の棒', 24), ('トトの羽', 12)]
+    assert (hide['name'], hide['quantity'], hide['children']) == ('ボアの皮', 24, [])
+
+    truncated = graph.expand('双剣の盾', max_nodes=3)
+    assert truncated['truncated'] or any(child['truncated'] for child in truncated['children'])
+    assert graph.expand('木の棒') is None
+
+
+def test_cycle_detection():
+    """循環するレシピは戻り辺で展開を止め、その先を基本素材として扱う"""
+    graph = RecipeGraph([
+        {'id': 1, 'formal_name': '賢者の石', 'required_materials': '賢者の粉:1,魔石:2'},
+        {'id': 2, 'formal_name': '賢者の粉', 'required_materials': '賢者の石:1,砂:3'},
+        {'id': 3, 'formal_name': '賢者の杖', 'required_materials': '賢者の石:1,木の棒:5'},
+    ])
+    assert graph.cycles == [['賢者の石', '賢者の粉', '賢者の石']]
+    assert dict(graph.base_materials('賢者の石')) == {'賢者の石': 1, '砂': 3, '魔石': 2}
+    assert dict(graph.base_materials('賢者の杖')) == {'賢者の石': 1, '砂': 3, '魔石': 2, '木の棒': 5}
+
+    powder = graph.expand('賢者の石')['children'][0]
+    assert powder['children'][0]['cycle'] and powder['children'][0]['children'] == []
+
+
+def test_catalog_recipes():
+    """カタログの構築時にレシピのグラフも作る"""
+    catalog = ItemCatalog({'equipments': EQUIPMENTS})
+    assert catalog.recipes.base_materials('ウッドトップソード') == [('木の棒', 8), ('トトの羽', 4), ('ボアの皮', 8)]
+
+
+async def _run_engine_crafting_tree(path):
+    db_manager = await seed_database(path, {
+        'equipments': [
+            {'id': row['id'], 'formal_name': row['formal_name'], 'required_materials': row['required_materials']}
+            for row in EQUIPMENTS[:2]
+        ],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    crafting = await engine.get_crafting_tree('ウッドトップソード', 2)
+    assert crafting['item']['id'] == 2
+    assert crafting['base_materials'] == [('木の棒', 16), ('トトの羽', 8), ('ボアの皮', 16)]
+    assert crafting['tree']['children'][0]['quantity'] == 2
+    
+    # 名前が完全に一致しなくても検索で見つかった装備のレシピを使う
+    assert (await engine.get_crafting_tree('ウッドトップソド'))['item']['id'] == 2
+    assert await engine.get_crafting_tree('ボアの皮') is None
+
+
+def test_engine_crafting_tree():
+    """検索エンジンから製作ツリーを取得"""
+    run_with_database(_run_engine_crafting_tree)
+
+
+def test_parse_target():
+    """末尾の個数指定を読み取る"""
+    assert parse_target('ウッドソード') == ('ウッドソード', 1)
+    assert parse_target('ウッドソード:3') == ('ウッドソード', 3)
+    assert parse_target('ウッドソード ×2') == ('ウッドソード', 2)
+    assert parse_target('ウッドソード x4') == ('ウッドソード', 4)
+    assert parse_target('ウッドソード　５個') == ('ウッドソード', 5)
+    # 名前の一部の数字・ワイルドカードは個数として扱わない
+    assert parse_target('魔法石Lv2') == ('魔法石Lv2', 1)
+    assert parse_target('*破片') == ('*破片', 1)
+
+
+if __name__ == "__main__":
+    test_base_material_closure()
+    test_expand_tree()
+    test_cycle_detection()
+    test_catalog_recipes()
+    test_engine_crafting_tree()
+    test_parse_target()
+    print("✅ 製作レシピのテスト完了")
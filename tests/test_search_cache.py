@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+検索結果キャッシュのテスト
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import run_with_database, seed_database
+from search_cache import NegativeCache, QueryCache, RelatedItemsCache
+from search_engine import SearchEngine
+
+
+def test_hit_miss_and_copies():
+    """ヒット・ミスの計上と結果のコピー"""
+    cache = QueryCache(max_size=2, ttl=60)
+    assert cache.get('トト', 1) is None
+    cache.put('トト', 1, [{'id': 1, 'formal_name': 'トト'}])
+
+    result = cache.get('トト', 1)
+    assert result == [{'id': 1, 'formal_name': 'トト'}]
+    result[0]['original_query'] = 'とと'
+    assert 'original_query' not in cache.get('トト', 1)[0]
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+
+def test_lru_eviction():
+    """上限を超えたら最も使われていないものを削除"""
+    cache = QueryCache(max_size=2, ttl=60)
+    cache.put('a', 1, [])
+    cache.put('b', 1, [])
+    cache.get('a', 1)
+    cache.put('c', 1, [])
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == []
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_generation_and_ttl():
+    """カタログ更新・有効期限切れで破棄"""
+    cache = QueryCache(max_size=10, ttl=60)
+    cache.put('a', 1, [{'id': 1}])
+    assert cache.get('a', 2) is None
+    assert cache.get_stats()['invalidations'] == 1
+
+    cache = QueryCache(max_size=10, ttl=0.01)
+    cache.put('a', 1, [])
+    time.sleep(0.02)
+    assert cache.get('a', 1) is None
+
+
+def test_negative_cache():
+    """0件クエリと検索候補を覚え、カタログ更新で忘れる"""
+    cache = NegativeCache(max_size=10, ttl=60)
+    assert not cache.is_miss('すらいn', 1)
+    cache.record_miss('すらいn', 1)
+    assert cache.is_miss('すらいn', 1)
+    assert cache.get_suggestions('すらいn', 1, 5) is None
+
+    cache.put_suggestions('すらいn', 1, 5, ['スライム'])
+    cache.record_miss('すらいn', 1)
+    assert cache.get_suggestions('すらいn', 1, 5) == ['スライム']
+    assert cache.get_suggestions('すらいn', 1, 3) is None
+
+    assert not cache.is_miss('すらいn', 2)
+    
+    # 検索候補だけを格納したクエリは0件扱いにしない
+    cache.put_suggestions('ウッド', 2, 5, ['ウッドソード'])
+    assert not cache.is_miss('ウッド', 2)
+    assert cache.get_suggestions('ウッド', 2, 5) == ['ウッドソード']
+
+
+def test_related_items_cache():
+    """関連アイテムは区分ごとにコピーして返し、カタログ更新で破棄"""
+    cache = RelatedItemsCache(max_size=10)
+    key = RelatedItemsCache.make_key('materials', 1)
+    cache.put(key, 1, {'acquisition_sources': [{'id': 20}], 'acquisition_info': {'location': 'レポロ'}})
+
+    related = cache.get(key, 1)
+    related['acquisition_sources'][0]['relation_type'] = 'drop_from_mob'
+    related['acquisition_info']['location'] = 'セシド'
+    assert cache.get(key, 1) == {'acquisition_sources': [{'id': 20}], 'acquisition_info': {'location': 'レポロ'}}
+    assert cache.get(key, 2) is None
+
+
+async def _run_related_prewarm(path):
+    db_manager = await seed_database(path, {
+        'materials': [{'id': 1, 'formal_name': 'トトの羽'}],
+        'mobs': [{'id': 2, 'formal_name': 'トト', 'drops': 'トトの羽'}],
+        'search_stats': [{'item_name': 'トト', 'search_count': 5}],
+    })
+
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    engine.query_cache.clear()
+    assert await engine.prewarm_related_items(10) == 1
+
+    # 事前計算した結果は、別に生成したエンジンからも引ける
+    stats_before = engine.get_related_cache_stats()
+    mob = (await engine.search('トト'))[0]
+    related = await SearchEngine(db_manager, {}).search_related_items(mob)
+    assert [item['id'] for item in related['dropped_items']] == [1]
+    assert engine.get_related_cache_stats()['hits'] == stats_before['hits'] + 1
+
+    # CSV取り込み（カタログの再読み込み）後は計算し直す
+    await engine.load_catalog()
+    await engine.search_related_items(mob)
+    assert engine.get_related_cache_stats()['misses'] == stats_before['misses'] + 1
+
+
+async def _run_suggestions_then_search(path):
+    db_manager = await seed_database(path, {
+        'equipments': [{'id': 1, 'formal_name': 'ウッドソード'}, {'id': 2, 'formal_name': 'ウッドシールド'}],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    assert len(await engine.search('ウッド')) == 2
+    
+    # 入力途中の補完候補を計算した後も、同じクエリの検索結果は消えない
+    assert await engine.get_search_suggestions('ウッド', 5)
+    engine.query_cache.clear()
+    assert len(await engine.search('ウッド')) == 2
+
+
+async def _run_cached_ranked_results(path):
+    db_manager = await seed_database(path, {
+        'equipments': [{'formal_name': 'ウッド'}] + [{'formal_name': f'ウッドソード{i}'} for i in range(30)],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    await engine.search('ウッド')
+    
+    # キャッシュから返すときも、スコア順の結果は参照した順位までしか並べない
+    results = await engine.search('ウッド')
+    assert engine.query_cache.get_stats()['hits'] == 1
+    assert repr(results) == 'RankedResults(31件, 整列済み1件)'
+    assert len(results[:10]) == 10
+    
+    # 元のクエリを付けた結果は、キャッシュから返すときに今回のクエリに書き換える
+    first = await engine.search('ウッドソードLv2')
+    second = await engine.search('ｳｯﾄﾞｿｰﾄﾞLv2')
+    assert first[0]['original_query'] == 'ウッドソードLv2'
+    assert {r['original_query'] for r in second} == {'ｳｯﾄﾞｿｰﾄﾞLv2'}
+
+
+def test_cache_hit_keeps_lazy_ranking():
+    """キャッシュヒット時に検索結果を全件並べ直さない"""
+    run_with_database(_run_cached_ranked_results)
+
+
+def test_suggestions_do_not_mark_miss():
+    """検索候補のキャッシュが、結果のあるクエリを0件扱いにしない"""
+    run_with_database(_run_suggestions_then_search)
+
+
+def test_related_items_prewarm():
+    """検索ランキング上位の関連アイテムを事前計算してキャッシュ"""
+    run_with_database(_run_related_prewarm)
+
+
+if __name__ == "__main__":
+    test_hit_miss_and_copies()
+    test_lru_eviction()
+    test_generation_and_ttl()
+    test_negative_cache()
+    test_related_items_cache()
+    test_related_items_prewarm()
+    test_suggestions_do_not_mark_miss()
+    test_cache_hit_keeps_lazy_ranking()
+    print("✅ 検索キャッシュテスト完了")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+複数クエリ一括検索と検索統計の一括更新のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import run_with_database, seed_database
+from search_engine import SearchEngine
+
+
+async def _run_search_many(path):
+    db_manager = await seed_database(path, {
+        'materials': [{'formal_name': 'トトの羽'}],
+        'mobs': [{'formal_name': 'トト'}],
+    })
+
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    results = await engine.search_many(['トト', 'とと', '存在しないアイテム'])
+
+    # 入力と同じ順・件数で返り、重複クエリにも別の辞書を返す
+    assert len(results) == 3
+    assert results[0][0]['formal_name'] == 'トト'
+    assert [r['id'] for r in results[0]] == [r['id'] for r in results[1]]
+    assert results[0][0] is not results[1][0]
+    assert results[2] == []
+
+    await db_manager.update_search_stats_many(['トト', 'とと', 'トト'])
+    ranking = {row['item_name']: row['search_count'] for row in await db_manager.get_search_ranking(10)}
+    assert ranking == {'トト': 2, 'とと': 1}
+
+
+def test_search_many():
+    """複数クエリをまとめて検索し、統計を1回で更新する"""
+    run_with_database(_run_search_many)
+
+
+if __name__ == "__main__":
+    test_search_many()
+    print("✅ 複数クエリ検索テスト完了")
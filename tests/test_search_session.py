@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+検索セッション（リクエスト単位の共有接続）のテスト
+"""
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from database import DatabaseManager
+from db_connection import close_read_pool, enable_read_pool, get_read_pool
+from search_engine import SearchEngine, request_scoped
+from search_session import current_session, search_session
+from db_fixture import run_with_database
+
+
+def _create_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("INSERT INTO items (name) VALUES ('トト')")
+    conn.commit()
+    conn.close()
+
+
+async def _run_shared_connection(path):
+    _create_db(path)
+    assert current_session(path) is None
+    async with search_session(path) as session:
+        db = await session.connection()
+        # 入れ子のセッションは同じ接続を使う
+        async with search_session(path) as inner:
+            assert inner is session
+            assert await inner.connection() is db
+
+        cursor = await db.execute("SELECT COUNT(*) FROM items")
+        assert (await cursor.fetchone())[0] == 1
+
+        # セッション中の他の接続からの書き込みは見えない（同一スナップショット）
+        writer = sqlite3.connect(path, timeout=0)
+        writer.execute("INSERT INTO items (name) VALUES ('ボア')")
+        writer.commit()
+        writer.close()
+        cursor = await db.execute("SELECT COUNT(*) FROM items")
+        assert (await cursor.fetchone())[0] == 1
+
+    assert current_session(path) is None
+
+
+def test_shared_connection():
+    """セッション内の問い合わせは1つの接続・スナップショットを共有する"""
+    run_with_database(_run_shared_connection)
+
+
+async def _run_connection_pool(path):
+    _create_db(path)
+    # プールがなくても並行する問い合わせは共有接続1つで実行する
+    async with search_session(path) as session:
+        async with session.lease() as first:
+            async with session.lease() as second:
+                assert first is second
+
+    pool = enable_read_pool(path, max_idle=2)
+    try:
+        async with search_session(path) as session:
+            async with session.lease() as first:
+                cursor = await first.execute("SELECT COUNT(*) FROM items")
+                assert (await cursor.fetchone())[0] == 1
+                
+                # 問い合わせの間に書き込まれても、並行して借りた接続は同じスナップショットを読む
+                writer = sqlite3.connect(path, timeout=0)
+                writer.execute("INSERT INTO items (name) VALUES ('ボア')")
+                writer.commit()
+                writer.close()
+                async with session.lease() as second:
+                    assert second is first
+                    cursor = await second.execute("SELECT COUNT(*) FROM items")
+                    assert (await cursor.fetchone())[0] == 1
+
+            # 同じキーの問い合わせは1回だけ実行して結果を共有
+            calls = []
+
+            async def count_items():
+                calls.append(1)
+                async with session.lease() as db:
+                    cursor = await db.execute("SELECT COUNT(*) FROM items")
+                    return (await cursor.fetchone())[0]
+
+            results = await asyncio.gather(*(session.shared(('count',), count_items) for _ in range(3)))
+            assert results == [1, 1, 1] and len(calls) == 1
+
+        # 終了したセッションの接続は次のセッションで使い回し、書き込みはそこで見える
+        assert pool.opened == 1
+        async with search_session(path) as session:
+            async with session.lease() as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM items")
+                assert (await cursor.fetchone())[0] == 2
+        assert pool.opened == 1 and pool.reused == 1
+    finally:
+        await close_read_pool(path)
+    assert get_read_pool(path) is None
+
+
+def test_connection_pool():
+    """プールした読み取り接続をセッション間で使い回し、1セッションは1つのスナップショットで読む"""
+    run_with_database(_run_connection_pool)
+
+
+class _SnapshotProbe(SearchEngine):
+    """1回のリクエスト内で、書き込みを挟んだ2回の問い合わせを並行して行う"""
+
+    @request_scoped
+    async def count_around_write(self, path):
+        async def count(db):
+            cursor = await db.execute("SELECT COUNT(*) FROM items")
+            return (await cursor.fetchone())[0]
+
+        async with self._connect() as first:
+            before = await count(first)
+            writer = sqlite3.connect(path, timeout=0)
+            writer.execute("INSERT INTO items (name) VALUES ('ボア')")
+            writer.commit()
+            writer.close()
+            async with self._connect() as second:
+                return before, await count(second)
+
+
+async def _run_request_snapshot(path):
+    _create_db(path)
+    engine = _SnapshotProbe(DatabaseManager(path), {})
+    enable_read_pool(path, engine.read_connections)
+    try:
+        assert await engine.count_around_write(path) == (1, 1)
+        # 次のリクエストでは書き込みが見える
+        assert await engine.count_around_write(path) == (2, 2)
+    finally:
+        await close_read_pool(path)
+
+
+def test_request_single_snapshot():
+    """リクエスト中の問い合わせは、並行していても1つのスナップショットで読む"""
+    run_with_database(_run_request_snapshot)
+
+
+if __name__ == "__main__":
+    test_shared_connection()
+    test_connection_pool()
+    test_request_single_snapshot()
+    print("✅ 検索セッションテスト完了")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+検索段階ごとの所要時間・SQL実行数の計測のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import insert_rows, run_with_database, seed_database
+from search_engine import SearchEngine
+from search_trace import SearchTracer, percentile
+
+
+def test_percentile_and_stats():
+    """パーセンタイルと段階ごとの集計"""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+    
+    tracer = SearchTracer(max_samples=3)
+    for elapsed in (1.0, 2.0, 3.0, 4.0):
+        tracer.record('partial', elapsed, rows=2, statements=1)
+    stats = tracer.get_stats()['partial']
+    # 直近3回分だけを集計する
+    assert stats['count'] == 3
+    assert stats['p50_ms'] == 3.0 and stats['max_ms'] == 4.0
+    assert stats['avg_rows'] == 2 and stats['avg_statements'] == 1
+
+
+async def _run_traced_search(path):
+    db_manager = await seed_database(path, {
+        'materials': [{'formal_name': 'トトの羽'}],
+        'mobs': [{'formal_name': 'トト', 'drops': 'トトの羽'}],
+    })
+
+    # 無効なときは何も記録しない
+    engine = SearchEngine(db_manager, {})
+    await engine.search('トト')
+    assert engine.get_trace_stats() == {}
+
+    engine = SearchEngine(db_manager, {'features': {'search_tracing': True}})
+    engine.tracer.clear()
+    engine.query_cache.clear()
+    results = await engine.search('トト')
+    await engine.search('存在しないアイテム')
+    await engine.search_related_items({'item_type': 'materials', 'formal_name': 'トトの羽'})
+
+    stats = engine.get_trace_stats()
+    assert stats['exact_formal']['count'] == 2
+    assert stats['exact_formal']['avg_rows'] == 0.5
+    # 0件のクエリは最後の段階まで進む
+    assert stats['typo']['count'] == 1
+    
+    # 誤字を許容した結果は候補として印を付ける
+    insert_rows(path, {'equipments': [{'formal_name': 'ウッドソード'}]})
+    await db_manager.initialize_database()
+    await engine.load_catalog()
+    results = await engine.search('ウッドソーダ')
+    assert [r['formal_name'] for r in results] == ['ウッドソード']
+    assert results[0]['typo_suggestion'] is True
+    assert 'typo_suggestion' not in (await engine.search('ウッドソード'))[0]
+    # 素材の関連アイテム検索は関連テーブルをSQLで引く
+    assert stats['related_items']['count'] == 1
+    assert stats['related_items']['avg_statements'] > 0
+
+
+def test_traced_search():
+    """設定で有効にしたときだけ段階ごとに記録する"""
+    run_with_database(_run_traced_search)
+
+
+if __name__ == "__main__":
+    test_percentile_and_stats()
+    test_traced_search()
+    print("✅ 検索段階計測テスト完了")
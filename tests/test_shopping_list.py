@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+複数の装備の買い物リスト（基本素材の合計と入手先）のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db_fixture import run_with_database, seed_database
+from item_catalog import ItemCatalog
+from item_relations import extract_relations
+from search_engine import SearchEngine
+from search_session import search_session
+from shopping_list import aggregate_targets, attach_sources, parse_targets
+
+ROWS = {
+    'equipments': [
+        {'id': 1, 'formal_name': 'ウッドソード', 'required_materials': '木の棒:8,トトの羽:4'},
+        {'id': 2, 'formal_name': 'ウッドトップソード', 'required_materials': 'ウッドソード:1,ボアの皮:8'},
+        {'id': 3, 'formal_name': 'ストーンソード', 'required_materials': '木の棒:2,石:6'},
+        {'id': 4, 'formal_name': '布の服', 'required_materials': None},
+    ],
+    'materials': [
+        {'id': 1, 'formal_name': '木の棒', 'acquisition_category': '採取'},
+        {'id': 2, 'formal_name': 'トトの羽', 'acquisition_category': 'モブ討伐'},
+        {'id': 3, 'formal_name': 'ボアの皮', 'acquisition_category': 'モブ討伐'},
+        {'id': 4, 'formal_name': '石', 'acquisition_category': '採掘'},
+    ],
+    'mobs': [
+        {'id': 1, 'formal_name': 'トト', 'area': 'レポロ', 'required_level': '1', 'drops': 'トトの羽(10%)'},
+        # 同じモブの別レベルは1件にまとめる
+        {'id': 2, 'formal_name': 'トト', 'area': 'レポロ', 'required_level': '5', 'drops': 'トトの羽(20%)'},
+        {'id': 3, 'formal_name': 'ファングボア', 'area': 'レポロ', 'required_level': '3', 'drops': 'ボアの皮,ボアの牙'},
+    ],
+    'npcs': [
+        {'id': 1, 'name': 'ライハ', 'location': 'レポロ', 'business_type': '購入',
+         'obtainable_items': '木の棒:5,石:1,小薬草:1', 'required_materials': '30G,15G,10G'},
+        # 別の街にいる同じNPCの同じ取引は1件にまとめる
+        {'id': 3, 'name': 'ライハ', 'location': 'セシド', 'business_type': '購入',
+         'obtainable_items': '木の棒:5', 'required_materials': '30G'},
+        {'id': 2, 'name': 'カイト', 'location': 'レポロ', 'business_type': '交換',
+         'obtainable_items': 'ボアの皮:64', 'required_materials': '[圧縮]ボアの皮:1'},
+    ],
+    'gatherings': [
+        {'id': 1, 'location': 'レポロ', 'collection_method': '採取', 'obtained_materials': '木の棒, 薬草'},
+        {'id': 2, 'location': 'レポロ', 'collection_method': '採掘', 'obtained_materials': '石'},
+    ],
+}
+
+
+def _relations():
+    """ROWSから展開した関連をDBの行の形にする"""
+    columns = ['source_type', 'source_id', 'relation_type', 'target_name', 'target_key',
+               'quantity', 'drop_info', 'exchange_index']
+    return [
+        dict(zip(columns, relation))
+        for table in ('mobs', 'npcs', 'gatherings')
+        for row in ROWS[table]
+        for relation in extract_relations(table, row)
+    ]
+
+
+def test_parse_targets():
+    """改行・カンマ区切りで個数付きの対象を読み取り、同じ名前は合算する"""
+    assert parse_targets('ウッドソード 2, ストーンソード\nウッドソード:3、石 ×10') == [
+        ('ウッドソード', 5), ('ストーンソード', 1), ('石', 10)
+    ]
+    assert parse_targets('') == []
+    assert parse_targets(' , \n') == []
+
+
+def test_aggregate_targets():
+    """レシピで展開した基本素材を対象をまたいで合算する"""
+    catalog = ItemCatalog(ROWS)
+    shopping = aggregate_targets(catalog, [('ウッドトップソード', 2), ('すとーんそーど', 1),
+                                           ('布の服', 1), ('ボアの皮', 4), ('存在しない剣', 1)])
+
+    assert [target['name'] for target in shopping['targets']] == ['ウッドトップソード', 'ストーンソード', '布の服', 'ボアの皮']
+    assert [(material['name'], material['quantity']) for material in shopping['materials']] == [
+        ('木の棒', 18), ('トトの羽', 8), ('ボアの皮', 20), ('石', 6), ('布の服', 1)
+    ]
+    assert shopping['crafted_items'] == [('ウッドソード', 2)]
+    assert [target['name'] for target in shopping['unresolved']] == ['存在しない剣']
+
+
+def test_attach_sources():
+    """素材ごとのモブ・採集場所・NPCと、NPCから買う場合のGold"""
+    catalog = ItemCatalog(ROWS)
+    shopping = aggregate_targets(catalog, [('ウッドトップソード', 2), ('ストーンソード', 1)])
+    shopping = attach_sources(catalog, shopping, _relations())
+    materials = {material['name']: material for material in shopping['materials']}
+
+    # 木の棒18本は5本30Gを4回
+    wood = materials['木の棒']
+    assert wood['gatherings'] == [{'location': 'レポロ', 'method': '採取'}]
+    assert len(wood['npcs']) == 1
+    assert wood['npcs'][0]['times'] == 4 and wood['npcs'][0]['gold'] == 120
+    assert wood['gold'] == 120 and wood['acquisition'] == '採取'
+
+    assert [mob['name'] for mob in materials['トトの羽']['mobs']] == ['トト']
+    assert materials['トトの羽']['mobs'][0]['drop_rate'] == '10%'
+
+    # 交換は必要な素材と回数を出し、Goldには数えない
+    hide = materials['ボアの皮']
+    assert hide['npcs'] == [{'name': 'カイト', 'business_type': '交換', 'required': '[圧縮]ボアの皮:1',
+                             'times': 1, 'gold': None}]
+    assert [mob['name'] for mob in hide['mobs']] == ['ファングボア']
+
+    assert materials['石']['gold'] == 90
+    assert shopping['total_gold'] == 210 and shopping['priced_materials'] == 2
+
+
+def test_npc_only_target():
+    """装備・素材の一覧にない名前でも、入手先があれば素材として数える"""
+    catalog = ItemCatalog(ROWS)
+    shopping = aggregate_targets(catalog, [('小薬草', 3), ('存在しない剣', 1)])
+    assert [target['name'] for target in shopping['unresolved']] == ['小薬草', '存在しない剣']
+
+    shopping = attach_sources(catalog, shopping, _relations())
+    assert [target['name'] for target in shopping['targets']] == ['小薬草']
+    assert [target['name'] for target in shopping['unresolved']] == ['存在しない剣']
+    assert [(material['name'], material['quantity'], material['gold']) for material in shopping['materials']] == [
+        ('小薬草', 3, 30)
+    ]
+
+
+async def _run_engine_shopping_list(path):
+    db_manager = await seed_database(path, ROWS)
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    
+    # 対象の数によらず、入手先は1回の問い合わせでまとめて引く
+    statements = []
+    for targets in ([('ウッドソード', 1)], [('ウッドトップソード', 2), ('ストーンソード', 1), ('石', 3)]):
+        async with search_session(path, trace_statements=True) as session:
+            shopping = await engine.get_shopping_list(targets)
+            statements.append(session.statements)
+    assert statements[0] == statements[1]
+    
+    materials = {material['name']: material for material in shopping['materials']}
+    assert materials['石']['quantity'] == 9
+    assert materials['石']['gatherings'] == [{'location': 'レポロ', 'method': '採掘'}]
+    assert shopping['total_gold'] == 120 + 135
+    
+    empty = await engine.get_shopping_list([('存在しない剣', 1)])
+    assert empty['materials'] == [] and empty['total_gold'] == 0
+    
+    # NPCだけが扱うアイテムも同じ問い合わせで入手先が分かる
+    potion = await engine.get_shopping_list([('小薬草', 2)])
+    assert potion['unresolved'] == [] and potion['total_gold'] == 20
+
+
+def test_engine_shopping_list():
+    """検索エンジンから買い物リストを取得"""
+    run_with_database(_run_engine_shopping_list)
+
+
+if __name__ == "__main__":
+    test_parse_targets()
+    test_aggregate_targets()
+    test_attach_sources()
+    test_npc_only_target()
+    test_engine_shopping_list()
+    print("✅ 買い物リストのテスト完了")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+検索候補トライ木のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from suggestion_trie import SuggestionTrie
+from item_catalog import ItemCatalog
+
+
+def test_ranked_completion():
+    """人気順（同点は名前順）に候補を返す"""
+    trie = SuggestionTrie(max_top=2)
+    trie.add('ボアの皮', 'ぼあの皮', 5)
+    trie.add('ボアの牙', 'ぼあの牙', 1)
+    trie.add('ボア紋章', 'ぼあ紋章', 0)
+    trie.add('トト', 'とと', 3)
+
+    assert trie.complete('ぼあ', 2) == ['ボアの皮', 'ボアの牙']
+    assert trie.complete('ぼあ', 5) == ['ボアの皮', 'ボアの牙', 'ボア紋章']
+    assert trie.complete('ぼあの牙', 5) == ['ボアの牙']
+    assert trie.complete('すらいむ', 5) == []
+
+
+def test_bump_updates_rank():
+    """人気度の加算が上位候補に反映される"""
+    trie = SuggestionTrie(max_top=2)
+    trie.add('ボアの皮', 'ぼあの皮', 5)
+    trie.add('ボアの牙', 'ぼあの牙', 1)
+    trie.add('ボア紋章', 'ぼあ紋章', 0)
+    trie.bump('ボア紋章', 10)
+    assert trie.complete('ぼあ', 2) == ['ボア紋章', 'ボアの皮']
+
+
+def test_catalog_suggestions():
+    """カタログの名称と検索統計から候補を作る"""
+    catalog = ItemCatalog({
+        'materials': [
+            {'id': 1, 'formal_name': 'ボアの皮', 'common_name': 'ボア皮'},
+            {'id': 2, 'formal_name': 'ボアの牙', 'common_name': 'ボア牙,牙'},
+        ],
+        'npcs': [{'id': 3, 'name': 'ボアハンター'}],
+    }, popularity={'ぼあの牙': 4})
+    assert catalog.suggest('ボア', 2) == ['ボアの牙', 'ボアの皮']
+    assert catalog.suggest('ﾎﾞｱ', 10) == ['ボアの牙', 'ボアの皮', 'ボアハンター', 'ボア牙', 'ボア皮']
+    catalog.record_search('ボアハンター', 10)
+    assert catalog.suggest('ぼあ', 1) == ['ボアハンター']
+
+
+if __name__ == "__main__":
+    test_ranked_completion()
+    test_bump_updates_rank()
+    test_catalog_suggestions()
+    print("✅ 検索候補トライ木テスト完了")
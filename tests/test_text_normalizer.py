@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+検索キー正規化のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from text_normalizer import FUZZY_MAP, READING_MAP, split_tier_suffix, to_fuzzy_key, to_search_key
+from db_fixture import run_with_database, seed_database
+from item_catalog import ItemCatalog
+from search_engine import SearchEngine
+
+
+def test_to_search_key():
+    """表記の違いが同じキーになる"""
+    assert to_search_key('スライム') == to_search_key('すらいむ') == to_search_key('ｽﾗｲﾑ')
+    assert to_search_key('ＡＢＣ１２３') == 'abc123'
+    assert to_search_key(' トト〜 ') == 'ととー'
+    assert to_search_key('＊破片') == '*破片'
+    assert to_search_key(None) is None
+
+
+def test_catalog_uses_search_keys():
+    """保存済みキーがなくてもカタログ側でキーを生成して照合する"""
+    catalog = ItemCatalog({
+        'materials': [{'id': 1, 'formal_name': 'ボアの皮', 'common_name': 'ボア皮'}],
+        'npcs': [{'id': 2, 'name': 'アヴィル'}],
+    })
+    assert [r['id'] for r in catalog.find_exact_formal('ぼあの皮')] == [1]
+    assert [r['id'] for r in catalog.find_exact_common('ﾎﾞｱ皮')] == [1]
+    assert [r['id'] for r in catalog.find_partial('ぼあ')] == [1]
+    assert catalog.get('npcs', 2)['formal_name_key'] == 'あゔぃる'
+
+
+def test_to_fuzzy_key():
+    """表記ゆれ・読み・「の」の有無が同じキーになる"""
+    assert to_fuzzy_key('ヴァルキリー') == to_fuzzy_key('バルキリー')
+    assert to_fuzzy_key('ス一ツ') == to_fuzzy_key('スーツ')
+    assert to_fuzzy_key('ひかりのけん') == to_fuzzy_key('光の剣') == to_fuzzy_key('光剣')
+    assert to_fuzzy_key('みかづき') == to_fuzzy_key('みかずき')
+    # 長い読みを優先して置換する
+    assert to_fuzzy_key('きんのいし') == to_fuzzy_key('金石')
+    assert to_fuzzy_key('ボアのソード') == to_fuzzy_key('ボアソード')
+    assert to_fuzzy_key('ぬの服') == to_fuzzy_key('布の服')
+    # カタカナの「ノ」は助詞ではないので残す
+    assert to_fuzzy_key('ノーマル') == to_search_key('ノーマル')
+    assert to_fuzzy_key('キノコ') == to_search_key('キノコ')
+    assert to_fuzzy_key('キングスライム・ノーマル') != to_fuzzy_key('キングスライム・ーマル')
+
+
+def test_fuzzy_key_idempotent():
+    """表記ゆれキーに再度かけても変わらない（代表表記が別の表記を含む場合も）"""
+    forms = [form for mapping in (FUZZY_MAP, READING_MAP)
+             for original, alternatives in mapping.items() for form in [original, *alternatives]]
+    names = forms + ['上質な木材', 'じょうしつなもくざい', 'きのん', 'ほのおの剣', '金の鎧', 'ヴァルキリー',
+                     'ノーマル', 'キノコ', 'ノコギリ', 'ボアのソード', 'ぬの服']
+    for name in names:
+        key = to_fuzzy_key(name)
+        assert to_fuzzy_key(key) == key, name
+    assert to_fuzzy_key('もくざい') == to_fuzzy_key('木材')
+
+
+def test_catalog_fuzzy_lookup():
+    """表記ゆれ検索は1回の照合で解決する"""
+    catalog = ItemCatalog({
+        'equipments': [{'id': 1, 'formal_name': '光の剣', 'common_name': None}],
+        'materials': [{'id': 2, 'formal_name': 'ボアの皮', 'common_name': None}],
+    })
+    assert [r['id'] for r in catalog.find_fuzzy('ひかりけん')] == [1]
+    assert [r['id'] for r in catalog.find_fuzzy('ぼあ革')] == [2]
+    assert catalog.find_fuzzy('の') == []
+    
+    # カタカナの「ノ」を含む名前が、「ノ」を除いた別の名前に一致しない
+    catalog = ItemCatalog({'equipments': [
+        {'id': 4, 'formal_name': 'スライム・ノーマル', 'common_name': None},
+        {'id': 5, 'formal_name': 'ホーマルの紋章', 'common_name': None},
+    ]})
+    assert [r['id'] for r in catalog.find_fuzzy('ノーマル')] == [4]
+    assert [r['id'] for r in catalog.find_fuzzy('ほーまる紋章')] == [5]
+    
+    # 読み（もくざい）の代表表記「木材」が「木」を含んでも、索引側と同じキーで引ける
+    catalog = ItemCatalog({'materials': [{'id': 3, 'formal_name': '上質な木材', 'common_name': None}]})
+    assert [r['id'] for r in catalog.find_fuzzy('もくざい')] == [3]
+    assert [r['id'] for r in catalog.find_fuzzy('上質なもくざい')] == [3]
+
+
+async def _run_fuzzy_search(path):
+    db_manager = await seed_database(path, {
+        'equipments': [{'formal_name': f'炎の剣{i}'} for i in range(25)] + [{'formal_name': '焔の杖'}],
+    })
+    
+    engine = SearchEngine(db_manager, {})
+    await engine.load_catalog()
+    
+    # 表記ゆれで見つかったものは部分一致の結果に加え、件数を絞らない
+    results = await engine.search('炎')
+    assert len(results) == 26
+    assert '焔の杖' in [r['formal_name'] for r in results]
+
+
+def test_fuzzy_search_keeps_partial_results():
+    """表記ゆれ検索は部分一致の結果を切り詰めない"""
+    run_with_database(_run_fuzzy_search)
+
+
+def test_split_tier_suffix():
+    """レベル/ランク表記の分離"""
+    assert split_tier_suffix('魔法石Lv4') == ('魔法石', 4)
+    assert split_tier_suffix('グロースクリスタル Lv.1') == ('グロースクリスタル', 1)
+    assert split_tier_suffix('アイアンソード2') == ('アイアンソード', 2)
+    assert split_tier_suffix('杖レベル3') == ('杖', 3)
+    assert split_tier_suffix('杖★★') == ('杖', 2)
+    assert split_tier_suffix('杖ランクA') == ('杖', None)
+    assert split_tier_suffix('魔法石') == ('魔法石', None)
+
+
+if __name__ == "__main__":
+    test_to_search_key()
+    test_catalog_uses_search_keys()
+    test_to_fuzzy_key()
+    test_fuzzy_key_idempotent()
+    test_catalog_fuzzy_lookup()
+    test_fuzzy_search_keeps_partial_results()
+    test_split_tier_suffix()
+    print("✅ 検索キー正規化テスト完了")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+誤字候補索引（削除辞書）のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from typo_index import TypoIndex, edit_distance
+from item_catalog import ItemCatalog
+
+
+def test_edit_distance():
+    """置換・挿入・削除・隣接入れ替えを1操作と数える"""
+    assert edit_distance('うっどそーど', 'うっどそーだ', 2) == 1
+    assert edit_distance('すらいむ', 'すいらむ', 2) == 1
+    assert edit_distance('とと', 'ととの羽', 2) == 2
+    assert edit_distance('とと', 'ぼあの牙', 2) == 3
+
+
+def test_lookup_scales_with_length():
+    """短いキーほど許容距離が小さい"""
+    index = TypoIndex()
+    for key in ['うっどそーど', 'すらいむ', 'とと', 'ぼあ']:
+        index.add(key)
+    assert index.lookup('うっどそだ') == [('うっどそーど', 2)]
+    assert index.lookup('すらいも') == [('すらいむ', 1)]
+    # 2文字のクエリは1文字違いまで
+    assert index.lookup('とほ') == [('とと', 1)]
+    assert index.lookup('ほ') == []
+    # 検索結果として返す場合は、距離1でも5文字以上を求める
+    assert index.lookup('すらいも', strict=True) == []
+    assert index.lookup('うっどそーだ', strict=True) == [('うっどそーど', 1)]
+    assert index.lookup('うっどそだ', strict=True) == []
+    # 登録キーより大幅に長いクエリ（貼り付けられた文章など）は削除文字列を作らずに打ち切る
+    assert index.lookup('うっどそーど' * 50) == []
+
+
+def test_catalog_typo_lookup():
+    """カタログの誤字検索と「もしかして」候補"""
+    catalog = ItemCatalog({
+        'equipments': [{'id': 1, 'formal_name': 'ウッドソード', 'common_name': '木剣'}],
+        'mobs': [{'id': 2, 'formal_name': 'スライム', 'common_name': None}],
+    })
+    assert [r['id'] for r in catalog.find_typo('ｳｯﾄﾞｿｰﾀﾞ')] == [1]
+    assert catalog.did_you_mean('スライモ') == ['スライム']
+    # 短い名前の誤字は検索結果にはせず、「もしかして」の候補にだけ出す
+    assert catalog.find_typo('スライモ') == []
+    assert catalog.find_typo('存在しないアイテム') == []
+
+
+if __name__ == "__main__":
+    test_edit_distance()
+    test_lookup_scales_with_length()
+    test_catalog_typo_lookup()
+    print("✅ 誤字候補索引テスト完了")
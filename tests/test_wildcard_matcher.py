@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+ワイルドカード名アイテム照合器のテスト
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from wildcard_matcher import WildcardMatcher
+from item_catalog import ItemCatalog
+
+
+def build_matcher():
+    matcher = WildcardMatcher()
+    patterns = ['*破片', '＊Gコイン', '魔法石*', 'グロースクリスタル？', '【圧縮】*', '【圧縮】*の欠片']
+    for pattern_id, pattern in enumerate(patterns):
+        assert matcher.add(pattern, pattern_id)
+    assert not matcher.add('トトの羽', 99)
+    return matcher
+
+
+def test_prefix_suffix_infix():
+    """前方・後方・中間ワイルドカードを1回の照合で解決"""
+    matcher = build_matcher()
+    assert matcher.match('トト・ノーマルの破片') == {0}
+    assert matcher.match('100Gコイン') == {1}
+    assert matcher.match('魔法石Lv4') == {2}
+    assert matcher.match('グロースクリスタルLv1') == {3}
+    assert matcher.match('【圧縮】ボアの欠片') == {4, 5}
+    assert matcher.match('トトの羽') == set()
+
+
+def test_catalog_wildcard_resolution():
+    """具体名から装備・素材のワイルドカード名エントリを引く"""
+    catalog = ItemCatalog({
+        'equipments': [{'id': 1, 'formal_name': '魔法石*', 'common_name': None}],
+        'materials': [
+            {'id': 2, 'formal_name': '*破片', 'common_name': None},
+            {'id': 3, 'formal_name': 'トトの羽', 'common_name': None},
+        ],
+        'mobs': [{'id': 4, 'formal_name': '*破片', 'common_name': None}],
+    })
+    results = catalog.match_wildcard_entries({'トト・ノーマルの破片', '魔法石Lv4'}, ['equipments', 'materials'])
+    assert [(r['item_type'], r['id']) for r in results] == [('equipments', 1), ('materials', 2)]
+
+
+if __name__ == "__main__":
+    test_prefix_suffix_infix()
+    test_catalog_wildcard_resolution()
+    print("✅ ワイルドカード照合器テスト完了")